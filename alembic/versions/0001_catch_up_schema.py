@@ -0,0 +1,65 @@
+"""catch up databases created by init_db before migrations existed
+
+Adds users.token_version, the archive_counts table and the archive indexes.
+Every step is idempotent, so it is safe on databases where create_all
+already created some of them. Run `python -m core.archive rebuild` once
+afterwards to fill archive_counts.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS "
+        "token_version INTEGER NOT NULL DEFAULT 0"
+    )
+
+    op.create_table(
+        "archive_counts",
+        sa.Column("kind", sa.String(20), primary_key=True),
+        sa.Column("key", sa.String(50), primary_key=True),
+        sa.Column("post_count", sa.Integer, nullable=False),
+        if_not_exists=True,
+    )
+
+    op.create_index(
+        "ix_posts_status_published_at_id",
+        "posts",
+        ["status", sa.text("published_at DESC"), sa.text("id DESC")],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_posts_category_id_status_published_at",
+        "posts",
+        ["category_id", "status", sa.text("published_at DESC"), sa.text("id DESC")],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_post_tags_tag_id_post_id",
+        "post_tags",
+        ["tag_id", "post_id"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_post_tags_tag_id_post_id", table_name="post_tags")
+    op.drop_index("ix_posts_category_id_status_published_at", table_name="posts")
+    op.drop_index("ix_posts_status_published_at_id", table_name="posts")
+    op.drop_table("archive_counts")
+    op.drop_column("users", "token_version")
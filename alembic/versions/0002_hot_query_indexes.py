@@ -0,0 +1,59 @@
+"""hot query indexes
+
+Covers the author feed on /account, comment threads and case-insensitive
+login lookups. Indexes are built CONCURRENTLY so writes to posts, comments
+and users are not blocked while they build.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    (
+        "ix_posts_author_id_status_published_at",
+        "posts",
+        ["author_id", "status", sa.text("published_at DESC"), sa.text("id DESC")],
+    ),
+    ("ix_comments_post_id_created_at", "comments", ["post_id", "created_at"]),
+    ("ix_comments_parent_id", "comments", ["parent_id"]),
+    ("ix_users_lower_email", "users", [sa.text("lower(email)")]),
+    ("ix_users_lower_username", "users", [sa.text("lower(username)")]),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
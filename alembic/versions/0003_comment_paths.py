@@ -0,0 +1,71 @@
+"""materialized paths for threaded comments
+
+Adds comments.root_id, depth and path, backfills them for existing rows
+with a recursive CTE, and indexes them for one-scan thread loading.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS root_id INTEGER")
+    op.execute(
+        "ALTER TABLE comments ADD COLUMN IF NOT EXISTS "
+        "depth INTEGER NOT NULL DEFAULT 0"
+    )
+    op.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS path VARCHAR(255)")
+
+    op.execute(
+        """
+        WITH RECURSIVE tree AS (
+            SELECT id, id AS root_id, 0 AS depth,
+                   lpad(id::text, 10, '0')::varchar(255) AS path
+            FROM comments
+            WHERE parent_id IS NULL
+            UNION ALL
+            SELECT c.id, t.root_id, t.depth + 1,
+                   (t.path || '/' || lpad(c.id::text, 10, '0'))::varchar(255)
+            FROM comments c
+            JOIN tree t ON c.parent_id = t.id
+        )
+        UPDATE comments
+        SET root_id = tree.root_id, depth = tree.depth, path = tree.path
+        FROM tree
+        WHERE comments.id = tree.id
+        """
+    )
+
+    op.create_index(
+        "ix_comments_post_id_parent_id_id",
+        "comments",
+        ["post_id", "parent_id", "id"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_comments_root_id_path",
+        "comments",
+        ["root_id", "path"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_comments_root_id_path", table_name="comments")
+    op.drop_index("ix_comments_post_id_parent_id_id", table_name="comments")
+    op.drop_column("comments", "path")
+    op.drop_column("comments", "depth")
+    op.drop_column("comments", "root_id")
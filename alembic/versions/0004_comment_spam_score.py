@@ -0,0 +1,33 @@
+"""comment spam score for the moderation queue
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS spam_score FLOAT")
+    op.create_index(
+        "ix_comments_status_spam_score",
+        "comments",
+        ["status", sa.text("spam_score DESC")],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_comments_status_spam_score", table_name="comments")
+    op.drop_column("comments", "spam_score")
@@ -0,0 +1,53 @@
+"""jobs outbox table for background work
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    job_status = postgresql.ENUM(
+        "PENDING", "RUNNING", "FAILED", name="jobstatus", create_type=False
+    )
+    job_status.create(op.get_bind(), checkfirst=True)
+
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("kind", sa.String(100), nullable=False),
+        sa.Column("payload", postgresql.JSONB, nullable=False),
+        sa.Column("status", job_status, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("max_attempts", sa.Integer, nullable=False),
+        sa.Column("run_after", sa.DateTime, nullable=False),
+        sa.Column("locked_at", sa.DateTime),
+        sa.Column("last_error", sa.Text),
+        sa.Column("created_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_jobs_status_run_after",
+        "jobs",
+        ["status", "run_after"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_status_run_after", table_name="jobs")
+    op.drop_table("jobs")
+    postgresql.ENUM(name="jobstatus").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,52 @@
+"""post_revisions: snapshots plus line deltas
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "post_revisions",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column(
+            "post_id",
+            sa.Integer,
+            sa.ForeignKey("posts.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("number", sa.Integer, nullable=False),
+        sa.Column("snapshot", sa.Text),
+        sa.Column("delta", postgresql.JSONB),
+        sa.Column(
+            "author_id", sa.Integer, sa.ForeignKey("users.id", ondelete="SET NULL")
+        ),
+        sa.Column("created_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_post_revisions_post_id_number",
+        "post_revisions",
+        ["post_id", "number"],
+        unique=True,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_post_revisions_post_id_number", table_name="post_revisions")
+    op.drop_table("post_revisions")
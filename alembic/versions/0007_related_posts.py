@@ -0,0 +1,51 @@
+"""related_posts: precomputed related posts
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "related_posts",
+        sa.Column(
+            "post_id",
+            sa.Integer,
+            sa.ForeignKey("posts.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("rank", sa.Integer, primary_key=True),
+        sa.Column(
+            "related_id",
+            sa.Integer,
+            sa.ForeignKey("posts.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("score", sa.Float, nullable=False),
+        sa.Column("computed_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_related_posts_related_id",
+        "related_posts",
+        ["related_id"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_related_posts_related_id", table_name="related_posts")
+    op.drop_table("related_posts")
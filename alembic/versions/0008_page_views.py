@@ -0,0 +1,53 @@
+"""page_views and page_view_rollups: page-view analytics
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "page_views",
+        sa.Column("id", sa.BigInteger, primary_key=True),
+        sa.Column("ts", sa.DateTime, nullable=False),
+        sa.Column("path", sa.String(255), nullable=False),
+        sa.Column("post_id", sa.Integer),
+        sa.Column("referrer", sa.String(255)),
+        if_not_exists=True,
+    )
+    op.create_index("ix_page_views_ts", "page_views", ["ts"], if_not_exists=True)
+
+    op.create_table(
+        "page_view_rollups",
+        sa.Column("hour", sa.DateTime, primary_key=True),
+        sa.Column("kind", sa.String(20), primary_key=True),
+        sa.Column("key", sa.String(255), primary_key=True),
+        sa.Column("views", sa.Integer, nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_page_view_rollups_kind_hour",
+        "page_view_rollups",
+        ["kind", "hour"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_page_view_rollups_kind_hour", table_name="page_view_rollups")
+    op.drop_table("page_view_rollups")
+    op.drop_index("ix_page_views_ts", table_name="page_views")
+    op.drop_table("page_views")
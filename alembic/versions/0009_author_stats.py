@@ -0,0 +1,50 @@
+"""author_stats: precomputed author profile statistics
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "author_stats",
+        sa.Column(
+            "author_id",
+            sa.Integer,
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("post_count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("published_count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("total_views", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("last_published_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    # backfill from existing posts, as core.author_stats.reconcile would
+    op.execute(
+        "INSERT INTO author_stats "
+        "(author_id, post_count, published_count, total_views, last_published_at) "
+        "SELECT author_id, count(*), "
+        "count(*) FILTER (WHERE status = 'PUBLISHED'), "
+        "coalesce(sum(view_count), 0), "
+        "max(published_at) FILTER (WHERE status = 'PUBLISHED') "
+        "FROM posts WHERE author_id IS NOT NULL GROUP BY author_id "
+        "ON CONFLICT (author_id) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("author_stats")
@@ -0,0 +1,43 @@
+"""index users.updated_at
+
+max(updated_at) in page validators and the availability filter's sync of
+recently changed users both read it.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # built CONCURRENTLY, like 0002, so sign-ups and profile edits go on
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_updated_at",
+            "users",
+            ["updated_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_users_updated_at",
+            table_name="users",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
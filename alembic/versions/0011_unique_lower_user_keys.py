@@ -0,0 +1,101 @@
+"""make lower(username) and lower(email) unique
+
+Login matches both case-insensitively, so "Bob" and "bob" must not both
+exist. Existing duplicates are renamed first: the oldest account keeps
+its name, every other one gets "_<id>" appended to its username and
+"+dup<id>" to the local part of its email (which still reaches the same
+mailbox with most providers), and its token_version is bumped so signed-in
+sessions pick up the new claims.
+
+The unique indexes are built CONCURRENTLY under temporary names and then
+swapped in for the plain ones from 0002. If a new duplicate is created
+while they build, the build fails and the migration can simply be re-run.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index, column, SQL renaming a duplicate row's value of it)
+KEYS = [
+    (
+        "ix_users_lower_username",
+        "username",
+        "left(username, 49 - length(id::text)) || '_' || id",
+    ),
+    (
+        "ix_users_lower_email",
+        "email",
+        # stays within String(120)
+        "left(split_part(email, '@', 1), "
+        "greatest(1, 114 - length(split_part(email, '@', 2)) - length(id::text))) "
+        "|| '+dup' || id || '@' || split_part(email, '@', 2)",
+    ),
+]
+
+
+def upgrade() -> None:
+    for _, column, renamed in KEYS:
+        op.execute(
+            f"UPDATE users SET {column} = {renamed}, "
+            "token_version = token_version + 1, updated_at = now() "
+            "WHERE id IN ("
+            f"  SELECT id FROM ("
+            f"    SELECT id, row_number() OVER ("
+            f"      PARTITION BY lower({column}) ORDER BY id"
+            f"    ) AS n FROM users"
+            "  ) ranked WHERE n > 1"
+            ")"
+        )
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, column, _ in KEYS:
+            # left INVALID by an earlier attempt that hit a duplicate
+            op.drop_index(
+                f"{name}_unique",
+                table_name="users",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+            op.create_index(
+                f"{name}_unique",
+                "users",
+                [sa.text(f"lower({column})")],
+                unique=True,
+                postgresql_concurrently=True,
+            )
+            op.drop_index(
+                name, table_name="users", postgresql_concurrently=True, if_exists=True
+            )
+            op.execute(f"ALTER INDEX {name}_unique RENAME TO {name}")
+
+
+def downgrade() -> None:
+    # the renamed duplicates keep their new names
+    with op.get_context().autocommit_block():
+        for name, column, _ in KEYS:
+            op.create_index(
+                f"{name}_plain",
+                "users",
+                [sa.text(f"lower({column})")],
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+            op.drop_index(
+                name, table_name="users", postgresql_concurrently=True, if_exists=True
+            )
+            op.execute(f"ALTER INDEX {name}_plain RENAME TO {name}")
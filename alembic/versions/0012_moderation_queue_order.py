@@ -0,0 +1,58 @@
+"""index the moderation queue in its order
+
+The queue is ordered by spam_score DESC NULLS LAST, id. The 0004 index
+sorts spam_score DESC, which puts NULLs first, and has no id, so Postgres
+sorted every pending comment to read the first page. The replacement
+matches the ORDER BY exactly.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # built CONCURRENTLY, like 0002, so new comments and moderation go on
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_comments_status_spam_score_id",
+            "comments",
+            ["status", sa.text("spam_score DESC NULLS LAST"), "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_comments_status_spam_score",
+            table_name="comments",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_comments_status_spam_score",
+            "comments",
+            ["status", sa.text("spam_score DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_comments_status_spam_score_id",
+            table_name="comments",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
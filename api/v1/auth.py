@@ -3,11 +3,10 @@ from fastapi.responses import JSONResponse
 from fastapi import Depends
 
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import Select, func, or_, select
 
 from api.v1.auth_core import get_current_user, get_optional_user, verify_token
 
-import traceback
 import logging
 
 import utils
@@ -15,7 +14,7 @@ import utils
 from db.base import get_db
 
 from core.config import settings
-from api.v1.auth_core import set_auth_cookies
+from api.v1.auth_core import set_auth_cookies, identity_claims
 
 from db import *
 
@@ -24,6 +23,14 @@ router = APIRouter()
 logger = logging.getLogger(settings.PROJECT_NAME)
 
 
+def login_select(email: str, username: str) -> Select:
+    """The account signing in, by normalized (lower-cased) email or username."""
+    # lower() matches the functional indexes ix_users_lower_email/_username
+    return select(User).where(
+        or_(func.lower(User.email) == email, func.lower(User.username) == username)
+    )
+
+
 @router.post("/login")
 async def login(
     response: Response,
@@ -44,31 +51,27 @@ async def login(
                 content={"detail": "Email or username and password are required"},
             )
 
-        user = (
-            db.query(User)
-            .filter(
-                or_(
-                    User.email == payload.get("email"),
-                    User.username == payload.get("username"),
-                )
-            )
-            .first()
-        )
+        email = (payload.get("email") or "").strip().lower()
+        username = (payload.get("username") or "").strip().lower()
+
+        user = db.scalars(login_select(email, username)).first()
 
-        if not user or payload["password"] != user.password_hash:
+        if (
+            not user
+            or not utils.has_usable_password(user.password_hash)
+            or payload["password"] != user.password_hash
+        ):
             return JSONResponse(
                 status_code=401,
                 content={"detail": "The sign-in details are incorrect."},
             )
 
         response = JSONResponse(content={"detail": "Login successful"})
-        set_auth_cookies(response, str(user.id))
+        set_auth_cookies(response, str(user.id), identity_claims(user))
         return response
 
     except Exception as e:
-        logger.error(
-            msg=f"Internal Server Error while loggin in: {traceback.format_exc()}"
-        )
+        logger.exception("Internal Server Error while logging in")
         return JSONResponse(
             status_code=500, content={"detail": "Internal Server Error"}
         )
@@ -1,11 +1,15 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import NamedTuple, Optional
 import secrets
 
 from fastapi import Depends, HTTPException, Request, Response, status
-from jose import jwt, JWTError
+from sqlalchemy.orm import Session, object_session
 import traceback
+from core.bus import publish, subscribe
 from core.config import settings
+from core.tracing import span
+from db.base import get_db
+from db import User
 
 # ======================
 # CONFIGURATION
@@ -29,17 +33,23 @@ COOKIE_SAMESITE = "lax"
 # ======================
 
 
+# python-jose (and its crypto backends) is imported on first use rather than
+# at startup; after that the import statement is a sys.modules lookup.
+
+
 def _create_token(data: dict, expires_delta: timedelta) -> str:
+    from jose import jwt
+
     payload = data.copy()
     payload["exp"] = datetime.now(tz=timezone.utc) + expires_delta
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
-def create_access_token(user_id: str) -> str:
-    return _create_token(
-        {"sub": user_id, "type": "access"},
-        timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
+def create_access_token(user_id: str, identity: Optional[dict] = None) -> str:
+    data = {"sub": user_id, "type": "access"}
+    if identity is not None:
+        data["idn"] = identity
+    return _create_token(data, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
 
 
 def create_refresh_token(user_id: str) -> str:
@@ -49,8 +59,11 @@ def create_refresh_token(user_id: str) -> str:
 
 
 def verify_token(token: str, token_type: str) -> dict:
+    from jose import jwt
+
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        with span("verify_token", metric="auth"):
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
         if payload.get("type") != token_type:
             raise HTTPException(status_code=401, detail="Invalid token type")
         return payload
@@ -63,24 +76,116 @@ def verify_token(token: str, token_type: str) -> dict:
 
 
 # ======================
-# COOKIE HELPERS
+# IDENTITY CLAIMS
 # ======================
 
 
-def set_auth_cookies(response: Response, user_id: str):
-    access_token = create_access_token(user_id)
-    refresh_token = create_refresh_token(user_id)
-    csrf_token = secrets.token_urlsafe(32)
+class Identity(NamedTuple):
+    """Display snapshot of a user, served from the access token."""
+
+    id: int
+    username: str
+    full_name: Optional[str]
+    avatar_url: Optional[str]
+    version: int
+
+
+# Latest token_version seen by this process, per user id. Claims carrying an
+# older version are treated as stale and re-read from the database.
+_identity_versions: dict[int, int] = {}
+# Set once this process may have missed a version bump (core.bus reset):
+# from then on claims of users not seen since are re-read as well.
+_verify_unseen = False
+
+
+def identity_claims(user: User) -> dict:
+    return {
+        "v": user.token_version or 0,
+        "username": user.username,
+        "full_name": user.full_name,
+        "avatar_url": user.avatar_url,
+    }
+
+
+def note_identity_version(user_id: int, version: int):
+    if version > _identity_versions.get(user_id, -1):
+        _identity_versions[user_id] = version
+
+
+def bump_identity_version(user: User):
+    """Invalidate identity claims issued before this change; call before commit."""
+    user.token_version = (user.token_version or 0) + 1
+    # other worker processes learn the new version when this commits
+    publish(object_session(user), f"identity:{user.id}:{user.token_version}")
+
+
+def _on_identity_change(key: Optional[str]):
+    global _verify_unseen
+
+    if key is None:
+        _identity_versions.clear()
+        _verify_unseen = True
+        return
+    _, user_id, version = key.split(":")
+    note_identity_version(int(user_id), int(version))
+
+
+subscribe("identity:", _on_identity_change)
+
+
+def _identity_from_user(user: User) -> Identity:
+    return Identity(
+        id=user.id,
+        username=user.username,
+        full_name=user.full_name,
+        avatar_url=user.avatar_url,
+        version=user.token_version or 0,
+    )
+
+
+def _identity_from_payload(payload: dict) -> Optional[Identity]:
+    claims = payload.get("idn")
+    if not claims:
+        return None
+
+    user_id = int(payload["sub"])
+    version = claims.get("v", 0)
+    if version < _identity_versions.get(user_id, 0):
+        return None
+    if _verify_unseen and user_id not in _identity_versions:
+        return None
+
+    return Identity(
+        id=user_id,
+        username=claims["username"],
+        full_name=claims.get("full_name"),
+        avatar_url=claims.get("avatar_url"),
+        version=version,
+    )
+
+
+# ======================
+# COOKIE HELPERS
+# ======================
 
+
+def set_access_cookie(response: Response, user_id: str, identity: Optional[dict] = None):
     response.set_cookie(
         ACCESS_COOKIE_NAME,
-        access_token,
+        create_access_token(user_id, identity),
         httponly=True,
         secure=COOKIE_SECURE,
         samesite=COOKIE_SAMESITE,
         max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
     )
 
+
+def set_auth_cookies(response: Response, user_id: str, identity: Optional[dict] = None):
+    refresh_token = create_refresh_token(user_id)
+    csrf_token = secrets.token_urlsafe(32)
+
+    set_access_cookie(response, user_id, identity)
+
     response.set_cookie(
         REFRESH_COOKIE_NAME,
         refresh_token,
@@ -132,6 +237,52 @@ def get_optional_user(request: Request) -> str | None:
         return None
 
 
+def _resolve_identity(payload: dict, db: Session) -> Optional[Identity]:
+    identity = _identity_from_payload(payload)
+    if identity is not None:
+        return identity
+
+    # Token predates identity claims, or a profile update made them stale.
+    user = db.get(User, int(payload["sub"]))
+    if user is None:
+        return None
+    note_identity_version(user.id, user.token_version or 0)
+    return _identity_from_user(user)
+
+
+def get_current_identity(request: Request, db: Session = Depends(get_db)) -> Identity:
+    token = request.cookies.get(ACCESS_COOKIE_NAME)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    payload = verify_token(token, "access")
+    identity = _resolve_identity(payload, db)
+    if identity is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return identity
+
+
+def get_admin_identity(identity: Identity = Depends(get_current_identity)) -> Identity:
+    """The signed-in user, who must be listed in ADMIN_USER_IDS."""
+    if identity.id not in settings.ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return identity
+
+
+def get_optional_identity(
+    request: Request, db: Session = Depends(get_db)
+) -> Optional[Identity]:
+    token = request.cookies.get(ACCESS_COOKIE_NAME)
+    if not token:
+        return None
+
+    try:
+        payload = verify_token(token, "access")
+    except Exception:
+        return None
+    return _resolve_identity(payload, db)
+
+
 def csrf_protect(request: Request):
     """
     Double-submit cookie CSRF protection.
@@ -154,7 +305,9 @@ def csrf_protect(request: Request):
 # ======================
 
 
-def refresh_access_token(request: Request, response: Response):
+def refresh_access_token(
+    request: Request, response: Response, db: Session = Depends(get_db)
+):
     refresh_token = request.cookies.get(REFRESH_COOKIE_NAME)
     if not refresh_token:
         raise HTTPException(status_code=401, detail="Missing refresh token")
@@ -162,13 +315,8 @@ def refresh_access_token(request: Request, response: Response):
     payload = verify_token(refresh_token, "refresh")
     user_id = payload["sub"]
 
-    new_access_token = create_access_token(user_id)
+    user = db.get(User, int(user_id))
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
 
-    response.set_cookie(
-        ACCESS_COOKIE_NAME,
-        new_access_token,
-        httponly=True,
-        secure=COOKIE_SECURE,
-        samesite=COOKIE_SAMESITE,
-        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-    )
+    set_access_cookie(response, user_id, identity_claims(user))
@@ -0,0 +1,43 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+import utils
+from core.availability import is_taken
+from db.base import get_db
+
+router = APIRouter()
+
+VALIDATORS = {
+    "username": utils.validate_username,
+    "email": utils.validate_email,
+}
+
+
+@router.get("/availability")
+def availability(
+    username: Optional[str] = Query(None, max_length=50),
+    email: Optional[str] = Query(None, max_length=120),
+    db: Session = Depends(get_db),
+):
+    """
+    Live signup check. Invalid values are reported without a lookup; valid
+    ones go through the Bloom filter and only hit the database when it
+    reports a possible match.
+    """
+    result = {}
+    for kind, value in (("username", username), ("email", email)):
+        if value is None:
+            continue
+        is_valid, message = VALIDATORS[kind](value)
+        if not is_valid:
+            result[kind] = {"available": False, "valid": False, "message": message}
+            continue
+        available = not is_taken(db, kind, value)
+        result[kind] = {
+            "available": available,
+            "valid": True,
+            "message": "" if available else f"This {kind} is already taken.",
+        }
+    return result
@@ -0,0 +1,272 @@
+"""
+Threaded comments.
+
+Each comment stores its top-level ancestor (root_id), its depth and a
+materialized path of zero-padded ids. A page of threads is then a single
+indexed scan: pick the next top-level comments, and fetch every comment
+whose root is one of them ordered by (root_id, path), which is depth-first
+order. The nested response is assembled in one pass over those rows.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from sqlalchemy import Select, select, update
+from sqlalchemy.orm import Session
+
+import utils
+from core.http_cache import FEED_KEY, purge
+from db.base import get_db
+from db import Comment, CommentStatus, Post, PostStatus
+
+router = APIRouter(prefix="/api/v1/post", tags=["Comments"])
+
+MAX_COMMENT_DEPTH = 6
+COMMENT_PAGE_SIZE = 20
+PATH_SEGMENT_WIDTH = 10
+
+
+# -----------------------------
+# Pydantic Schemas
+# -----------------------------
+
+
+class CommentCreate(BaseModel):
+    author_name: str = Field(..., min_length=1, max_length=100)
+    author_email: str = Field(..., max_length=120)
+    author_website: Optional[str] = Field(default=None, max_length=255)
+    content: str = Field(..., min_length=1, max_length=5000)
+    parent_id: Optional[int] = Field(
+        default=None, description="Reply to this comment instead of the post."
+    )
+
+    model_config = ConfigDict(extra="forbid")
+
+    @field_validator("author_email")
+    @classmethod
+    def validate_author_email(cls, v: str) -> str:
+        is_valid, message = utils.validate_email(v)
+        if not is_valid:
+            raise ValueError(message)
+        return v.strip()
+
+
+class CommentOut(BaseModel):
+    id: int
+    parent_id: Optional[int]
+    author_name: str
+    author_website: Optional[str]
+    content: str
+    status: str
+    depth: int
+    created_at: datetime
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+
+
+def touch_posts(db: Session, post_ids) -> None:
+    """
+    Bump updated_at on posts whose comments changed, so page validators
+    move on, and purge their cached pages once the caller commits.
+    """
+    post_ids = sorted(set(post_ids))
+    if not post_ids:
+        return
+    db.execute(
+        update(Post)
+        .where(Post.id.in_(post_ids))
+        .values(updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    purge(db, [FEED_KEY, *(f"post:{post_id}" for post_id in post_ids)])
+
+
+def _segment(comment_id: int) -> str:
+    return str(comment_id).zfill(PATH_SEGMENT_WIDTH)
+
+
+def _node(row) -> dict:
+    return {
+        "id": row.id,
+        "parent_id": row.parent_id,
+        "author_name": row.author_name,
+        "author_website": row.author_website,
+        "content": row.content,
+        "depth": row.depth,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "replies": [],
+    }
+
+
+def build_thread(rows) -> list[dict]:
+    """
+    Nest rows that arrive in (root_id, path) order. A parent always precedes
+    its replies, so one pass with an id -> node map is enough. Replies whose
+    parent was filtered out (e.g. not approved) are dropped with it.
+    """
+    nodes: dict[int, dict] = {}
+    roots: list[dict] = []
+    for row in rows:
+        node = _node(row)
+        if row.parent_id is None:
+            roots.append(node)
+        else:
+            parent = nodes.get(row.parent_id)
+            if parent is None:
+                continue
+            parent["replies"].append(node)
+        nodes[row.id] = node
+    return roots
+
+
+def thread_page_select(
+    post_id: int, after: Optional[int], limit: int, max_depth: int
+) -> Select:
+    """
+    Approved comments of the first limit + 1 approved threads on post_id
+    after the top-level comment after, in (root_id, path) order.
+    """
+    approved = Comment.status == CommentStatus.APPROVED
+
+    page_roots = (
+        select(Comment.id)
+        .where(Comment.post_id == post_id, Comment.parent_id.is_(None), approved)
+        .order_by(Comment.id)
+        .limit(limit + 1)
+    )
+    if after is not None:
+        page_roots = page_roots.where(Comment.id > after)
+    page_roots = page_roots.subquery()
+
+    return (
+        select(
+            Comment.id,
+            Comment.parent_id,
+            Comment.root_id,
+            Comment.author_name,
+            Comment.author_website,
+            Comment.content,
+            Comment.depth,
+            Comment.created_at,
+        )
+        .where(
+            Comment.root_id.in_(select(page_roots.c.id)),
+            Comment.depth <= max_depth,
+            approved,
+        )
+        .order_by(Comment.root_id, Comment.path)
+    )
+
+
+def parent_select(post_id: int, parent_id: int) -> Select:
+    return select(Comment).where(Comment.id == parent_id, Comment.post_id == post_id)
+
+
+# -----------------------------
+# Endpoints
+# -----------------------------
+
+
+@router.get("/{post_id}/comments", summary="List approved comments as threads")
+def list_comments(
+    post_id: int,
+    after: Optional[int] = Query(
+        None, description="Id of the last top-level comment of the previous page."
+    ),
+    limit: int = Query(COMMENT_PAGE_SIZE, ge=1, le=100),
+    max_depth: int = Query(MAX_COMMENT_DEPTH, ge=0, le=MAX_COMMENT_DEPTH),
+    db: Session = Depends(get_db),
+):
+    rows = db.execute(thread_page_select(post_id, after, limit, max_depth)).all()
+
+    threads = build_thread(rows)
+    next_after = None
+    if len(threads) > limit:
+        threads = threads[:limit]
+        next_after = threads[-1]["id"]
+
+    return {"comments": threads, "next_after": next_after}
+
+
+@router.post(
+    "/{post_id}/comments",
+    response_model=CommentOut,
+    status_code=status.HTTP_201_CREATED,
+    summary="Add a comment or a reply",
+    description="New comments start as pending and appear once approved.",
+)
+def create_comment(
+    post_id: int,
+    payload: CommentCreate,
+    db: Session = Depends(get_db),
+):
+    post_status = db.execute(
+        select(Post.status).where(Post.id == post_id)
+    ).scalar_one_or_none()
+    if post_status != PostStatus.PUBLISHED:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    parent = None
+    if payload.parent_id is not None:
+        parent = db.execute(
+            parent_select(post_id, payload.parent_id)
+        ).scalar_one_or_none()
+        if parent is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=[
+                    {
+                        "loc": ["body", "parent_id"],
+                        "msg": "Parent comment not found on this post",
+                        "type": "value_error",
+                    }
+                ],
+            )
+        # Keep threads bounded: replies past the limit join their parent's level
+        if parent.depth >= MAX_COMMENT_DEPTH:
+            parent = db.get(Comment, parent.parent_id)
+
+    comment = Comment(
+        post_id=post_id,
+        author_name=payload.author_name,
+        author_email=payload.author_email,
+        author_website=payload.author_website,
+        content=payload.content,
+        parent_id=parent.id if parent else None,
+        depth=parent.depth + 1 if parent else 0,
+    )
+    db.add(comment)
+    db.flush()
+
+    # The path needs the new id, so it is filled in after the insert
+    if parent is None:
+        comment.root_id = comment.id
+        comment.path = _segment(comment.id)
+    else:
+        comment.root_id = parent.root_id
+        comment.path = f"{parent.path}/{_segment(comment.id)}"
+
+    # only approved comments appear on (and are counted by) cached pages;
+    # new ones wait in the moderation queue, so spam never touches the post
+    if comment.status == CommentStatus.APPROVED:
+        touch_posts(db, [post_id])
+    db.commit()
+    db.refresh(comment)
+
+    return CommentOut(
+        id=comment.id,
+        parent_id=comment.parent_id,
+        author_name=comment.author_name,
+        author_website=comment.author_website,
+        content=comment.content,
+        status=comment.status.value,
+        depth=comment.depth,
+        created_at=comment.created_at,
+    )
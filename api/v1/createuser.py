@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from fastapi import Depends
+from fastapi import Depends, Query
 
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
 
 
-import traceback
 import logging
 
 import utils
@@ -14,6 +15,10 @@ import utils
 from db.base import get_db
 
 from core.config import settings
+from core.availability import note_taken
+from core.bus import publish
+from core.user_import import ImportFormatError, import_users, parse_rows
+from api.v1.auth_core import Identity, get_admin_identity
 
 from db import *
 
@@ -21,6 +26,8 @@ router = APIRouter()
 
 logger = logging.getLogger(settings.PROJECT_NAME)
 
+IMPORT_MAX_BYTES = 10 * 1024 * 1024
+
 
 @router.post("/create-user")
 async def create_user(request: Request, db: Session = Depends(get_db)):
@@ -79,7 +86,7 @@ async def create_user(request: Request, db: Session = Depends(get_db)):
             del payload["password"]
             payload["password_hash"] = password  # TODO: i'll hash it later
         else:
-            payload["password_hash"] = "UNUSABLE_PASSWORD"
+            payload["password_hash"] = utils.make_unusable_password()
 
         if "email" in payload:
             email_is_valid, email_validation_message = utils.validate_email(
@@ -96,12 +103,15 @@ async def create_user(request: Request, db: Session = Depends(get_db)):
         }
 
         # -------- checks for existing user with primary credentials
+        # case-insensitively, like login and the unique lower() indexes
+        username = filtered_payload["username"].lower()
+        email = (filtered_payload.get("email") or "").lower()
         existing_user = (
             db.query(User)
             .filter(
                 or_(
-                    User.username == filtered_payload.get("username"),
-                    User.email == filtered_payload.get("email"),
+                    func.lower(User.username) == username,
+                    func.lower(User.email) == email,
                 )
             )
             .all()
@@ -109,9 +119,9 @@ async def create_user(request: Request, db: Session = Depends(get_db)):
 
         errors = []
         for user in existing_user:
-            if user.username == filtered_payload.get("username"):
+            if user.username.lower() == username:
                 errors.append("Username already exists.")
-            if user.email == filtered_payload.get("email"):
+            if user.email.lower() == email:
                 errors.append("Email already exists.")
 
         if errors:
@@ -123,16 +133,69 @@ async def create_user(request: Request, db: Session = Depends(get_db)):
         # ---- Create new user
         user = User(**filtered_payload)
         db.add(user)
-        db.commit()
+        publish(db, "availability")
+        try:
+            db.commit()
+        except IntegrityError:
+            # created concurrently since the check above
+            db.rollback()
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Username or email already exists."},
+            )
         db.refresh(user)
+        note_taken(user.username, user.email)
 
         return {"status": "User created successfully"}
 
     except Exception:
-        logger.info(f"{request.method} {request.url.path} - Status: 500")
-        logger.error(
-            f"Internal Server Error during Create User - {traceback.format_exc()}"
+        logger.exception("Internal Server Error during Create User")
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Internal Server Error"},
         )
+
+
+@router.post("/import-users")
+async def import_users_endpoint(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Identity = Depends(get_admin_identity),
+):
+    """
+    Admins only (ADMIN_USER_IDS). Create many users from a CSV (with a header row) or NDJSON body. Rows
+    that fail validation or already exist are listed in "errors" by line
+    number; the rest are created. With dry_run nothing is written.
+    """
+    try:
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > IMPORT_MAX_BYTES:
+                return JSONResponse(
+                    status_code=413,
+                    content={
+                        "error": f"Import must be {IMPORT_MAX_BYTES // (1024 * 1024)}MB or less"
+                    },
+                )
+        try:
+            text = body.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            return JSONResponse(
+                status_code=400, content={"error": "Import must be UTF-8 text"}
+            )
+
+        try:
+            rows = list(parse_rows(text, format))
+        except ImportFormatError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+
+        return await run_in_threadpool(import_users, db, rows, dry_run)
+
+    except Exception:
+        logger.exception("Internal Server Error during Import Users")
         return JSONResponse(
             status_code=500,
             content={"error": "Internal Server Error"},
@@ -0,0 +1,53 @@
+"""
+Export your posts, or the comments on them, as NDJSON or CSV.
+
+The response streams while rows are read, so it starts immediately and
+never holds the whole export in memory. To resume a download that broke
+off, pass after=<id of the last complete row>; a resumed CSV export
+leaves out the header row so it can be appended to the first part.
+"""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+
+from api.v1.auth_core import Identity, get_current_identity
+from core.export import EXPORT_FORMATS, export
+from db.session import engine
+
+router = APIRouter(prefix="/api/v1/export", tags=["Export"])
+
+
+def _export_response(kind: str, format: str, after: int, gzip: bool, user_id: int):
+    headers = {
+        "Content-Disposition": f'attachment; filename="{kind}.{format}"',
+        "Cache-Control": "no-store",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export(engine, kind, format, after, author_id=user_id, gzip=gzip),
+        media_type=EXPORT_FORMATS[format],
+        headers=headers,
+    )
+
+
+@router.get("/posts", summary="Stream your posts as NDJSON or CSV")
+def export_posts(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    after: int = Query(0, ge=0, description="Only posts with a larger id"),
+    gzip: bool = Query(False, description="Compress with Content-Encoding: gzip"),
+    current_user: Identity = Depends(get_current_identity),
+):
+    return _export_response("posts", format, after, gzip, current_user.id)
+
+
+@router.get("/comments", summary="Stream comments on your posts as NDJSON or CSV")
+def export_comments(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    after: int = Query(0, ge=0, description="Only comments with a larger id"),
+    gzip: bool = Query(False, description="Compress with Content-Encoding: gzip"),
+    current_user: Identity = Depends(get_current_identity),
+):
+    return _export_response("comments", format, after, gzip, current_user.id)
@@ -0,0 +1,157 @@
+"""
+Bulk comment moderation for post authors.
+
+Status changes are one UPDATE ... WHERE id = ANY(:ids) no matter how many
+comments are selected, scoped to comments on the caller's own posts. The
+queue lists pending comments highest spam_score first (see core.spam);
+moderated rows leave the pending state, so the first page is always the
+next batch of work and needs no cursor.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from sqlalchemy import Integer, Select, any_, bindparam, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session, aliased
+
+from api.v1.auth_core import Identity, get_current_identity
+from api.v1.comments import touch_posts
+from db.base import get_db
+from db import Comment, CommentStatus, Post
+
+router = APIRouter(prefix="/api/v1/comments", tags=["Moderation"])
+
+MAX_MODERATION_BATCH = 10_000
+
+
+class ModerationRequest(BaseModel):
+    """
+    Select comments by explicit ids, or by post and/or spam score, e.g.
+    {"status": "spam", "post_id": 12, "min_spam_score": 0.95}.
+    """
+
+    status: str = Field(..., examples=["spam"])
+    ids: Optional[List[int]] = Field(default=None, max_length=MAX_MODERATION_BATCH)
+    post_id: Optional[int] = None
+    min_spam_score: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+
+    model_config = ConfigDict(extra="forbid")
+
+    @field_validator("status")
+    @classmethod
+    def validate_status(cls, v: str) -> str:
+        allowed = {s.value for s in CommentStatus}
+        if v not in allowed:
+            raise ValueError(f"status must be one of {sorted(allowed)}")
+        return v
+
+    @model_validator(mode="after")
+    def validate_selection(self):
+        if not self.ids and self.post_id is None and self.min_spam_score is None:
+            raise ValueError("Provide ids, post_id or min_spam_score.")
+        return self
+
+
+class QueuedComment(BaseModel):
+    id: int
+    post_id: int
+    author_name: str
+    author_email: str
+    content: str
+    spam_score: Optional[float]
+    created_at: datetime
+
+
+@router.post("/moderate", summary="Change the status of many comments at once")
+def moderate_comments(
+    payload: ModerationRequest,
+    db: Session = Depends(get_db),
+    current_user: Identity = Depends(get_current_identity),
+):
+    own_posts = select(Post.id).where(Post.author_id == current_user.id)
+    new_status = CommentStatus(payload.status)
+    # the same rows before the update, to tell which were approved
+    before = aliased(Comment)
+
+    stmt = (
+        update(Comment)
+        .where(
+            Comment.post_id.in_(own_posts),
+            before.id == Comment.id,
+            Comment.status != new_status,
+        )
+        .values(status=new_status)
+        .execution_options(synchronize_session=False)
+    )
+    if payload.ids:
+        stmt = stmt.where(
+            Comment.id == any_(bindparam("ids", payload.ids, type_=ARRAY(Integer)))
+        )
+    if payload.post_id is not None:
+        stmt = stmt.where(Comment.post_id == payload.post_id)
+    if payload.min_spam_score is not None:
+        # score-based sweeps only ever touch the unreviewed queue
+        stmt = stmt.where(
+            Comment.status == CommentStatus.PENDING,
+            Comment.spam_score >= payload.min_spam_score,
+        )
+
+    changed = db.execute(stmt.returning(Comment.post_id, before.status)).all()
+    # cached pages show approved comments only, so only a comment entering
+    # or leaving APPROVED changes them
+    touch_posts(
+        db,
+        [
+            post_id
+            for post_id, old_status in changed
+            if CommentStatus.APPROVED in (old_status, new_status)
+        ],
+    )
+    db.commit()
+
+    return {"updated": len(changed)}
+
+
+def queue_select(author_id: int, limit: int, post_id: Optional[int] = None) -> Select:
+    """Pending comments on author_id's posts, highest spam_score first."""
+    query = (
+        select(
+            Comment.id,
+            Comment.post_id,
+            Comment.author_name,
+            Comment.author_email,
+            Comment.content,
+            Comment.spam_score,
+            Comment.created_at,
+        )
+        .join(Post, Post.id == Comment.post_id)
+        .where(
+            Comment.status == CommentStatus.PENDING,
+            Post.author_id == author_id,
+        )
+        .order_by(Comment.spam_score.desc().nulls_last(), Comment.id)
+        .limit(limit)
+    )
+    if post_id is not None:
+        query = query.where(Comment.post_id == post_id)
+    return query
+
+
+@router.get(
+    "/queue",
+    response_model=List[QueuedComment],
+    summary="Pending comments on your posts, most likely spam first",
+)
+def moderation_queue(
+    post_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: Identity = Depends(get_current_identity),
+):
+    query = queue_select(current_user.id, limit, post_id)
+    return [QueuedComment.model_validate(row._asdict()) for row in db.execute(query)]
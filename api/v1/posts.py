@@ -13,22 +13,50 @@ from datetime import datetime
 from typing import List, Optional
 
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from pydantic import BaseModel, Field, ConfigDict, field_validator
-from sqlalchemy import select
+from sqlalchemy import Select, func, select, tuple_
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from api.v1.auth_core import get_current_user, get_optional_user, verify_token
+from api.v1.auth_core import (
+    Identity,
+    get_current_identity,
+    get_current_user,
+    get_optional_user,
+    verify_token,
+)
 
 from fastapi.responses import JSONResponse
 
 # ---- import your stuff ----
 from db.base import get_db
 from api.v1.auth_core import get_current_user
-from db import User, Category, Tag, Post, PostStatus
+from db import User, Category, Tag, Post, PostStatus, RelatedPost, post_tags
+from core.bus import broadcast
+from core.catalog import CatalogEntry, get_catalog, invalidate_catalog
+from core.archive import month_key, record_published
+from core.author_stats import record_post_created
+from core.config import settings
+from core.revisions import add_revision
+from core.jobs import enqueue
+from core.http_cache import (
+    FEED_KEY,
+    cache_headers,
+    is_not_modified,
+    not_modified_response,
+    post_keys,
+    post_slice_validators,
+    purge,
+)
+from web.cards import cursor_after, parse_cursor, tags_by_post
+from web.feed import announce_post
 
 router = APIRouter(prefix="/api/v1/post", tags=["Posts"])
 
+AUTHOR_FK_CONSTRAINT = "posts_author_id_fkey"
+CATALOG_FK_CONSTRAINTS = {"posts_category_id_fkey", "post_tags_tag_id_fkey"}
+
 
 # -----------------------------
 # Pydantic Schemas
@@ -162,6 +190,51 @@ def slugify(value: str) -> str:
     return v[:200] if len(v) > 200 else v
 
 
+def _post_out(
+    post: Post,
+    author: Identity,
+    category: Optional[CatalogEntry],
+    tags: List[CatalogEntry],
+    content: Optional[str],
+) -> PostOut:
+    """Build the response without lazy-loading content, author, category or tags."""
+    data = {
+        name: getattr(post, name)
+        for name in PostOut.model_fields
+        if name not in {"author", "category", "tags", "status", "content"}
+    }
+    # content is deferred; the caller already has what was written
+    data["content"] = content
+    data["status"] = post.status.value
+    data["author"] = author._asdict()
+    data["category"] = category._asdict() if category else None
+    data["tags"] = [t._asdict() for t in tags]
+    return PostOut.model_validate(data)
+
+
+def _published_post_keys(post: Post, tags: List[CatalogEntry]) -> List[str]:
+    """Surrogate keys of every cached page a newly published post appears on."""
+    keys = [
+        FEED_KEY,
+        f"post:{post.id}",
+        f"author:{post.author_id}",
+        f"month:{month_key(post.published_at.year, post.published_at.month)}",
+    ]
+    if post.category_id is not None:
+        keys.append(f"category:{post.category_id}")
+    keys.extend(f"tag:{t.id}" for t in tags)
+    return keys
+
+
+def _violated_constraint(e: IntegrityError) -> Optional[str]:
+    diag = getattr(e.orig, "diag", None)
+    return getattr(diag, "constraint_name", None)
+
+
+def slug_select(slug: str) -> Select:
+    return select(Post.id).where(Post.slug == slug)
+
+
 def ensure_unique_slug(db: Session, base_slug: str) -> str:
     """
     Ensure unique slug by appending -2, -3, ... if needed.
@@ -173,7 +246,7 @@ def ensure_unique_slug(db: Session, base_slug: str) -> str:
     # NOTE: If you use Post.slug unique constraint (you do),
     # this helps avoid IntegrityError most of the time.
     while (
-        db.execute(select(Post.id).where(Post.slug == slug)).scalar_one_or_none()
+        db.execute(slug_select(slug)).scalar_one_or_none()
         is not None
     ):
         suffix = f"-{i}"
@@ -204,25 +277,17 @@ def ensure_unique_slug(db: Session, base_slug: str) -> str:
 def create_post(
     payload: PostCreate,
     db: Session = Depends(get_db),
-    user_id: int | None = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
 ):
 
-    current_user: User = db.query(User).filter(User.id == user_id).first()
-    if not current_user:
-        return JSONResponse(
-            status_code=404,
-            content={
-                "detail": "This user no longer exists in database.",
-                "debug": f"User ID {user_id}",
-            },
-        )
+    catalog = get_catalog(db)
 
     # 1) Validate category if provided
     category = None
     if payload.category_id is not None:
-        category = db.execute(
-            select(Category).where(Category.id == payload.category_id)
-        ).scalar_one_or_none()
+        if payload.category_id not in catalog.categories_by_id:
+            catalog = get_catalog(db, force=True)
+        category = catalog.categories_by_id.get(payload.category_id)
         if category is None:
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -273,37 +338,21 @@ def create_post(
         )
 
     # 4) Resolve tags (optional)
-    tags: List["Tag"] = []
-    if payload.tag_ids:
-        tags = (
-            db.execute(select(Tag).where(Tag.id.in_(payload.tag_ids))).scalars().all()
-        )
-        missing = set(payload.tag_ids) - {t.id for t in tags}
+    tags: List[CatalogEntry] = []
+    if payload.tag_ids or payload.tag_slugs:
+        tags, missing = catalog.tags_for(payload.tag_ids, payload.tag_slugs)
         if missing:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=[
-                    {
-                        "loc": ["body", "tag_ids"],
-                        "msg": f"Unknown tag_ids: {sorted(missing)}",
-                        "type": "value_error",
-                    }
-                ],
-            )
-    elif payload.tag_slugs:
-        tags = (
-            db.execute(select(Tag).where(Tag.slug.in_(payload.tag_slugs)))
-            .scalars()
-            .all()
-        )
-        missing = set(payload.tag_slugs) - {t.slug for t in tags}
+            # The cache may just be behind a tag created in another process
+            catalog = get_catalog(db, force=True)
+            tags, missing = catalog.tags_for(payload.tag_ids, payload.tag_slugs)
         if missing:
+            field = "tag_ids" if payload.tag_ids else "tag_slugs"
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=[
                     {
-                        "loc": ["body", "tag_slugs"],
-                        "msg": f"Unknown tag_slugs: {sorted(missing)}",
+                        "loc": ["body", field],
+                        "msg": f"Unknown {field}: {sorted(missing)}",
                         "type": "value_error",
                     }
                 ],
@@ -322,17 +371,47 @@ def create_post(
         published_at=published_at,
     )
 
-    # Attach relationships (optional but convenient for response)
-    post.author = current_user
-    post.category = category
-    post.tags = tags
-
     db.add(post)
 
     try:
+        db.flush()
+        # Link tags by id; the catalog already vouched for them
+        if tags:
+            db.execute(
+                post_tags.insert(),
+                [{"post_id": post.id, "tag_id": t.id} for t in tags],
+            )
+        # revision 1: the editor autosaves patches against it
+        add_revision(db, post.id, current_user.id, 0, "", payload.content or "")
+        record_post_created(db, current_user.id, published_at)
+        if post_status == PostStatus.PUBLISHED:
+            record_published(
+                db, payload.category_id, [t.id for t in tags], published_at
+            )
+            purge(db, _published_post_keys(post, tags))
+            enqueue(db, "related.update", {"post_id": post.id})
+            announce_post(db, post.id)
         db.commit()
-    except IntegrityError:
+    except IntegrityError as e:
         db.rollback()
+        constraint = _violated_constraint(e)
+        # The author comes from token claims, so a deleted account surfaces here
+        if constraint == AUTHOR_FK_CONSTRAINT:
+            return JSONResponse(
+                status_code=404,
+                content={
+                    "detail": "This user no longer exists in database.",
+                    "debug": f"User ID {current_user.id}",
+                },
+            )
+        if constraint in CATALOG_FK_CONSTRAINTS:
+            # A category or tag vanished after the catalog was cached
+            invalidate_catalog()
+            broadcast("catalog")
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="A referenced category or tag no longer exists.",
+            )
         # If a slug collision still happens under race conditions, surface a clean error
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -340,4 +419,261 @@ def create_post(
         )
 
     db.refresh(post)
-    return post
+    return _post_out(post, current_user, category, tags, payload.content)
+
+
+# -----------------------------
+# Read endpoints
+# -----------------------------
+#
+# The read path skips PostOut: it selects only the requested columns and
+# serializes the rows with orjson, which handles datetimes natively.
+
+POST_LIST_FIELDS = {
+    "id": Post.id,
+    "title": Post.title,
+    "slug": Post.slug,
+    "excerpt": Post.excerpt,
+    "featured_image": Post.featured_image,
+    "view_count": Post.view_count,
+    "published_at": Post.published_at,
+    "updated_at": Post.updated_at,
+}
+# the body is only served one post at a time
+POST_DETAIL_FIELDS = {**POST_LIST_FIELDS, "content": Post.content}
+POST_INCLUDES = ("author", "category", "tags")
+# precomputed by core.related, one post at a time
+POST_DETAIL_INCLUDES = (*POST_INCLUDES, "related")
+POST_PAGE_SIZE = 20
+
+
+def _orjson_response(content, headers: dict) -> Response:
+    return Response(
+        content=orjson.dumps(content), media_type="application/json", headers=headers
+    )
+
+
+def _parse_csv(value: Optional[str], allowed, param: str) -> List[str]:
+    if value is None:
+        return list(allowed)
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[
+                {
+                    "loc": ["query", param],
+                    "msg": f"Unknown {param}: {', '.join(unknown)}. "
+                    f"Allowed: {', '.join(allowed)}",
+                    "type": "value_error",
+                }
+            ],
+        )
+    return list(dict.fromkeys(names))
+
+
+def _shape_rows(db: Session, rows, fields: List[str], include: List[str]) -> list:
+    """Turn rows into dicts of the requested fields and included relations."""
+    if not rows:
+        return []
+
+    catalog = get_catalog(db)
+    if "category" in include and not {
+        row.category_id for row in rows if row.category_id is not None
+    }.issubset(catalog.categories_by_id):
+        catalog = get_catalog(db, force=True)
+    tags = tags_by_post(db, [row.id for row in rows]) if "tags" in include else {}
+
+    items = []
+    for row in rows:
+        item = {"id": row.id}
+        item.update((name, getattr(row, name)) for name in fields)
+        if "author" in include:
+            item["author"] = (
+                {
+                    "id": row.author_id,
+                    "username": row.author_username,
+                    "full_name": row.author_full_name,
+                    "avatar_url": row.author_avatar_url,
+                }
+                if row.author_username is not None
+                else None
+            )
+        if "category" in include:
+            category = catalog.categories_by_id.get(row.category_id)
+            item["category"] = category._asdict() if category else None
+        if "tags" in include:
+            item["tags"] = [t._asdict() for t in tags.get(row.id, [])]
+        items.append(item)
+    return items
+
+
+def _post_select(columns: dict, fields: List[str], include: List[str]):
+    # id, published_at and the foreign keys are always read: they drive the
+    # cursor, includes and surrogate keys even when not returned
+    selected = {
+        "id": Post.id,
+        "published_at": Post.published_at,
+        "author_id": Post.author_id,
+        "category_id": Post.category_id,
+    }
+    selected.update((name, columns[name]) for name in fields)
+    stmt = select(*(column.label(name) for name, column in selected.items()))
+
+    if "author" in include:
+        stmt = stmt.add_columns(
+            User.username.label("author_username"),
+            User.full_name.label("author_full_name"),
+            User.avatar_url.label("author_avatar_url"),
+        ).outerjoin(User, User.id == Post.author_id)
+    return stmt
+
+
+def _related_posts(db: Session, post_id: int) -> list:
+    """The post's precomputed related posts that are still published."""
+    rows = db.execute(
+        select(
+            Post.id,
+            Post.title,
+            Post.slug,
+            Post.excerpt,
+            Post.featured_image,
+            Post.published_at,
+            RelatedPost.score,
+        )
+        .select_from(RelatedPost)
+        .join(Post, Post.id == RelatedPost.related_id)
+        .where(
+            RelatedPost.post_id == post_id, Post.status == PostStatus.PUBLISHED
+        )
+        .order_by(RelatedPost.rank)
+    ).all()
+    return [row._asdict() for row in rows]
+
+
+@router.get("", summary="List published posts")
+def list_posts(
+    request: Request,
+    cursor: Optional[str] = Query(
+        None, description="next_cursor from the previous page."
+    ),
+    limit: int = Query(POST_PAGE_SIZE, ge=1, le=100),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated post fields to return (default: all)."
+    ),
+    include: Optional[str] = Query(
+        None, description="Comma-separated relations to embed: author,category,tags."
+    ),
+    tag: Optional[str] = Query(None, description="Only posts with this tag slug."),
+    category: Optional[str] = Query(
+        None, description="Only posts in this category slug."
+    ),
+    db: Session = Depends(get_db),
+):
+    field_names = _parse_csv(fields, POST_LIST_FIELDS, "fields")
+    include_names = _parse_csv(include or "", POST_INCLUDES, "include")
+    after = parse_cursor(cursor)
+
+    catalog = get_catalog(db)
+    criteria = [Post.status == PostStatus.PUBLISHED]
+    keys = [FEED_KEY]
+    tag_id = None
+    if tag is not None:
+        entry = catalog.tags_by_slug.get(tag) or get_catalog(
+            db, force=True
+        ).tags_by_slug.get(tag)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Tag not found")
+        tag_id = entry.id
+        keys.append(f"tag:{tag_id}")
+    if category is not None:
+        entry = catalog.categories_by_slug.get(category) or get_catalog(
+            db, force=True
+        ).categories_by_slug.get(category)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        criteria.append(Post.category_id == entry.id)
+        keys.append(f"category:{entry.id}")
+
+    validators = post_slice_validators(db, *criteria, tag_id=tag_id)
+    headers = cache_headers(
+        validators, keys, private=False, max_age=settings.VIEW_COUNT_MAX_AGE
+    )
+    if is_not_modified(request, validators):
+        return not_modified_response(headers)
+
+    stmt = _post_select(POST_LIST_FIELDS, field_names, include_names).where(*criteria)
+    if tag_id is not None:
+        stmt = stmt.join(post_tags, post_tags.c.post_id == Post.id).where(
+            post_tags.c.tag_id == tag_id
+        )
+    if after is not None:
+        stmt = stmt.where(tuple_(Post.published_at, Post.id) < tuple_(*after))
+    stmt = stmt.order_by(Post.published_at.desc(), Post.id.desc()).limit(limit + 1)
+
+    rows = db.execute(stmt).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = cursor_after(rows[-1])
+
+    headers["Surrogate-Key"] = " ".join(
+        dict.fromkeys(headers["Surrogate-Key"].split() + post_keys(rows))
+    )
+    return _orjson_response(
+        {
+            "posts": _shape_rows(db, rows, field_names, include_names),
+            "next_cursor": next_cursor,
+        },
+        headers,
+    )
+
+
+@router.get("/{slug}", summary="Get a published post by slug")
+def get_post(
+    slug: str,
+    request: Request,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated post fields to return (default: all)."
+    ),
+    include: Optional[str] = Query(
+        None,
+        description="Comma-separated relations to embed: author,category,tags,related.",
+    ),
+    db: Session = Depends(get_db),
+):
+    field_names = _parse_csv(fields, POST_DETAIL_FIELDS, "fields")
+    include_names = _parse_csv(include or "", POST_DETAIL_INCLUDES, "include")
+    criteria = [Post.slug == slug, Post.status == PostStatus.PUBLISHED]
+
+    variant = ""
+    if "related" in include_names:
+        # related lists are recomputed without touching the post itself
+        variant = str(
+            db.scalar(
+                select(func.max(RelatedPost.computed_at))
+                .join(Post, Post.id == RelatedPost.post_id)
+                .where(*criteria)
+            )
+        )
+    validators = post_slice_validators(db, *criteria, variant=variant)
+    headers = cache_headers(
+        validators, [], private=False, max_age=settings.VIEW_COUNT_MAX_AGE
+    )
+    if is_not_modified(request, validators):
+        return not_modified_response(headers)
+
+    rows = db.execute(
+        _post_select(POST_DETAIL_FIELDS, field_names, include_names).where(*criteria)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    headers["Surrogate-Key"] = " ".join(post_keys(rows))
+    # counted by the record_views middleware (core.analytics)
+    request.state.view_post_id = rows[0].id
+    item = _shape_rows(db, rows, field_names, include_names)[0]
+    if "related" in include_names:
+        item["related"] = _related_posts(db, rows[0].id)
+    return _orjson_response(item, headers)
@@ -0,0 +1,243 @@
+"""
+Post revisions and draft autosave.
+
+The editor sends a patch against the revision it last saw (core.revisions
+delta format). If another save got there first the request is rejected
+with 409 and the editor reloads the latest revision instead of silently
+overwriting it. Autosaves of a draft also update the post itself; for a
+published post they only add revisions until one is applied.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from api.v1.auth_core import Identity, get_current_identity
+from api.v1.comments import touch_posts
+from core.jobs import enqueue
+from core.revisions import (
+    DeltaError,
+    add_revision,
+    apply_delta,
+    latest_revision_number,
+    revision_texts,
+    unified_diff,
+)
+from db.base import get_db
+from db import Post, PostRevision, PostStatus
+
+router = APIRouter(prefix="/api/v1/post", tags=["Revisions"])
+
+
+# -----------------------------
+# Pydantic Schemas
+# -----------------------------
+
+
+class AutosaveIn(BaseModel):
+    base_revision: int = Field(..., ge=1, description="Revision the patch applies to.")
+    patch: List[list] = Field(
+        ...,
+        max_length=10000,
+        description='Line operations: ["=", n], ["-", n], ["+", [lines]].',
+    )
+
+    model_config = ConfigDict(extra="forbid")
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+
+
+def _own_post(db: Session, post_id: int, identity: Identity, lock: bool = False):
+    """
+    Return (id, status) of the caller's post, 404 otherwise. lock=True
+    holds the row until commit, serializing saves of the same post.
+    """
+    stmt = select(Post.id, Post.status).where(
+        Post.id == post_id, Post.author_id == identity.id
+    )
+    if lock:
+        stmt = stmt.with_for_update()
+    post = db.execute(stmt).one_or_none()
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return post
+
+
+def _latest(db: Session, post_id: int, author_id: int) -> int:
+    """
+    Latest revision number. Posts written before revisions existed get
+    their current content recorded as revision 1 first.
+    """
+    latest = latest_revision_number(db, post_id)
+    if latest == 0:
+        content = db.execute(
+            select(Post.content).where(Post.id == post_id)
+        ).scalar_one()
+        add_revision(db, post_id, author_id, 0, "", content or "")
+        db.flush()
+        latest = 1
+    return latest
+
+
+def _texts(db: Session, post_id: int, numbers: list[int]) -> dict[int, str]:
+    texts = revision_texts(db, post_id, numbers)
+    missing = sorted(set(numbers) - texts.keys())
+    if missing:
+        raise HTTPException(
+            status_code=404, detail=f"Revision {missing[0]} not found"
+        )
+    return texts
+
+
+# -----------------------------
+# Endpoints
+# -----------------------------
+
+
+@router.post(
+    "/{post_id}/autosave",
+    status_code=status.HTTP_201_CREATED,
+    summary="Save a patch as a new revision",
+)
+def autosave(
+    post_id: int,
+    payload: AutosaveIn,
+    db: Session = Depends(get_db),
+    identity: Identity = Depends(get_current_identity),
+):
+    post = _own_post(db, post_id, identity, lock=True)
+    latest = _latest(db, post_id, identity.id)
+    if payload.base_revision != latest:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Revision {latest} was saved after revision "
+            f"{payload.base_revision}; reload it and reapply your edit.",
+        )
+
+    base_text = revision_texts(db, post_id, [latest])[latest]
+    try:
+        new_text = apply_delta(base_text, payload.patch)
+    except DeltaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[{"loc": ["body", "patch"], "msg": str(e), "type": "value_error"}],
+        )
+
+    if new_text == base_text:
+        return {"revision": latest, "saved": False}
+
+    revision = add_revision(
+        db, post_id, identity.id, latest, base_text, new_text, payload.patch
+    )
+    if post.status == PostStatus.DRAFT:
+        db.execute(
+            update(Post)
+            .where(Post.id == post_id)
+            .values(content=new_text, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return {"revision": revision.number, "saved": True}
+
+
+@router.get("/{post_id}/revisions", summary="List revisions of a post")
+def list_revisions(
+    post_id: int,
+    db: Session = Depends(get_db),
+    identity: Identity = Depends(get_current_identity),
+):
+    _own_post(db, post_id, identity)
+    rows = db.execute(
+        select(
+            PostRevision.number,
+            PostRevision.snapshot.is_not(None).label("is_snapshot"),
+            PostRevision.created_at,
+        )
+        .where(PostRevision.post_id == post_id)
+        .order_by(PostRevision.number.desc())
+    ).all()
+    return {
+        "revisions": [
+            {
+                "number": row.number,
+                "kind": "snapshot" if row.is_snapshot else "delta",
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            for row in rows
+        ]
+    }
+
+
+@router.get("/{post_id}/revisions/{number}", summary="Get the content of a revision")
+def get_revision(
+    post_id: int,
+    number: int,
+    db: Session = Depends(get_db),
+    identity: Identity = Depends(get_current_identity),
+):
+    _own_post(db, post_id, identity)
+    return {"number": number, "content": _texts(db, post_id, [number])[number]}
+
+
+@router.get(
+    "/{post_id}/revisions/{number}/diff", summary="Diff a revision against another"
+)
+def diff_revisions(
+    post_id: int,
+    number: int,
+    against: int = Query(..., ge=1, description="Revision to compare with."),
+    db: Session = Depends(get_db),
+    identity: Identity = Depends(get_current_identity),
+):
+    _own_post(db, post_id, identity)
+    texts = _texts(db, post_id, [against, number])
+    return {
+        "from": against,
+        "to": number,
+        "diff": unified_diff(
+            texts[against], texts[number], f"revision {against}", f"revision {number}"
+        ),
+    }
+
+
+@router.post(
+    "/{post_id}/revisions/{number}/apply",
+    summary="Make a revision the post's current content",
+)
+def apply_revision(
+    post_id: int,
+    number: int,
+    db: Session = Depends(get_db),
+    identity: Identity = Depends(get_current_identity),
+):
+    post = _own_post(db, post_id, identity, lock=True)
+    latest = _latest(db, post_id, identity.id)
+    texts = _texts(db, post_id, [number, latest])
+    content = texts[number]
+    # the applied text becomes the newest revision, so the editor's next
+    # autosave must be based on it and can't silently undo the apply
+    if content != texts[latest]:
+        latest = add_revision(
+            db, post_id, identity.id, latest, texts[latest], content
+        ).number
+    db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(content=content)
+        .execution_options(synchronize_session=False)
+    )
+    # bumps updated_at and purges the post's cached pages
+    touch_posts(db, [post_id])
+    if post.status == PostStatus.PUBLISHED:
+        enqueue(db, "related.update", {"post_id": post_id})
+    db.commit()
+    return {"revision": latest, "restored": number, "applied": True}
@@ -0,0 +1,73 @@
+"""
+Traffic stats from the hourly page-view rollups (see core.analytics).
+Raw page views are never read here; the newest hour fills in as the
+rollup runs. They cover the whole site, so only admins (ADMIN_USER_IDS)
+may read them.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from api.v1.auth_core import Identity, get_admin_identity
+from core.analytics import ROLLUP_KINDS
+from db.base import get_db
+from db import Post, PageViewRollup
+
+router = APIRouter(prefix="/api/v1/stats", tags=["Stats"])
+
+
+@router.get("", summary="Top posts, paths or referrers and hourly views")
+def stats(
+    kind: str = Query("post", pattern=f"^({'|'.join(ROLLUP_KINDS)})$"),
+    hours: int = Query(24 * 7, ge=1, le=24 * 90, description="How far back to look."),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    admin: Identity = Depends(get_admin_identity),
+):
+    since = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(
+        hours=hours - 1
+    )
+    window = (PageViewRollup.kind == kind, PageViewRollup.hour >= since)
+
+    views = func.sum(PageViewRollup.views)
+    top = db.execute(
+        select(PageViewRollup.key, views.label("views"))
+        .where(*window)
+        .group_by(PageViewRollup.key)
+        .order_by(views.desc(), PageViewRollup.key)
+        .limit(limit)
+    ).all()
+    hourly = db.execute(
+        select(PageViewRollup.hour, views.label("views"))
+        .where(*window)
+        .group_by(PageViewRollup.hour)
+        .order_by(PageViewRollup.hour)
+    ).all()
+
+    items = [{"key": row.key, "views": int(row.views)} for row in top]
+    if kind == "post" and items:
+        posts = {
+            row.id: row
+            for row in db.execute(
+                select(Post.id, Post.title, Post.slug).where(
+                    Post.id.in_([int(item["key"]) for item in items])
+                )
+            )
+        }
+        for item in items:
+            post = posts.get(int(item["key"]))
+            item["title"] = post.title if post else None
+            item["slug"] = post.slug if post else None
+
+    return {
+        "kind": kind,
+        "since": since,
+        "total": sum(int(row.views) for row in hourly),
+        "top": items,
+        "hourly": [{"hour": row.hour, "views": int(row.views)} for row in hourly],
+    }
@@ -2,18 +2,19 @@ import os
 import uuid
 import shutil
 from datetime import datetime
-from PIL import Image, UnidentifiedImageError
 
 
 from fastapi import APIRouter, Request, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from fastapi import Depends
+from starlette.formparsers import FormParser, MultiPartException, MultiPartParser
 
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
 
 
-import traceback
 import logging
 
 import utils
@@ -21,17 +22,81 @@ import utils
 from db.base import get_db
 
 from core.config import settings
+from core.availability import note_taken
+from core.bus import publish
+from core.jobs import enqueue
+from core.http_cache import purge
+from core.images import ImageRejected, probe
+from core.tasks import UPLOAD_DIR
 
 from db import *
 
-from api.v1.auth_core import get_current_user, get_optional_user, verify_token
+from api.v1.auth_core import (
+    get_current_user,
+    get_optional_user,
+    verify_token,
+    bump_identity_version,
+    identity_claims,
+    note_identity_version,
+    set_access_cookie,
+)
 
 router = APIRouter()
 
 logger = logging.getLogger(settings.PROJECT_NAME)
 
 
-AVATAR_DIR = "static/images/avatars"
+# multipart framing and the text fields on top of the largest allowed image
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+async def _capped(stream, limit: int):
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit:
+            raise UploadTooLarge()
+        yield chunk
+
+
+async def _read_form(request: Request, limit: int):
+    """
+    Parse the form while it streams in, failing as soon as the body passes
+    limit. Starlette spools file parts to disk past 1MB, so memory stays
+    bounded whatever the client sends.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise UploadTooLarge()
+
+    stream = _capped(request.stream(), limit)
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        parser = MultiPartParser(request.headers, stream, max_files=1, max_fields=10)
+    else:
+        parser = FormParser(request.headers, stream)
+    return await parser.parse()
+
+
+def _save_upload(file, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file, out)
+
+
+def _store_avatar(file, path: str):
+    """Copy the upload into place and check its header; runs off the loop."""
+    file.seek(0)
+    _save_upload(file, path)
+    try:
+        probe(path)
+    except ImageRejected:
+        os.remove(path)
+        raise
 
 
 @router.post("/update-profile")
@@ -44,23 +109,38 @@ async def update_profile(
         if user_id is None:
             return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
 
-        form = await request.form()
+        try:
+            form = await _read_form(
+                request, settings.AVATAR_MAX_BYTES + FORM_OVERHEAD_BYTES
+            )
+        except UploadTooLarge:
+            limit_mb = settings.AVATAR_MAX_BYTES // (1024 * 1024)
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Upload is larger than {limit_mb}MB"},
+            )
+        except MultiPartException as e:
+            return JSONResponse(status_code=400, content={"detail": e.message})
 
         full_name = form.get("full_name")
         username = form.get("username")
         email = form.get("email")
         bio = form.get("bio")
         avatar = form.get("avatar")
+        avatar_pending = False
 
         user = db.query(User).filter(User.id == user_id).first()
 
         if not user:
             return JSONResponse(status_code=404, content={"detail": "User not found"})
 
+        # compared case-insensitively, like login and the unique lower() indexes
         if username and username != user.username:
             exists = (
                 db.query(User)
-                .filter(User.username == username, User.id != user_id)
+                .filter(
+                    func.lower(User.username) == username.lower(), User.id != user_id
+                )
                 .first()
             )
             if exists:
@@ -72,7 +152,9 @@ async def update_profile(
 
         if email and email != user.email:
             exists = (
-                db.query(User).filter(User.email == email, User.id != user_id).first()
+                db.query(User)
+                .filter(func.lower(User.email) == email.lower(), User.id != user_id)
+                .first()
             )
             if exists:
                 return JSONResponse(
@@ -88,45 +170,51 @@ async def update_profile(
             user.bio = bio[:160]
 
         if avatar and hasattr(avatar, "filename") and avatar.filename:
-            os.makedirs(AVATAR_DIR, exist_ok=True)
-
-            try:
-                avatar.file.seek(0)
-                img = Image.open(avatar.file)
-                img.verify()
-                avatar.file.seek(0)
-            except UnidentifiedImageError:
-                return JSONResponse(
-                    status_code=400,
-                    content={"detail": "Uploaded file is not a valid image"},
-                )
-
-            if img.format not in {"JPEG", "PNG", "WEBP"}:
+            if avatar.size is not None and avatar.size > settings.AVATAR_MAX_BYTES:
                 return JSONResponse(
-                    status_code=400,
-                    content={"detail": "Unsupported image format"},
+                    status_code=413,
+                    content={"detail": "Avatar image is too large"},
                 )
 
-            unique_name = f"avatar-{user.id}-su.webp"
-            save_path = os.path.join(AVATAR_DIR, unique_name)
-
-            image = Image.open(avatar.file).convert("RGBA")
-            image.save(save_path, format="WEBP", quality=85)
-
-            user.avatar_url = f"/static/images/avatars/{unique_name}"
+            # Keep the raw upload; decoding and WebP encoding happen in the
+            # avatar.process job
+            source = os.path.join(UPLOAD_DIR, f"avatar-{user.id}-{uuid.uuid4().hex}")
+            try:
+                await run_in_threadpool(_store_avatar, avatar.file, source)
+            except ImageRejected as e:
+                return JSONResponse(status_code=400, content={"detail": str(e)})
+            enqueue(db, "avatar.process", {"user_id": user.id, "source": source})
+            avatar_pending = True
 
         user.updated_at = datetime.utcnow()
-
-        db.commit()
+        bump_identity_version(user)
+        publish(db, "availability")
+        purge(db, [f"author:{user.id}"])
+
+        try:
+            db.commit()
+        except IntegrityError:
+            # taken concurrently since the checks above
+            db.rollback()
+            return JSONResponse(
+                status_code=400,
+                content={"detail": "Username or email already in use"},
+            )
         db.refresh(user)
 
-        return {"message": "Profile update success"}
+        note_identity_version(user.id, user.token_version)
+        note_taken(user.username, user.email)
+        response = JSONResponse(
+            content={
+                "message": "Profile update success",
+                "avatar_pending": avatar_pending,
+            }
+        )
+        set_access_cookie(response, str(user.id), identity_claims(user))
+        return response
 
     except Exception:
-        logger.info(f"{request.method} {request.url.path} - Status: 500")
-        logger.error(
-            f"Internal Server Error during Update User - {traceback.format_exc()}"
-        )
+        logger.exception("Internal Server Error during Update User")
         return JSONResponse(
             status_code=500,
             content={"error": "Something Went Wrong"},
@@ -0,0 +1,220 @@
+"""
+Page-view analytics.
+
+The record_views middleware appends one small tuple per page view to an
+in-memory ring buffer; the request never waits on the database. Every
+ANALYTICS_FLUSH_SECONDS a background task drains the buffer into the
+append-only page_views table with one multi-row INSERT, and adds the
+post views to posts.view_count and author_stats (core.author_stats) in the
+same transaction. If the database
+falls behind, the buffer keeps the newest ANALYTICS_BUFFER_SIZE views and
+counts what it dropped; views drained by a flush that fails are lost,
+which is the price of never blocking a request on them.
+
+Every ROLLUP_SECONDS one process (whichever takes the advisory lock)
+aggregates page_views into hourly counts per post, path and referrer in
+page_view_rollups, recomputing from the hour before the newest one already
+rolled up so late flushes are included. Raw views are deleted after
+RAW_RETENTION, and only once no later rollup will read them again.
+/api/v1/stats reads only the rollups.
+
+    python -m core.analytics rollup
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from core.author_stats import add_views
+from core.config import settings
+from db import PageView, PageViewRollup
+from db.session import SessionLocal
+
+logger = logging.getLogger(settings.PROJECT_NAME)
+
+ROLLUP_SECONDS = 5 * 60
+RAW_RETENTION = timedelta(days=7)
+# how far before the newest rolled-up hour each rollup starts again
+ROLLUP_LOOKBACK = timedelta(hours=1)
+INSERT_BATCH_SIZE = 5000
+# any constant works; it only has to differ from other advisory locks
+ROLLUP_LOCK_KEY = 0x70616765
+
+# paths that are never page views; post reads under /api are recorded by
+# the route itself setting request.state.view_post_id, and /feed is the
+# live feed catching up in pages that were already counted
+EXCLUDED_PREFIXES = ("/static", "/img", "/api", "/favicon", "/feed")
+BOT_REGEX = re.compile(r"bot|crawl|spider|slurp|preview|monitor|curl|wget", re.I)
+
+ROLLUP_KINDS = {
+    "post": "post_id::text",
+    "path": "path",
+    "referrer": "referrer",
+}
+
+
+class ViewBuffer:
+    def __init__(self, size: int):
+        self._events: deque = deque(maxlen=size)
+        self.dropped = 0
+
+    def append(self, event: tuple):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+
+    def drain(self) -> list[tuple]:
+        # popleft is atomic, so views recorded meanwhile are never lost
+        events = []
+        for _ in range(len(self._events)):
+            events.append(self._events.popleft())
+        return events
+
+
+buffer = ViewBuffer(settings.ANALYTICS_BUFFER_SIZE)
+
+
+def referrer_host(referrer: Optional[str], own_host: str) -> Optional[str]:
+    """The referring site, or None for direct visits and internal links."""
+    if not referrer:
+        return None
+    host = (urlsplit(referrer).hostname or "").removeprefix("www.")
+    if not host or host == own_host.split(":")[0].removeprefix("www."):
+        return None
+    return host[:255]
+
+
+def record_view(
+    method: str,
+    path: str,
+    status: int,
+    user_agent: str,
+    referrer: Optional[str],
+    host: str,
+    post_id: Optional[int],
+):
+    if method != "GET" or status not in (200, 304):
+        return
+    if post_id is None and path.startswith(EXCLUDED_PREFIXES):
+        return
+    if BOT_REGEX.search(user_agent or ""):
+        return
+    buffer.append(
+        (datetime.utcnow(), path[:255], post_id, referrer_host(referrer, host))
+    )
+
+
+def post_view_counts(events: list[tuple]) -> dict[int, int]:
+    """Views per post id in a batch of buffered events."""
+    return dict(Counter(post_id for _, _, post_id, _ in events if post_id is not None))
+
+
+def flush(db: Session) -> int:
+    """
+    Write buffered views to page_views and add them to the posts' and
+    authors' view counts. Returns how many were written.
+    """
+    events = buffer.drain()
+    if buffer.dropped:
+        logger.warning(f"Page-view buffer full, dropped {buffer.dropped} views")
+        buffer.dropped = 0
+    for i in range(0, len(events), INSERT_BATCH_SIZE):
+        db.execute(
+            insert(PageView),
+            [
+                {"ts": ts, "path": path, "post_id": post_id, "referrer": referrer}
+                for ts, path, post_id, referrer in events[i : i + INSERT_BATCH_SIZE]
+            ],
+        )
+    add_views(db, post_view_counts(events))
+    db.commit()
+    return len(events)
+
+
+def rollup(db: Session) -> bool:
+    """
+    Recompute hourly counts from the hour before the newest rolled-up hour
+    onwards. Returns False if another process holds the rollup lock.
+    """
+    if not db.scalar(select(func.pg_try_advisory_xact_lock(ROLLUP_LOCK_KEY))):
+        db.rollback()
+        return False
+
+    newest = db.scalar(select(func.max(PageViewRollup.hour)))
+    # workers flush up to ANALYTICS_FLUSH_SECONDS late, so views stamped in
+    # the previous hour can still land after the new hour was rolled up
+    start = newest - ROLLUP_LOOKBACK if newest else datetime.min
+    for kind, key in ROLLUP_KINDS.items():
+        db.execute(
+            text(
+                "INSERT INTO page_view_rollups (hour, kind, key, views) "
+                f"SELECT date_trunc('hour', ts), :kind, {key}, count(*) "
+                f"FROM page_views WHERE ts >= :start AND {key} IS NOT NULL "
+                "GROUP BY 1, 3 "
+                "ON CONFLICT (hour, kind, key) DO UPDATE SET views = EXCLUDED.views"
+            ),
+            {"kind": kind, "start": start},
+        )
+    # only views that are both past retention and before this rollup's
+    # window, which every later rollup starts after
+    db.execute(
+        delete(PageView).where(
+            PageView.ts < min(start, datetime.utcnow() - RAW_RETENTION)
+        )
+    )
+    db.commit()  # also releases the lock
+    return True
+
+
+async def run_analytics(stop: asyncio.Event):
+    """Flush the buffer and roll up periodically until stop is set."""
+
+    def flush_and_maybe_rollup(do_rollup: bool):
+        db = SessionLocal()
+        try:
+            flush(db)
+            if do_rollup:
+                rollup(db)
+        finally:
+            db.close()
+
+    last_rollup = 0.0
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), settings.ANALYTICS_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        do_rollup = loop.time() - last_rollup >= ROLLUP_SECONDS
+        try:
+            await asyncio.to_thread(flush_and_maybe_rollup, do_rollup)
+            if do_rollup:
+                last_rollup = loop.time()
+        except Exception:
+            logger.exception("Page-view flush failed")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rollup"]:
+        print("usage: python -m core.analytics rollup")
+        sys.exit(2)
+
+    db = SessionLocal()
+    try:
+        if rollup(db):
+            print("page views rolled up")
+        else:
+            print("another process is rolling up; try again shortly")
+    finally:
+        db.close()
@@ -0,0 +1,127 @@
+"""
+Precomputed published-post counts for tag, category and monthly archives.
+
+Counts are bumped in the same transaction that publishes a post, so archive
+pages read them with a primary-key lookup instead of a COUNT(*) over posts.
+rebuild_archive_counts() recomputes everything from scratch and can be run
+with `python -m core.archive rebuild` if the counters ever drift.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, extract, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db import ArchiveCount, Post, PostStatus, post_tags
+
+TAG = "tag"
+CATEGORY = "category"
+MONTH = "month"
+
+
+def month_key(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
+
+
+def _archive_keys(
+    category_id: Optional[int], tag_ids: Iterable[int], published_at: datetime
+) -> list[tuple[str, str]]:
+    keys = [(MONTH, month_key(published_at.year, published_at.month))]
+    if category_id is not None:
+        keys.append((CATEGORY, str(category_id)))
+    keys.extend((TAG, str(tag_id)) for tag_id in tag_ids)
+    return keys
+
+
+def _bump(db: Session, keys: list[tuple[str, str]], delta: int):
+    if not keys:
+        return
+    stmt = insert(ArchiveCount).values(
+        [{"kind": kind, "key": key, "post_count": max(delta, 0)} for kind, key in keys]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ArchiveCount.kind, ArchiveCount.key],
+        set_={"post_count": ArchiveCount.post_count + delta},
+    )
+    db.execute(stmt)
+
+
+def record_published(
+    db: Session,
+    category_id: Optional[int],
+    tag_ids: Iterable[int],
+    published_at: datetime,
+):
+    """Count a newly published post. Call inside the publishing transaction."""
+    _bump(db, _archive_keys(category_id, tag_ids, published_at), 1)
+
+
+def record_unpublished(
+    db: Session,
+    category_id: Optional[int],
+    tag_ids: Iterable[int],
+    published_at: datetime,
+):
+    """Undo record_published for a post that is archived or deleted."""
+    _bump(db, _archive_keys(category_id, tag_ids, published_at), -1)
+
+
+def get_archive_count(db: Session, kind: str, key: str) -> int:
+    row = db.get(ArchiveCount, (kind, key))
+    return row.post_count if row else 0
+
+
+def rebuild_archive_counts(db: Session):
+    """Recompute every archive count from posts. Commits."""
+    published = Post.status == PostStatus.PUBLISHED
+    year = extract("year", Post.published_at)
+    month = extract("month", Post.published_at)
+
+    rows = []
+    for y, m, n in db.execute(
+        select(year, month, func.count(Post.id))
+        .where(published, Post.published_at.is_not(None))
+        .group_by(year, month)
+    ):
+        rows.append({"kind": MONTH, "key": month_key(int(y), int(m)), "post_count": n})
+
+    for category_id, n in db.execute(
+        select(Post.category_id, func.count(Post.id))
+        .where(published, Post.category_id.is_not(None))
+        .group_by(Post.category_id)
+    ):
+        rows.append({"kind": CATEGORY, "key": str(category_id), "post_count": n})
+
+    for tag_id, n in db.execute(
+        select(post_tags.c.tag_id, func.count(Post.id))
+        .join(Post, Post.id == post_tags.c.post_id)
+        .where(published)
+        .group_by(post_tags.c.tag_id)
+    ):
+        rows.append({"kind": TAG, "key": str(tag_id), "post_count": n})
+
+    db.execute(delete(ArchiveCount))
+    if rows:
+        db.execute(insert(ArchiveCount), rows)
+    db.commit()
+
+
+if __name__ == "__main__":
+    import sys
+
+    from db.session import SessionLocal
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m core.archive rebuild")
+        sys.exit(2)
+
+    db = SessionLocal()
+    try:
+        rebuild_archive_counts(db)
+        print("archive counts rebuilt")
+    finally:
+        db.close()
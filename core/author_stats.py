@@ -0,0 +1,205 @@
+"""
+Precomputed author profile statistics.
+
+One author_stats row per author holds their post count, published count,
+total views and last publish date, so a profile header is a primary-key
+lookup instead of aggregates over posts. Post changes bump the row in the
+same transaction that makes them; page-view flushes add to posts.view_count
+and to the author's total_views in one statement.
+
+reconcile() recomputes every row from posts and can be run with
+`python -m core.author_stats reconcile` or as the author_stats.reconcile
+job if the counters ever drift.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Mapping, Optional
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db import AuthorStats, Post, PostStatus
+
+
+def _bump(
+    db: Session,
+    author_id: Optional[int],
+    posts: int = 0,
+    published: int = 0,
+    views: int = 0,
+    published_at: Optional[datetime] = None,
+):
+    # posts of a deleted account have no author to count against
+    if author_id is None:
+        return
+    stmt = insert(AuthorStats).values(
+        author_id=author_id,
+        post_count=max(posts, 0),
+        published_count=max(published, 0),
+        total_views=max(views, 0),
+        last_published_at=published_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AuthorStats.author_id],
+        set_={
+            "post_count": AuthorStats.post_count + posts,
+            "published_count": AuthorStats.published_count + published,
+            "total_views": AuthorStats.total_views + views,
+            # greatest() ignores NULLs
+            "last_published_at": func.greatest(
+                AuthorStats.last_published_at, stmt.excluded.last_published_at
+            ),
+        },
+    )
+    db.execute(stmt)
+
+
+def _refresh_last_published(db: Session, author_id: int):
+    db.execute(
+        update(AuthorStats)
+        .where(AuthorStats.author_id == author_id)
+        .values(
+            last_published_at=select(func.max(Post.published_at))
+            .where(Post.author_id == author_id, Post.status == PostStatus.PUBLISHED)
+            .scalar_subquery()
+        )
+    )
+
+
+def record_post_created(
+    db: Session, author_id: Optional[int], published_at: Optional[datetime] = None
+):
+    """Count a new post; pass published_at if it was published right away."""
+    _bump(
+        db,
+        author_id,
+        posts=1,
+        published=1 if published_at else 0,
+        published_at=published_at,
+    )
+
+
+def record_post_published(
+    db: Session, author_id: Optional[int], published_at: datetime
+):
+    """Count an existing draft that was just published."""
+    _bump(db, author_id, published=1, published_at=published_at)
+
+
+def record_post_unpublished(db: Session, author_id: Optional[int]):
+    """
+    Uncount a published post that was archived. Call after the status
+    change is flushed so the last publish date is recomputed without it.
+    """
+    if author_id is None:
+        return
+    _bump(db, author_id, published=-1)
+    _refresh_last_published(db, author_id)
+
+
+def record_post_deleted(
+    db: Session, author_id: Optional[int], was_published: bool, view_count: int
+):
+    """Uncount a deleted post and its views. Call after the delete is flushed."""
+    if author_id is None:
+        return
+    _bump(
+        db,
+        author_id,
+        posts=-1,
+        published=-1 if was_published else 0,
+        views=-(view_count or 0),
+    )
+    if was_published:
+        _refresh_last_published(db, author_id)
+
+
+def add_views(db: Session, views: Mapping[int, int]):
+    """
+    Add views per post id to posts.view_count and their authors'
+    total_views. Views of posts that no longer exist are dropped.
+    """
+    if not views:
+        return
+    post_ids = sorted(views)
+    # a plain UPDATE, so posts.updated_at stays put; pages pick the new
+    # counts up with the next view count period (core.http_cache)
+    db.execute(
+        text(
+            "WITH v AS ("
+            "  SELECT * FROM unnest(CAST(:post_ids AS integer[]), "
+            "                       CAST(:views AS integer[])) AS v(post_id, views)"
+            "), bumped AS ("
+            "  UPDATE posts SET view_count = coalesce(posts.view_count, 0) + v.views "
+            "  FROM v WHERE posts.id = v.post_id "
+            "  RETURNING posts.author_id, v.views"
+            ") "
+            "INSERT INTO author_stats "
+            "(author_id, post_count, published_count, total_views) "
+            "SELECT author_id, 0, 0, sum(views) FROM bumped "
+            "WHERE author_id IS NOT NULL GROUP BY author_id ORDER BY author_id "
+            "ON CONFLICT (author_id) DO UPDATE "
+            "SET total_views = author_stats.total_views + EXCLUDED.total_views"
+        ),
+        {"post_ids": post_ids, "views": [views[i] for i in post_ids]},
+    )
+
+
+def get_author_stats(db: Session, author_id: int) -> AuthorStats:
+    """The author's stats; all zeros (and not added to db) if there are none."""
+    row = db.get(AuthorStats, author_id)
+    if row is None:
+        row = AuthorStats(
+            author_id=author_id,
+            post_count=0,
+            published_count=0,
+            total_views=0,
+            last_published_at=None,
+        )
+    return row
+
+
+def reconcile(db: Session):
+    """Recompute every author's stats from posts. Commits."""
+    # waits for transactions that already bumped a row and holds off new
+    # bumps until the recount commits, so none is lost or counted twice
+    db.execute(text("LOCK TABLE author_stats IN EXCLUSIVE MODE"))
+
+    published = Post.status == PostStatus.PUBLISHED
+    result = db.execute(
+        select(
+            Post.author_id.label("author_id"),
+            func.count(Post.id).label("post_count"),
+            func.count(Post.id).filter(published).label("published_count"),
+            func.coalesce(func.sum(Post.view_count), 0).label("total_views"),
+            func.max(Post.published_at).filter(published).label("last_published_at"),
+        )
+        .where(Post.author_id.is_not(None))
+        .group_by(Post.author_id)
+    )
+    rows = [dict(row._mapping) for row in result]
+
+    db.execute(delete(AuthorStats))
+    if rows:
+        db.execute(insert(AuthorStats), rows)
+    db.commit()
+
+
+if __name__ == "__main__":
+    import sys
+
+    from db.session import SessionLocal
+
+    if sys.argv[1:] != ["reconcile"]:
+        print("usage: python -m core.author_stats reconcile")
+        sys.exit(2)
+
+    db = SessionLocal()
+    try:
+        reconcile(db)
+        print("author stats reconciled")
+    finally:
+        db.close()
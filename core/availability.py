@@ -0,0 +1,169 @@
+"""
+Username and email availability.
+
+Each process keeps a Bloom filter of every normalized (lower-cased)
+username and email. A miss proves the name is free without touching the
+database; only a possible hit, taken names plus about 1% false
+positives, costs an indexed lookup on lower(username) or lower(email).
+
+The filter is built at startup and fed by create-user and update-profile
+in this process. Other processes' writes are picked up by a sync that
+reads users created or updated since the last one (two indexed range
+scans, on users.id and users.updated_at): at most every
+SYNC_INTERVAL_SECONDS, or on the next check after they publish
+"availability" (core.bus). Names that are given up stay in the filter (Bloom filters can't
+delete) and just take the database path until the next restart.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import CompoundSelect, func, select, union
+from sqlalchemy.orm import Session
+
+from core.bus import subscribe
+from db import User
+
+FALSE_POSITIVE_RATE = 0.01
+# room to grow before the false positive rate degrades
+MIN_CAPACITY = 10_000
+SYNC_INTERVAL_SECONDS = 5
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = FALSE_POSITIVE_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value: str):
+        positions = self._positions(value)
+        # setting a bit is a read-modify-write of its byte; without the lock
+        # two threads could drop each other's bits and cause false misses
+        with self._lock:
+            for p in positions:
+                self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(value)
+        )
+
+
+def normalize(value: str) -> str:
+    return value.strip().lower()
+
+
+def _key(kind: str, value: str) -> str:
+    return f"{kind}:{normalize(value)}"
+
+
+_filter: Optional[BloomFilter] = None
+_build_lock = threading.Lock()
+_synced_at = 0.0
+_sync_from: Optional[datetime] = None
+_max_id = 0
+
+
+def build_filter(db: Session):
+    """(Re)build the filter from every user, streaming rows."""
+    global _filter, _synced_at, _sync_from, _max_id
+
+    with _build_lock:
+        started = datetime.utcnow()
+        count, max_id = db.execute(
+            select(func.count(User.id), func.coalesce(func.max(User.id), 0))
+        ).one()
+        # two entries per user, sized for twice today's users
+        bloom = BloomFilter(max(MIN_CAPACITY, 4 * count))
+        rows = db.execute(
+            select(User.username, User.email).execution_options(yield_per=5000)
+        )
+        for username, email in rows:
+            bloom.add(_key("username", username))
+            bloom.add(_key("email", email))
+
+        _filter = bloom
+        _max_id = max_id
+        # overlap the window a little so a write committed mid-build isn't lost
+        _sync_from = started - timedelta(seconds=SYNC_INTERVAL_SECONDS)
+        _synced_at = time.monotonic()
+
+
+def sync_select(max_id: int, since: datetime) -> CompoundSelect:
+    """Users created after max_id or updated since since."""
+    # a UNION rather than OR, so each half is a range scan on the
+    # primary key and ix_users_updated_at respectively
+    columns = (User.id, User.username, User.email)
+    return union(
+        select(*columns).where(User.id > max_id),
+        select(*columns).where(User.updated_at >= since),
+    )
+
+
+def _sync(db: Session):
+    global _synced_at, _sync_from, _max_id
+
+    if time.monotonic() - _synced_at < SYNC_INTERVAL_SECONDS:
+        return
+    with _build_lock:
+        if time.monotonic() - _synced_at < SYNC_INTERVAL_SECONDS:
+            return
+        started = datetime.utcnow()
+        rows = db.execute(sync_select(_max_id, _sync_from)).all()
+        for row in rows:
+            _filter.add(_key("username", row.username))
+            _filter.add(_key("email", row.email))
+            _max_id = max(_max_id, row.id)
+        _sync_from = started - timedelta(seconds=SYNC_INTERVAL_SECONDS)
+        _synced_at = time.monotonic()
+
+
+def _sync_soon(key):
+    global _synced_at
+    _synced_at = 0.0
+
+
+subscribe("availability", _sync_soon)
+
+
+def note_taken(username: Optional[str] = None, email: Optional[str] = None):
+    """Record names this process just committed."""
+    if _filter is None:
+        return
+    if username:
+        _filter.add(_key("username", username))
+    if email:
+        _filter.add(_key("email", email))
+
+
+def is_taken(db: Session, kind: str, value: str) -> bool:
+    """kind is "username" or "email"."""
+    if _filter is None:
+        build_filter(db)
+    else:
+        _sync(db)
+
+    if _key(kind, value) not in _filter:
+        return False
+
+    column = User.username if kind == "username" else User.email
+    return (
+        db.execute(
+            select(User.id).where(func.lower(column) == normalize(value)).limit(1)
+        ).first()
+        is not None
+    )
@@ -0,0 +1,368 @@
+"""
+Cross-process cache invalidation.
+
+Process-local caches (identity versions, the category/tag catalog, the
+availability filter, the related-posts index) subscribe to key prefixes.
+Code that changes what one of them caches calls publish(db, key) before
+committing; once the transaction commits, the matching handlers run in
+this process and in every other worker.
+
+The transport is Postgres LISTEN/NOTIFY: the NOTIFY is issued inside the
+publishing transaction, so it is delivered exactly when the change
+commits. Where LISTEN is unavailable (e.g. behind PgBouncer in
+transaction mode) INVALIDATION_BUS=unix sends a datagram after commit to
+one socket per worker in INVALIDATION_SOCKET_DIR instead, which only
+reaches workers on the same host.
+
+Every message carries its sender's id and a per-sender sequence number.
+Messages from concurrent transactions may arrive out of order, so a gap
+only counts once it has stayed open for GAP_GRACE_SECONDS. A worker with
+a gap, one that has just reconnected its listener, or one that receives
+an oversized message resets every subscriber, and each drops its whole
+cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.session import engine
+
+logger = logging.getLogger(settings.PROJECT_NAME)
+
+CHANNEL = "cache_invalidation"
+RESET_KEY = "*"
+# NOTIFY payloads are limited to 8000 bytes
+MAX_PAYLOAD_BYTES = 7900
+GAP_GRACE_SECONDS = 2.0
+# a gap this large is a reset rather than something to wait out
+MAX_GAP = 1000
+CHECK_INTERVAL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 30
+RECONNECT_SECONDS = 2.0
+
+_PENDING = "invalidate_on_commit"
+
+# (prefix, handler): handler(key) for each matching key, handler(None) on reset
+_subscribers: list[tuple[str, Callable[[Optional[str]], None]]] = []
+
+
+def subscribe(prefix: str, handler: Callable[[Optional[str]], None]):
+    _subscribers.append((prefix, handler))
+
+
+def reset():
+    """Tell every subscriber to drop everything it caches."""
+    for _, handler in _subscribers:
+        try:
+            handler(None)
+        except Exception:
+            logger.exception("Cache reset handler failed")
+
+
+def _dispatch(keys: Iterable[str]):
+    for key in keys:
+        if key == RESET_KEY:
+            reset()
+            continue
+        for prefix, handler in _subscribers:
+            if key.startswith(prefix):
+                try:
+                    handler(key)
+                except Exception:
+                    logger.exception(f"Invalidation handler for {key!r} failed")
+
+
+# -----------------------------
+# Sending
+# -----------------------------
+
+_send_lock = threading.Lock()
+_origin: Optional[str] = None
+_origin_pid: Optional[int] = None
+_seq = 0
+
+
+def _payload(keys: list[str]) -> str:
+    global _origin, _origin_pid, _seq
+
+    with _send_lock:
+        # a forked worker must not continue its parent's sequence
+        if _origin_pid != os.getpid():
+            _origin = f"{os.getpid()}-{secrets.token_hex(4)}"
+            _origin_pid = os.getpid()
+            _seq = 0
+        _seq += 1
+        header = f"{_origin}:{_seq}"
+
+    body = " ".join(keys)
+    if len(body.encode()) > MAX_PAYLOAD_BYTES:
+        body = RESET_KEY
+    return f"{header}|{body}"
+
+
+def _socket_path(pid: int) -> str:
+    return os.path.join(settings.INVALIDATION_SOCKET_DIR, f"{pid}.sock")
+
+
+def _send_datagrams(payload: str):
+    data = payload.encode()
+    own = _socket_path(os.getpid())
+    try:
+        entries = list(os.scandir(settings.INVALIDATION_SOCKET_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if not entry.name.endswith(".sock") or entry.path == own:
+            continue
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            sock.sendto(data, entry.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # left behind by a worker that died
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        except BlockingIOError:
+            pass  # the receiver is backed up; it will see the gap
+        finally:
+            sock.close()
+
+
+def publish(db: Session, *keys: str):
+    """Invalidate keys in every process once db's transaction commits."""
+    db.info.setdefault(_PENDING, []).extend(keys)
+
+
+def broadcast(*keys: str):
+    """Invalidate keys in every other process now, outside a transaction."""
+    payload = _payload(list(dict.fromkeys(keys)))
+    if settings.INVALIDATION_BUS == "postgres":
+        with engine.connect() as conn:
+            conn.execute(select(func.pg_notify(CHANNEL, payload)))
+            conn.commit()
+    elif settings.INVALIDATION_BUS == "unix":
+        _send_datagrams(payload)
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_in_transaction(session: Session):
+    keys = session.info.get(_PENDING)
+    if keys and settings.INVALIDATION_BUS == "postgres":
+        payload = _payload(list(dict.fromkeys(keys)))
+        session.execute(select(func.pg_notify(CHANNEL, payload)))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    keys = session.info.pop(_PENDING, None)
+    if not keys:
+        return
+    keys = list(dict.fromkeys(keys))
+    if settings.INVALIDATION_BUS == "unix":
+        _send_datagrams(_payload(keys))
+    _dispatch(keys)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session: Session, previous_transaction):
+    session.info.pop(_PENDING, None)
+
+
+# -----------------------------
+# Receiving
+# -----------------------------
+
+
+class _Receiver:
+    def __init__(self):
+        self.high: dict[str, int] = {}
+        # (origin, seq) -> when the gap was noticed
+        self.missing: dict[tuple[str, int], float] = {}
+
+    def handle(self, payload: str):
+        header, _, body = payload.partition("|")
+        origin, _, seq = header.rpartition(":")
+        if origin == _origin:
+            return  # already applied on commit
+        try:
+            seq = int(seq)
+        except ValueError:
+            logger.warning(f"Ignoring malformed invalidation message {payload!r}")
+            return
+
+        high = self.high.get(origin)
+        if high is not None and seq > high + 1:
+            if seq - high > MAX_GAP:
+                self.missing.clear()
+                reset()
+            else:
+                now = time.monotonic()
+                self.missing.update(((origin, s), now) for s in range(high + 1, seq))
+        else:
+            self.missing.pop((origin, seq), None)
+        self.high[origin] = max(seq, high or 0)
+        _dispatch(body.split())
+
+    def check(self):
+        cutoff = time.monotonic() - GAP_GRACE_SECONDS
+        if any(noticed < cutoff for noticed in self.missing.values()):
+            logger.warning(
+                f"Missed {len(self.missing)} invalidation messages; resetting caches"
+            )
+            self.missing.clear()
+            reset()
+
+
+class _PostgresListener:
+    def __init__(self, receiver: _Receiver):
+        self.receiver = receiver
+        self.conn = None
+
+    def connect(self) -> int:
+        import psycopg2
+
+        self.conn = psycopg2.connect(settings.SQLALCHEMY_DATABASE_URI)
+        self.conn.autocommit = True
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return self.conn.fileno()
+
+    def read(self):
+        self.conn.poll()
+        while self.conn.notifies:
+            self.receiver.handle(self.conn.notifies.pop(0).payload)
+
+    def heartbeat(self):
+        # a connection that died quietly only shows it when used. psycopg2
+        # moves NOTIFYs arriving during the query into conn.notifies and
+        # consumes their socket data, so the reader never fires for them;
+        # run_bus drains them with read() afterwards.
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class _SocketListener:
+    def __init__(self, receiver: _Receiver):
+        self.receiver = receiver
+        self.sock = None
+        self.path = None
+
+    def connect(self) -> int:
+        os.makedirs(settings.INVALIDATION_SOCKET_DIR, exist_ok=True)
+        self.path = _socket_path(os.getpid())
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+        return self.sock.fileno()
+
+    def read(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            self.receiver.handle(data.decode())
+
+    def heartbeat(self):
+        pass
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+async def run_bus(stop: asyncio.Event):
+    """Receive invalidations until stop is set; one per worker process."""
+    if settings.INVALIDATION_BUS not in ("postgres", "unix"):
+        return
+
+    receiver = _Receiver()
+    listener = (
+        _PostgresListener(receiver)
+        if settings.INVALIDATION_BUS == "postgres"
+        else _SocketListener(receiver)
+    )
+    loop = asyncio.get_running_loop()
+    failed = asyncio.Event()
+    fd = None
+    ever_connected = False
+    last_heartbeat = loop.time()
+
+    def on_readable():
+        try:
+            listener.read()
+        except Exception:
+            logger.exception("Invalidation listener failed")
+            failed.set()
+
+    def disconnect():
+        nonlocal fd
+        if fd is not None:
+            loop.remove_reader(fd)
+            fd = None
+        listener.close()
+
+    try:
+        while not stop.is_set():
+            if fd is None:
+                try:
+                    fd = await asyncio.to_thread(listener.connect)
+                except Exception:
+                    logger.warning("Invalidation listener can't connect", exc_info=True)
+                    listener.close()
+                else:
+                    loop.add_reader(fd, on_readable)
+                    failed.clear()
+                    if ever_connected:
+                        # whatever was sent while disconnected is lost
+                        reset()
+                    ever_connected = True
+
+            try:
+                await asyncio.wait_for(
+                    stop.wait(),
+                    CHECK_INTERVAL_SECONDS if fd is not None else RECONNECT_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                pass
+            receiver.check()
+
+            if fd is not None and loop.time() - last_heartbeat > HEARTBEAT_SECONDS:
+                last_heartbeat = loop.time()
+                try:
+                    await asyncio.to_thread(listener.heartbeat)
+                except Exception:
+                    logger.warning("Invalidation listener lost its connection")
+                    failed.set()
+                else:
+                    on_readable()
+            if failed.is_set():
+                disconnect()
+    finally:
+        disconnect()
@@ -0,0 +1,133 @@
+"""
+Process-local cache of categories and tags.
+
+Both tables are tiny and change rarely, but /compose and create_post used to
+read them on every request. The cache keeps compact id/slug maps plus the
+JSON the editor embeds, and only asks the database for a cheap version
+fingerprint (row counts and newest created_at) once per check interval.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from core.bus import subscribe
+from db import Category, Tag
+
+CATALOG_CHECK_INTERVAL_SECONDS = 30
+
+
+class CatalogEntry(NamedTuple):
+    id: int
+    name: str
+    slug: str
+
+
+class Catalog:
+    def __init__(self, version: tuple, categories: list, tags: list):
+        self.version = version
+        self.categories_by_id = {c.id: c for c in categories}
+        self.categories_by_slug = {c.slug: c for c in categories}
+        self.tags_by_id = {t.id: t for t in tags}
+        self.tags_by_slug = {t.slug: t for t in tags}
+        self.categories_json = json.dumps([c._asdict() for c in categories])
+        self.tags_json = json.dumps([t._asdict() for t in tags])
+
+    def tags_for(
+        self, ids: Optional[Iterable[int]] = None, slugs: Optional[Iterable[str]] = None
+    ) -> tuple[list[CatalogEntry], set]:
+        """Return (found tags, missing keys) for ids, or for slugs if no ids."""
+        if ids:
+            index, keys = self.tags_by_id, ids
+        else:
+            index, keys = self.tags_by_slug, slugs or ()
+
+        found, missing = [], set()
+        for key in dict.fromkeys(keys):
+            entry = index.get(key)
+            if entry is None:
+                missing.add(key)
+            else:
+                found.append(entry)
+        return found, missing
+
+
+_lock = threading.Lock()
+_catalog: Optional[Catalog] = None
+_checked_at = 0.0
+
+
+def _fetch_version(db: Session) -> tuple:
+    row = db.execute(
+        select(
+            select(func.count(Category.id)).scalar_subquery(),
+            select(func.max(Category.created_at)).scalar_subquery(),
+            select(func.count(Tag.id)).scalar_subquery(),
+            select(func.max(Tag.created_at)).scalar_subquery(),
+        )
+    ).one()
+    return tuple(row)
+
+
+def _load(db: Session, version: tuple) -> Catalog:
+    categories = [
+        CatalogEntry(*row)
+        for row in db.execute(
+            select(Category.id, Category.name, Category.slug).order_by(
+                Category.name.asc()
+            )
+        )
+    ]
+    tags = [
+        CatalogEntry(*row)
+        for row in db.execute(
+            select(Tag.id, Tag.name, Tag.slug).order_by(Tag.name.asc())
+        )
+    ]
+    return Catalog(version, categories, tags)
+
+
+def get_catalog(db: Session, force: bool = False) -> Catalog:
+    """
+    Return the cached catalog, re-checking the version fingerprint at most
+    once per interval. force=True re-checks immediately, e.g. after a lookup
+    missed and the cache may simply be behind.
+    """
+    global _catalog, _checked_at
+
+    catalog = _catalog
+    if (
+        catalog is not None
+        and not force
+        and time.monotonic() - _checked_at < CATALOG_CHECK_INTERVAL_SECONDS
+    ):
+        return catalog
+
+    with _lock:
+        version = _fetch_version(db)
+        if _catalog is None or _catalog.version != version:
+            _catalog = _load(db, version)
+        _checked_at = time.monotonic()
+        return _catalog
+
+
+def invalidate_catalog():
+    """
+    Drop the cached catalog. Renames don't change the version fingerprint,
+    so code that edits a category or tag in place should call this, and
+    publish "catalog" (core.bus) so other processes drop theirs too.
+    """
+    global _catalog, _checked_at
+
+    with _lock:
+        _catalog = None
+        _checked_at = 0.0
+
+
+subscribe("catalog", lambda key: invalidate_catalog())
@@ -15,9 +15,75 @@ class Settings(BaseSettings):
 
     JWT_SECRET_KEY: str
 
+    # users who may call admin-only endpoints such as bulk user import
+    ADMIN_USER_IDS: List[int] = []
+
     AWS_ACCESS_KEY: str
     AWS_SECRET_ACCESS_KEY: str
 
+    SPAM_MODEL_PATH: str = "data/spam-model.npz"
+
+    # largest avatar upload accepted, in bytes
+    AVATAR_MAX_BYTES: int = 5 * 1024 * 1024
+
+    # resized /img variants, evicted least recently served first
+    IMAGE_CACHE_DIR: str = "data/img-cache"
+    IMAGE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # startup: skip create_all once migrations own the schema, and how many
+    # pooled DB connections to open before serving
+    AUTO_CREATE_SCHEMA: bool = True
+    WARM_POOL_CONNECTIONS: int = 2
+
+    # background jobs: worker tasks run inside each app process unless
+    # disabled in favour of a dedicated `python -m core.jobs` process
+    JOBS_IN_PROCESS: bool = True
+    JOB_CONCURRENCY: int = 2
+
+    # fronting cache (nginx/Varnish): how long it may hold public pages, and
+    # where to send PURGE requests carrying surrogate keys on writes
+    SURROGATE_MAX_AGE: int = 24 * 60 * 60
+    # view counts are flushed without touching posts.updated_at, so pages
+    # showing them change version (and leave the fronting cache) this often
+    VIEW_COUNT_MAX_AGE: int = 60 * 60
+    CACHE_PURGE_URL: str = ""
+    CACHE_PURGE_HEADER: str = "Surrogate-Key"
+
+    # logging: JSON lines written by a background thread, rotated when the
+    # file reaches LOG_MAX_BYTES or every LOG_ROTATE_SECONDS; only a sample
+    # of ordinary access records is kept
+    LOG_FILE: str = "logs/app.log"
+    LOG_LEVEL: str = "INFO"
+    LOG_MAX_BYTES: int = 50 * 1024 * 1024
+    LOG_ROTATE_SECONDS: int = 24 * 60 * 60
+    LOG_BACKUP_COUNT: int = 14
+    ACCESS_LOG_SAMPLE_RATE: float = 0.1
+    ACCESS_LOG_SLOW_MS: float = 500
+
+    # tracing: every response gets a Server-Timing breakdown unless
+    # disabled; TRACE_SAMPLE_RATE of requests are also exported as
+    # OTLP/JSON lines to TRACE_FILE (empty to disable)
+    SERVER_TIMING: bool = True
+    TRACE_SAMPLE_RATE: float = 0.01
+    TRACE_FILE: str = "logs/traces.jsonl"
+
+    # page-view analytics: views are buffered in memory (newest
+    # ANALYTICS_BUFFER_SIZE kept) and written in bulk every
+    # ANALYTICS_FLUSH_SECONDS
+    ANALYTICS_BUFFER_SIZE: int = 100_000
+    ANALYTICS_FLUSH_SECONDS: float = 10
+
+    # cross-process cache invalidation (core.bus): "postgres" for
+    # LISTEN/NOTIFY, "unix" for datagram sockets in INVALIDATION_SOCKET_DIR
+    # (single host), empty to disable
+    INVALIDATION_BUS: str = "postgres"
+    INVALIDATION_SOCKET_DIR: str = "data/bus"
+
+    # live feed (web.feed): messages a slow /ws/feed client may fall behind
+    # by before it is disconnected, and the most sockets one process serves
+    FEED_QUEUE_SIZE: int = 32
+    FEED_MAX_CONNECTIONS: int = 10_000
+
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
@@ -0,0 +1,192 @@
+"""
+HTTP validators, conditional GET and surrogate keys.
+
+Pages derive a weak ETag and Last-Modified from max(posts.updated_at) and
+count(*) over the slice they show (the count moves when a post leaves it,
+which the max alone may not) plus max(users.updated_at), since author
+names and avatars appear on every card; ix_users_updated_at makes that
+last one an index lookup. View counts are added without touching
+updated_at, so the start of the current VIEW_COUNT_MAX_AGE period is part
+of the validators too: counts on a cached page are at most that old.
+Routes compute the validators before
+querying posts or rendering templates, and answer 304 when the client
+already has that version.
+
+Anonymous responses are public. Browsers must revalidate, but a fronting
+cache (nginx, Varnish) may hold them via Surrogate-Control, keyed by
+Surrogate-Key (feed, post:{id}, author:{id}, ...). Writes call purge(), which
+enqueues a cache.purge job in the same transaction, so the cache is only
+told once the change is committed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+from fastapi import Request, Response
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.jobs import enqueue
+from db import Post, User, post_tags
+
+FEED_KEY = "feed"
+
+# Template edits change every rendered page, so they are part of each ETag
+_TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates"
+_TEMPLATE_VERSION = str(
+    max((p.stat().st_mtime_ns for p in _TEMPLATE_DIR.glob("*.html")), default=0)
+)
+
+
+class Validators(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def _make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def view_count_period() -> datetime:
+    """Start of the current VIEW_COUNT_MAX_AGE period (naive UTC)."""
+    now = int(time.time())
+    return datetime.utcfromtimestamp(now - now % settings.VIEW_COUNT_MAX_AGE)
+
+
+def post_slice_select(*criteria, tag_id: Optional[int] = None) -> Select:
+    """max(posts.updated_at) and count over the slice, and max(users.updated_at)."""
+    posts_slice = select(
+        func.max(Post.updated_at).label("updated"), func.count().label("count")
+    ).where(*criteria)
+    if tag_id is not None:
+        posts_slice = posts_slice.join(
+            post_tags, post_tags.c.post_id == Post.id
+        ).where(post_tags.c.tag_id == tag_id)
+    posts_slice = posts_slice.subquery()
+    users_max = select(func.max(User.updated_at))
+    return select(
+        posts_slice.c.updated, posts_slice.c.count, users_max.scalar_subquery()
+    )
+
+
+def post_slice_validators(
+    db: Session, *criteria, tag_id: Optional[int] = None, variant: str = ""
+) -> Validators:
+    """
+    Validators for a page listing the posts matching criteria (optionally
+    restricted to a tag). variant distinguishes renderings of the same data,
+    e.g. the signed-in user's identity.
+    """
+    posts_updated, posts_count, users_updated = db.execute(
+        post_slice_select(*criteria, tag_id=tag_id)
+    ).one()
+
+    counted = view_count_period()
+    stamps = [t for t in (posts_updated, users_updated) if t is not None]
+    return Validators(
+        etag=_make_etag(
+            posts_updated,
+            posts_count,
+            users_updated,
+            counted,
+            variant,
+            _TEMPLATE_VERSION,
+        ),
+        last_modified=max(stamps + [counted]),
+    )
+
+
+def file_validators(path: Path, variant: str = "") -> Validators:
+    stat = path.stat()
+    return Validators(
+        etag=_make_etag(stat.st_mtime_ns, stat.st_size, variant, _TEMPLATE_VERSION),
+        last_modified=datetime.utcfromtimestamp(stat.st_mtime),
+    )
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, validators: Validators) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or _opaque(validators.etag) in {_opaque(t) for t in tags}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and validators.last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return validators.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def cache_headers(
+    validators: Validators,
+    surrogate_keys: Iterable[str],
+    private: bool,
+    max_age: Optional[int] = None,
+) -> dict:
+    """max_age caps how long a fronting cache may hold a public response."""
+    headers = {"ETag": validators.etag}
+    if validators.last_modified:
+        headers["Last-Modified"] = format_datetime(
+            validators.last_modified.replace(tzinfo=timezone.utc), usegmt=True
+        )
+
+    if private:
+        headers["Cache-Control"] = "private, no-cache"
+    else:
+        headers["Cache-Control"] = "public, no-cache"
+        max_age = min(max_age or settings.SURROGATE_MAX_AGE, settings.SURROGATE_MAX_AGE)
+        headers["Surrogate-Control"] = f"max-age={max_age}"
+        headers["Surrogate-Key"] = " ".join(dict.fromkeys(surrogate_keys))
+    return headers
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names change with their content (hashed names)."""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def post_keys(posts) -> list[str]:
+    """Surrogate keys for every post and author shown on a list page."""
+    keys = []
+    for post in posts:
+        keys.append(f"post:{post.id}")
+        if post.author_id is not None:
+            keys.append(f"author:{post.author_id}")
+    return keys
+
+
+def purge(db: Session, keys: Iterable[str]):
+    """Ask the fronting cache to drop pages tagged with keys, after commit."""
+    keys = list(dict.fromkeys(keys))
+    if settings.CACHE_PURGE_URL and keys:
+        enqueue(db, "cache.purge", {"keys": keys})
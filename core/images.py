@@ -0,0 +1,90 @@
+"""
+Image checks and encoding shared by avatar processing and /img resizing.
+
+Nothing here decodes more pixels than it has to: probe() only reads the
+header, and encode_webp() asks JPEG decoders for a reduced-size draft
+before thumbnailing. Outputs are named by a hash of their bytes, so a URL
+never changes meaning and can be cached forever, and identical images
+share one file.
+
+Pillow is imported inside each function to keep it off app startup.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP"}
+# 40 megapixels: larger than any real photo, far below a decompression bomb
+MAX_PIXELS = 40_000_000
+WEBP_QUALITY = 82
+
+
+class ImageRejected(ValueError):
+    pass
+
+
+def probe(path: str) -> tuple[str, tuple[int, int]]:
+    """Return (format, size) from the header, or raise ImageRejected."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            image_format, size = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ImageRejected("Uploaded file is not a valid image")
+
+    if image_format not in ALLOWED_FORMATS:
+        raise ImageRejected("Unsupported image format")
+    if size[0] * size[1] > MAX_PIXELS:
+        raise ImageRejected("Image dimensions are too large")
+    return image_format, size
+
+
+def encode_webp(path: str, box: tuple[int, int], crop: bool = False) -> bytes:
+    """
+    Decode path scaled down to fit box (or to fill and center-crop it) and
+    encode it as WebP. A box height of 0 keeps the aspect ratio.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        if image.width * image.height > MAX_PIXELS:
+            raise ImageRejected("Image dimensions are too large")
+        if not box[1]:
+            box = (box[0], max(1, round(image.height * box[0] / image.width)))
+        # JPEG decodes straight to 1/2, 1/4 or 1/8 scale, never below box
+        image.draft(None, box)
+        image = ImageOps.exif_transpose(image)
+        if crop:
+            image = ImageOps.fit(image, box, Image.Resampling.LANCZOS)
+        else:
+            image.thumbnail(box, Image.Resampling.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        out = io.BytesIO()
+        image.convert("RGBA" if has_alpha else "RGB").save(
+            out, format="WEBP", quality=WEBP_QUALITY, method=4
+        )
+        return out.getvalue()
+
+
+def write_content_hashed(directory: str, prefix: str, data: bytes) -> str:
+    """
+    Write data as {prefix}-{hash}.webp unless that file already exists,
+    and return the file name.
+    """
+    name = f"{prefix}-{hashlib.sha256(data).hexdigest()[:16]}.webp"
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        # readers never see a partial file
+        os.replace(tmp, path)
+    return name
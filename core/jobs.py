@@ -0,0 +1,200 @@
+"""
+Durable background jobs backed by the jobs outbox table.
+
+Request handlers call enqueue() inside their own transaction, so a job
+exists exactly when the change that needs it was committed. Workers claim
+due jobs with SELECT ... FOR UPDATE SKIP LOCKED, run the registered
+handler, delete the row on success and reschedule it with exponential
+backoff on failure. A job left RUNNING by a crashed worker is picked up
+again once its lock is older than LOCK_TIMEOUT.
+
+Workers run as asyncio tasks inside each app process (see main.lifespan)
+and can also run on their own:
+
+    python -m core.jobs --concurrency 4
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import random
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db import Job, JobStatus
+from db.session import SessionLocal
+
+logger = logging.getLogger(settings.PROJECT_NAME)
+
+POLL_INTERVAL_SECONDS = 1.0
+LOCK_TIMEOUT = timedelta(minutes=5)
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 60 * 60
+
+# kind -> handler(payload). Handlers may be plain functions (run in a
+# thread) or coroutines.
+_handlers: dict[str, Callable[[dict], Any]] = {}
+
+
+def job(kind: str):
+    """Register a handler: @job("avatar.process") def handle(payload): ..."""
+
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+
+    return decorator
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    delay: Optional[timedelta] = None,
+    max_attempts: int = 5,
+) -> Job:
+    """Add a job to the caller's transaction; it runs only if that commits."""
+    new_job = Job(
+        kind=kind,
+        payload=payload or {},
+        run_after=datetime.utcnow() + (delay or timedelta()),
+        max_attempts=max_attempts,
+    )
+    db.add(new_job)
+    return new_job
+
+
+def _backoff(attempts: int) -> timedelta:
+    seconds = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=seconds * random.uniform(0.5, 1.5))
+
+
+def _claim() -> Optional[tuple[int, str, dict]]:
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        claimed = db.execute(
+            select(Job)
+            .where(
+                or_(
+                    and_(Job.status == JobStatus.PENDING, Job.run_after <= now),
+                    and_(
+                        Job.status == JobStatus.RUNNING,
+                        Job.locked_at < now - LOCK_TIMEOUT,
+                    ),
+                )
+            )
+            .order_by(Job.run_after)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+        if claimed is None:
+            return None
+
+        claimed.status = JobStatus.RUNNING
+        claimed.locked_at = now
+        claimed.attempts += 1
+        db.commit()
+        return claimed.id, claimed.kind, dict(claimed.payload)
+    finally:
+        db.close()
+
+
+def _finish(job_id: int, error: Optional[str]):
+    db = SessionLocal()
+    try:
+        row = db.get(Job, job_id)
+        if row is None:
+            return
+        if error is None:
+            db.delete(row)
+        elif row.attempts >= row.max_attempts:
+            row.status = JobStatus.FAILED
+            row.last_error = error
+        else:
+            row.status = JobStatus.PENDING
+            row.locked_at = None
+            row.last_error = error
+            row.run_after = datetime.utcnow() + _backoff(row.attempts)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _run_one() -> bool:
+    claimed = await asyncio.to_thread(_claim)
+    if claimed is None:
+        return False
+
+    job_id, kind, payload = claimed
+    error = None
+    handler = _handlers.get(kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind {kind!r}")
+        if inspect.iscoroutinefunction(handler):
+            await handler(payload)
+        else:
+            await asyncio.to_thread(handler, payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception(f"Job {job_id} ({kind}) failed")
+
+    await asyncio.to_thread(_finish, job_id, error)
+    return True
+
+
+async def _worker_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            ran = await _run_one()
+        except Exception:
+            logger.exception("Job worker error")
+            ran = False
+        if not ran:
+            try:
+                await asyncio.wait_for(stop.wait(), POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_workers(concurrency: int, stop: asyncio.Event):
+    # handlers live in core.tasks; importing it registers them
+    import core.tasks  # noqa: F401
+
+    await asyncio.gather(*(_worker_loop(stop) for _ in range(concurrency)))
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+
+    # run through the imported module so core.tasks registers its handlers
+    # on the same registry the workers read, not on this __main__ copy
+    from core import jobs
+
+    parser = argparse.ArgumentParser(description="Run background job workers.")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        print(f"job worker started with concurrency {args.concurrency}")
+        await jobs.run_workers(args.concurrency, stop)
+
+    asyncio.run(main())
@@ -0,0 +1,223 @@
+"""
+Application logging.
+
+Handlers on the request path only put records on a queue; a QueueListener
+thread formats them as JSON lines and writes them to LOG_FILE, which
+rotates by size and by time. Each record carries the id of the request
+that produced it. INFO access records are sampled, except slow requests
+and errors, which are always kept; sampled records note their rate so
+counts can be scaled back up.
+
+Several worker processes may share one LOG_FILE: a process that finds the
+file rotated by another reopens it instead of rotating it again.
+"""
+
+from __future__ import annotations
+
+import atexit
+import copy
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import Queue
+from typing import Optional
+
+from core.config import settings
+
+ACCESS_LOGGER = f"{settings.PROJECT_NAME}.access"
+# sampled request traces (core.tracing), written verbatim to TRACE_FILE
+TRACE_LOGGER = f"{settings.PROJECT_NAME}.traces"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRS
+        )
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Captures what only the logging thread knows (message arguments, the
+    traceback, the current request id) before the record crosses to the
+    listener thread, but leaves formatting to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if record.stack_info:
+            record.exc_text = (record.exc_text or "") + record.stack_info
+            record.stack_info = None
+        record.request_id = request_id_var.get()
+        return record
+
+
+class AccessSampler(logging.Filter):
+    def __init__(self, rate: float, slow_ms: float):
+        super().__init__()
+        self.rate = rate
+        self.slow_ms = slow_ms
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        if getattr(record, "status", 0) >= 500:
+            return True
+        if getattr(record, "duration_ms", 0) >= self.slow_ms:
+            return True
+        if self.rate >= 1:
+            return True
+        record.sample_rate = self.rate
+        return random.random() < self.rate
+
+
+class _ExcludeLogger(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not super().filter(record)
+
+
+class SizedTimedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that also rolls over at every interval boundary
+    (aligned to the epoch, so processes sharing the file agree), and that
+    reopens the file when another process has already rotated it.
+    """
+
+    def __init__(self, filename, interval: int, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+        self.interval = interval
+        self.rollover_at = self._next_boundary()
+        self._inode = None
+
+    def _next_boundary(self) -> float:
+        if self.interval <= 0:
+            return float("inf")
+        return (time.time() // self.interval + 1) * self.interval
+
+    def _open(self):
+        stream = super()._open()
+        self._inode = os.fstat(stream.fileno()).st_ino
+        return stream
+
+    def _rotated_elsewhere(self) -> bool:
+        if self.stream is None:
+            return False
+        try:
+            return os.stat(self.baseFilename).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def shouldRollover(self, record) -> bool:
+        if self._rotated_elsewhere():
+            self.stream.close()
+            self.stream = self._open()
+            self.rollover_at = self._next_boundary()
+            return False
+        if time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_boundary()
+
+
+_queue_handler: Optional[ContextQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging():
+    """Route all logging through the queue. Safe to call more than once."""
+    global _queue_handler, _listener
+
+    if _listener is not None:
+        return
+
+    for path in (settings.LOG_FILE, settings.TRACE_FILE):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_handler = SizedTimedRotatingFileHandler(
+        settings.LOG_FILE,
+        interval=settings.LOG_ROTATE_SECONDS,
+        maxBytes=settings.LOG_MAX_BYTES,
+        backupCount=settings.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+    file_handler.addFilter(_ExcludeLogger(TRACE_LOGGER))
+    handlers = [file_handler]
+
+    if settings.TRACE_FILE:
+        trace_handler = SizedTimedRotatingFileHandler(
+            settings.TRACE_FILE,
+            interval=settings.LOG_ROTATE_SECONDS,
+            maxBytes=settings.LOG_MAX_BYTES,
+            backupCount=settings.LOG_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+        trace_handler.addFilter(logging.Filter(TRACE_LOGGER))
+        handlers.append(trace_handler)
+
+    queue = Queue(-1)
+    _queue_handler = ContextQueueHandler(queue)
+    _listener = QueueListener(queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    logging.getLogger(ACCESS_LOGGER).addFilter(
+        AccessSampler(settings.ACCESS_LOG_SAMPLE_RATE, settings.ACCESS_LOG_SLOW_MS)
+    )
+
+    _listener.start()
+    atexit.register(stop_logging)
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def stop_logging():
+    """Write out everything still queued and stop the listener thread."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_in_child():
+    # A forked worker has the listener object but not its thread, and the
+    # queue's lock may have been held mid-put at fork time, so the child
+    # starts over with a fresh queue and its own thread.
+    if _listener is None or _listener._thread is None:
+        return
+    queue = Queue(-1)
+    _queue_handler.queue = queue
+    _listener.queue = queue
+    _listener._thread = None
+    _listener.start()
@@ -0,0 +1,484 @@
+"""
+Related posts from TF-IDF text vectors and tag vectors.
+
+Each published post is one sparse row: TF-IDF weights of the words in its
+title (counted TITLE_WEIGHT times), excerpt and content, and IDF-weighted
+one-hot columns for its tags. Both parts are normalized separately and
+scaled so that a dot product is
+
+    (1 - TAG_WEIGHT) * text cosine + TAG_WEIGHT * tag cosine
+
+The TOP_K best matches per post are written to related_posts, so serving
+them is one read of that table's primary key.
+
+Similarities are a sparse product done in NumPy: the matrix is also kept
+by column (posting lists), and a block of rows is multiplied by expanding
+each of its entries into the posting list of its column and summing the
+products with np.bincount. Words in one post only, or in more than
+MAX_DF_RATIO of them, are left out of the vocabulary; they can't tell
+posts apart and the common ones would dominate the work.
+
+    python -m core.related   # rebuild everything
+
+Publishing a post enqueues a related.update job (core.tasks) that adds
+the post to this process's index using the vocabulary and IDF it was
+built with, and updates only the lists the post enters or leaves. The
+index is rebuilt from scratch once it is older than REBUILD_AFTER_SECONDS,
+which picks up new words and drifted IDF, after a core.bus reset, or when
+its count of published posts disagrees with the database. Each update is
+announced through core.bus with the post's id; the jobs run in whichever
+process claims them, so every other process applies those posts to its
+own index on its next update instead of rebuilding.
+"""
+
+from __future__ import annotations
+
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from core.bus import publish, subscribe
+from core.http_cache import purge
+from db import Post, PostStatus, RelatedPost, post_tags
+
+TOP_K = 5
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 0.3
+MIN_DF = 2
+MAX_DF_RATIO = 0.5
+# below this many posts every shared word counts, however common
+MAX_DF_MIN_POSTS = 20
+MIN_SCORE = 0.05
+# expanded (row, posting) pairs per block; bounds memory of the product
+PAIR_BUDGET = 4_000_000
+REBUILD_AFTER_SECONDS = 6 * 60 * 60
+
+TOKEN_REGEX = re.compile(r"[a-z][a-z0-9_-]+")
+
+
+def tokenize(*texts: Optional[str]) -> list[str]:
+    return TOKEN_REGEX.findall(" ".join(t for t in texts if t).lower())
+
+
+def _post_terms(title, excerpt, content) -> Counter:
+    terms = Counter(tokenize(excerpt, content))
+    for token in tokenize(title):
+        terms[token] += TITLE_WEIGHT
+    return terms
+
+
+def _expand(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenated ranges starts[i] .. starts[i] + counts[i], vectorized."""
+    total = int(counts.sum())
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total)
+
+
+class RelatedIndex:
+    """
+    Row i of the matrix is post_ids[i]. The matrix is held twice, by row
+    (indptr, indices, data) and by column (col_ptr, col_rows, col_data).
+    top_ids/top_scores hold each row's current neighbours, -1/0 padded.
+    Unpublished posts keep their row, emptied, and leave `published`.
+    """
+
+    def __init__(
+        self,
+        post_ids: np.ndarray,
+        vocabulary: dict[str, int],
+        idf: np.ndarray,
+        tag_columns: dict[int, int],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+    ):
+        self.post_ids = post_ids
+        self.published = set(post_ids.tolist())
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.tag_columns = tag_columns
+        self.n_columns = len(idf)
+        self.built_at = time.monotonic()
+        self.token = secrets.token_hex(4)
+        self._set_rows(indptr, indices, data)
+        self.top_ids = np.full((len(post_ids), TOP_K), -1, dtype=np.int64)
+        self.top_scores = np.zeros((len(post_ids), TOP_K), dtype=np.float32)
+
+    def _set_rows(self, indptr, indices, data):
+        self.indptr, self.indices, self.data = indptr, indices, data
+        rows = np.repeat(
+            np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr)
+        )
+        order = np.argsort(indices, kind="stable")
+        self.col_rows = rows[order]
+        self.col_data = data[order]
+        self.col_ptr = np.zeros(self.n_columns + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(indices, minlength=self.n_columns), out=self.col_ptr[1:]
+        )
+
+    # ---- vectors ----
+
+    def vectorize(self, terms: Counter, tag_ids: Iterable[int]):
+        """(columns, weights) of one post; unknown words and tags are skipped."""
+        text = [(self.vocabulary[t], c) for t, c in terms.items() if t in self.vocabulary]
+        tags = [self.tag_columns[t] for t in tag_ids if t in self.tag_columns]
+        columns, weights = [], []
+        if text:
+            cols = np.array([c for c, _ in text], dtype=np.int64)
+            w = (1.0 + np.log([n for _, n in text])) * self.idf[cols]
+            columns.append(cols)
+            weights.append(w / np.linalg.norm(w) * np.sqrt(1.0 - TAG_WEIGHT))
+        if tags:
+            cols = np.array(sorted(set(tags)), dtype=np.int64)
+            w = self.idf[cols]
+            columns.append(cols)
+            weights.append(w / np.linalg.norm(w) * np.sqrt(TAG_WEIGHT))
+        if not columns:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return (
+            np.concatenate(columns),
+            np.concatenate(weights).astype(np.float32),
+        )
+
+    def set_row(self, post_id: int, columns: np.ndarray, weights: np.ndarray) -> int:
+        """Replace (or append) a post's row; returns its row number."""
+        found = np.flatnonzero(self.post_ids == post_id)
+        lengths = np.diff(self.indptr)
+        if found.size:
+            row = int(found[0])
+        else:
+            row = len(self.post_ids)
+            self.post_ids = np.append(self.post_ids, post_id)
+            lengths = np.append(lengths, 0)
+            self.top_ids = np.vstack([self.top_ids, np.full((1, TOP_K), -1)])
+            self.top_scores = np.vstack(
+                [self.top_scores, np.zeros((1, TOP_K), dtype=np.float32)]
+            )
+
+        start = self.indptr[row]
+        end = self.indptr[row + 1] if found.size else start
+        indices = np.concatenate([self.indices[:start], columns, self.indices[end:]])
+        data = np.concatenate([self.data[:start], weights, self.data[end:]])
+        lengths[row] = len(columns)
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        self._set_rows(indptr, indices, data)
+        return row
+
+    # ---- similarity ----
+
+    def _scores(self, rows: np.ndarray, indices: np.ndarray, data: np.ndarray, n_rows: int):
+        """
+        Dense (n_rows, len(post_ids)) similarities for the sparse query rows
+        given as parallel (row, column, weight) arrays.
+        """
+        starts = self.col_ptr[indices]
+        counts = self.col_ptr[indices + 1] - starts
+        postings = _expand(starts, counts)
+        n = len(self.post_ids)
+        return np.bincount(
+            np.repeat(rows, counts) * n + self.col_rows[postings],
+            weights=np.repeat(data, counts) * self.col_data[postings],
+            minlength=n_rows * n,
+        ).reshape(n_rows, n)
+
+    def _top(self, scores: np.ndarray, rows: np.ndarray):
+        """Store the TOP_K best columns of each score row as rows' neighbours."""
+        scores[np.arange(len(rows)), rows] = 0.0  # not related to itself
+        k = min(TOP_K, scores.shape[1])
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        keep = best_scores >= MIN_SCORE
+        self.top_ids[rows] = -1
+        self.top_scores[rows] = 0.0
+        self.top_ids[rows, :k] = np.where(keep, self.post_ids[best], -1)
+        self.top_scores[rows, :k] = np.where(keep, best_scores, 0.0)
+
+    def _block_scores(self, block: np.ndarray) -> np.ndarray:
+        lengths = np.diff(self.indptr)[block]
+        entries = _expand(self.indptr[block], lengths)
+        return self._scores(
+            np.repeat(np.arange(len(block)), lengths),
+            self.indices[entries],
+            self.data[entries],
+            len(block),
+        )
+
+    def similarities(self, row: int) -> np.ndarray:
+        """Similarity of row to every row."""
+        return self._block_scores(np.array([row]))[0]
+
+    def compute_rows(self, rows: np.ndarray):
+        """Recompute the neighbours of rows, in blocks that fit PAIR_BUDGET."""
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = np.diff(self.indptr)
+        # postings each row expands into, accumulated over rows
+        pairs = np.bincount(
+            np.repeat(np.arange(len(lengths)), lengths),
+            weights=np.diff(self.col_ptr)[self.indices],
+            minlength=len(lengths),
+        )[rows]
+        cumulative = np.concatenate([[0], np.cumsum(pairs)])
+        # the dense block of scores has to fit as well
+        dense_rows = max(1, PAIR_BUDGET // max(1, len(self.post_ids)))
+
+        start = 0
+        while start < len(rows):
+            end = np.searchsorted(cumulative, cumulative[start] + PAIR_BUDGET, "right") - 1
+            end = min(max(int(end), start + 1), start + dense_rows)
+            block = rows[start:end]
+            self._top(self._block_scores(block), block)
+            start = end
+
+    def compute_all(self):
+        self.compute_rows(np.arange(len(self.post_ids)))
+
+    def neighbours(self, row: int) -> list[tuple[int, float]]:
+        return [
+            (int(i), float(s))
+            for i, s in zip(self.top_ids[row], self.top_scores[row])
+            if i >= 0
+        ]
+
+
+def build_index(
+    post_ids: Sequence[int],
+    terms: Sequence[Counter],
+    tags: Sequence[Sequence[int]],
+) -> RelatedIndex:
+    """Fit the vocabulary and IDF on these posts and compute every row."""
+    n = len(post_ids)
+    df = Counter()
+    for post_terms in terms:
+        df.update(post_terms.keys())
+    max_df = MAX_DF_RATIO * n if n >= MAX_DF_MIN_POSTS else n
+    words = sorted(w for w, count in df.items() if MIN_DF <= count <= max_df)
+    vocabulary = {w: i for i, w in enumerate(words)}
+
+    tag_df = Counter(t for post_tags_ in tags for t in set(post_tags_))
+    tag_columns = {t: len(words) + i for i, t in enumerate(sorted(tag_df))}
+
+    doc_freq = np.array(
+        [df[w] for w in words] + [tag_df[t] for t in sorted(tag_df)], dtype=np.float64
+    )
+    # smoothed, so no column's weight is zero
+    idf = np.log((1.0 + n) / (1.0 + doc_freq)) + 1.0
+
+    index = RelatedIndex(
+        np.asarray(post_ids, dtype=np.int64),
+        vocabulary,
+        idf,
+        tag_columns,
+        np.zeros(n + 1, dtype=np.int64),
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.float32),
+    )
+    rows = [index.vectorize(t, g) for t, g in zip(terms, tags)]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(c) for c, _ in rows], out=indptr[1:])
+    index._set_rows(
+        indptr,
+        np.concatenate([c for c, _ in rows]) if rows else np.empty(0, dtype=np.int64),
+        np.concatenate([w for _, w in rows]) if rows else np.empty(0, dtype=np.float32),
+    )
+    index.compute_all()
+    return index
+
+
+# -----------------------------
+# Database
+# -----------------------------
+
+_index: Optional[RelatedIndex] = None
+_index_lock = threading.Lock()
+# posts other processes updated since this index last caught up
+_changed: set[int] = set()
+_changed_lock = threading.Lock()
+
+
+def _on_related_change(key: Optional[str]):
+    global _index
+
+    # announcements may have been missed; rebuild on the next update
+    if key is None:
+        _index = None
+        return
+    token, _, post_id = key.removeprefix("related:").partition(":")
+    if _index is None or token == _index.token or not post_id.isdigit():
+        return
+    with _changed_lock:
+        _changed.add(int(post_id))
+
+
+subscribe("related", _on_related_change)
+
+
+def _take_changed() -> set[int]:
+    global _changed
+    with _changed_lock:
+        changed, _changed = _changed, set()
+    return changed
+
+
+def _published_tags(db: Session, post_ids=None) -> dict[int, list[int]]:
+    stmt = select(post_tags.c.post_id, post_tags.c.tag_id)
+    if post_ids is not None:
+        stmt = stmt.where(post_tags.c.post_id.in_(post_ids))
+    by_post: dict[int, list[int]] = {}
+    for post_id, tag_id in db.execute(stmt.execution_options(yield_per=10_000)):
+        by_post.setdefault(post_id, []).append(tag_id)
+    return by_post
+
+
+def _write(db: Session, index: RelatedIndex, rows: Iterable[int], replace_all=False):
+    rows = list(rows)
+    post_ids = [int(index.post_ids[row]) for row in rows]
+    if replace_all:
+        db.execute(delete(RelatedPost))
+    elif post_ids:
+        db.execute(delete(RelatedPost).where(RelatedPost.post_id.in_(post_ids)))
+
+    now = datetime.utcnow()
+    values = [
+        {
+            "post_id": post_id,
+            "rank": rank,
+            "related_id": related_id,
+            "score": score,
+            "computed_at": now,
+        }
+        for row, post_id in zip(rows, post_ids)
+        for rank, (related_id, score) in enumerate(index.neighbours(row), start=1)
+    ]
+    for i in range(0, len(values), 5000):
+        db.execute(insert(RelatedPost), values[i : i + 5000])
+    purge(db, [f"post:{post_id}" for post_id in post_ids])
+    db.commit()
+
+
+def rebuild(db: Session) -> RelatedIndex:
+    """Recompute every published post's related posts."""
+    global _index
+
+    # whatever changed before this point is read below
+    _take_changed()
+    post_ids, terms = [], []
+    rows = db.execute(
+        select(Post.id, Post.title, Post.excerpt, Post.content)
+        .where(Post.status == PostStatus.PUBLISHED)
+        .order_by(Post.id)
+        .execution_options(yield_per=1000)
+    )
+    for row in rows:
+        post_ids.append(row.id)
+        terms.append(_post_terms(row.title, row.excerpt, row.content))
+    tags = _published_tags(db)
+
+    with _index_lock:
+        index = build_index(post_ids, terms, [tags.get(i, []) for i in post_ids])
+        _write(db, index, range(len(post_ids)), replace_all=True)
+        _index = index
+    return index
+
+
+def _apply(index: RelatedIndex, post_id: int, post, tag_ids) -> np.ndarray:
+    """
+    Set one post's row from post (None or not published empties it) and
+    recompute the lists that change; returns their rows, its own included.
+    """
+    if post is not None and post.status == PostStatus.PUBLISHED:
+        columns, weights = index.vectorize(
+            _post_terms(post.title, post.excerpt, post.content), tag_ids
+        )
+        index.published.add(post_id)
+    else:
+        columns = np.empty(0, dtype=np.int64)
+        weights = np.empty(0, dtype=np.float32)
+        index.published.discard(post_id)
+
+    # lists the post was in were computed with its old vector
+    stale = np.flatnonzero((index.top_ids == post_id).any(axis=1))
+    row = index.set_row(post_id, columns, weights)
+    index.compute_rows(np.array([row]))
+
+    # the similarity between two other posts hasn't changed, so any
+    # other list only changes if this post beats its last entry
+    scores = index.similarities(row)
+    scores[row] = 0.0
+    beaten = np.flatnonzero(
+        (scores >= MIN_SCORE) & (scores > index.top_scores[:, -1])
+    )
+    affected = np.union1d(stale, beaten)
+    index.compute_rows(affected)
+    return np.union1d(affected, [row])
+
+
+def update_post(db: Session, post_id: int):
+    """
+    Bring one post's related posts, and the lists it now belongs to, up to
+    date after it was published, edited or unpublished.
+    """
+    index = _index
+    if index is None or time.monotonic() - index.built_at > REBUILD_AFTER_SECONDS:
+        rebuild(db)
+        return
+
+    # posts other processes updated are applied here too, so this index
+    # agrees with the lists they wrote; only this post's lists are written
+    changed = _take_changed() - {post_id}
+    ids = sorted(changed | {post_id})
+    posts = {
+        row.id: row
+        for row in db.execute(
+            select(Post.id, Post.title, Post.excerpt, Post.content, Post.status).where(
+                Post.id.in_(ids)
+            )
+        )
+    }
+    published = {i for i in ids if i in posts and posts[i].status == PostStatus.PUBLISHED}
+    tags = _published_tags(db, sorted(published)) if published else {}
+
+    # a post published through another process without word of it reaching
+    # this one (say across a bus reconnect) is missing from this index
+    expected = (index.published - set(ids)) | published
+    published_count = db.scalar(
+        select(func.count(Post.id)).where(Post.status == PostStatus.PUBLISHED)
+    )
+    if published_count != len(expected):
+        rebuild(db)
+        return
+
+    with _index_lock:
+        for other in sorted(changed):
+            _apply(index, other, posts.get(other), tags.get(other, []))
+        rows = _apply(index, post_id, posts.get(post_id), tags.get(post_id, []))
+        # other processes apply this post to their own indexes
+        publish(db, f"related:{index.token}:{post_id}")
+        _write(db, index, rows)
+
+
+if __name__ == "__main__":
+    from db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        index = rebuild(db)
+        print(
+            f"related posts computed for {len(index.post_ids)} posts "
+            f"({len(index.vocabulary)} words, {len(index.tag_columns)} tags)"
+        )
+    finally:
+        db.close()
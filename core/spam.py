@@ -0,0 +1,194 @@
+"""
+Offline naive-Bayes spam scorer for comments.
+
+Tokens are hashed into a fixed number of buckets (no vocabulary to store),
+so a trained model is a single float32 vector of per-bucket log-likelihood
+ratios plus a prior. Scoring a batch is a gather and a segmented sum:
+weights[token_ids] reduced per comment with np.add.reduceat.
+
+    python -m core.spam train   # fit on APPROVED vs SPAM comments
+    python -m core.spam score   # score PENDING comments into spam_score
+
+Moderators then work the queue in spam_score order.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import zlib
+from typing import Iterable, Sequence
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db import Comment, CommentStatus
+
+N_FEATURES = 2**18
+# bucket 0 is a per-comment bias token with zero weight; it keeps every
+# comment non-empty so np.add.reduceat never sees an empty segment
+BIAS_TOKEN = 0
+SMOOTHING = 1.0
+
+TOKEN_REGEX = re.compile(r"[a-z0-9][a-z0-9'_-]*")
+URL_REGEX = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+
+
+def tokenize(content: str) -> list[str]:
+    content = content or ""
+    tokens = ["__url__" for _ in URL_REGEX.finditer(content)]
+    tokens.extend(TOKEN_REGEX.findall(URL_REGEX.sub(" ", content.lower())))
+    return tokens
+
+
+def _bucket(token: str) -> int:
+    return 1 + zlib.crc32(token.encode("utf-8")) % (N_FEATURES - 1)
+
+
+def featurize(contents: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Flatten a batch into (token_ids, offsets): token_ids holds every
+    comment's buckets back to back, offsets[i] is where comment i starts.
+    """
+    ids: list[int] = []
+    offsets = np.empty(len(contents), dtype=np.int64)
+    for i, content in enumerate(contents):
+        offsets[i] = len(ids)
+        ids.append(BIAS_TOKEN)
+        ids.extend(_bucket(token) for token in tokenize(content))
+    return np.asarray(ids, dtype=np.int64), offsets
+
+
+class SpamModel:
+    def __init__(self, weights: np.ndarray, prior: float):
+        self.weights = weights
+        self.prior = prior
+
+    @classmethod
+    def fit(cls, batches: Iterable[tuple[Sequence[str], np.ndarray]]) -> "SpamModel":
+        """Fit from (contents, is_spam) batches without holding them all at once."""
+        spam_counts = np.zeros(N_FEATURES, dtype=np.int64)
+        ham_counts = np.zeros(N_FEATURES, dtype=np.int64)
+        n_spam = n_ham = 0
+
+        for contents, is_spam in batches:
+            is_spam = np.asarray(is_spam, dtype=bool)
+            ids, offsets = featurize(contents)
+            lengths = np.diff(np.append(offsets, len(ids)))
+            token_is_spam = np.repeat(is_spam, lengths)
+
+            spam_counts += np.bincount(ids[token_is_spam], minlength=N_FEATURES)
+            ham_counts += np.bincount(ids[~token_is_spam], minlength=N_FEATURES)
+            n_spam += int(is_spam.sum())
+            n_ham += int((~is_spam).sum())
+
+        spam_counts[BIAS_TOKEN] = ham_counts[BIAS_TOKEN] = 0
+        log_spam = np.log(spam_counts + SMOOTHING) - np.log(
+            spam_counts.sum() + SMOOTHING * N_FEATURES
+        )
+        log_ham = np.log(ham_counts + SMOOTHING) - np.log(
+            ham_counts.sum() + SMOOTHING * N_FEATURES
+        )
+        weights = (log_spam - log_ham).astype(np.float32)
+        weights[BIAS_TOKEN] = 0.0
+
+        prior = float(np.log((n_spam + 1) / (n_ham + 1)))
+        return cls(weights, prior)
+
+    def score(self, contents: Sequence[str]) -> np.ndarray:
+        """Spam probability for each comment in the batch."""
+        if not contents:
+            return np.empty(0, dtype=np.float64)
+        ids, offsets = featurize(contents)
+        logits = np.add.reduceat(self.weights[ids].astype(np.float64), offsets)
+        logits += self.prior
+        return 1.0 / (1.0 + np.exp(-np.clip(logits, -50, 50)))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, weights=self.weights, prior=self.prior)
+
+    @classmethod
+    def load(cls, path: str) -> "SpamModel":
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["prior"]))
+
+
+# -----------------------------
+# Database jobs
+# -----------------------------
+
+
+def _labelled_batches(db: Session, batch_size: int):
+    rows = db.execute(
+        select(Comment.content, Comment.status)
+        .where(Comment.status.in_([CommentStatus.APPROVED, CommentStatus.SPAM]))
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in rows.partitions():
+        contents = [r.content for r in partition]
+        is_spam = np.fromiter(
+            (r.status == CommentStatus.SPAM for r in partition),
+            dtype=bool,
+            count=len(partition),
+        )
+        yield contents, is_spam
+
+
+def train_from_db(db: Session, batch_size: int = 5000) -> SpamModel:
+    return SpamModel.fit(_labelled_batches(db, batch_size))
+
+
+def score_pending(db: Session, model: SpamModel, batch_size: int = 1000) -> int:
+    """Score every pending comment, one UPDATE per batch. Returns rows scored."""
+    scored = 0
+    after = 0
+    while True:
+        rows = db.execute(
+            select(Comment.id, Comment.content)
+            .where(Comment.status == CommentStatus.PENDING, Comment.id > after)
+            .order_by(Comment.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return scored
+
+        ids = [r.id for r in rows]
+        scores = model.score([r.content for r in rows])
+        db.execute(
+            text(
+                "UPDATE comments SET spam_score = s.score "
+                "FROM unnest(CAST(:ids AS integer[]), CAST(:scores AS float8[])) "
+                "AS s(id, score) WHERE comments.id = s.id"
+            ),
+            {"ids": ids, "scores": scores.tolist()},
+        )
+        db.commit()
+
+        scored += len(rows)
+        after = ids[-1]
+
+
+if __name__ == "__main__":
+    import sys
+
+    from db.session import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in {"train", "score"}:
+        print("usage: python -m core.spam [train|score]")
+        sys.exit(2)
+
+    db = SessionLocal()
+    try:
+        if command == "train":
+            model = train_from_db(db)
+            model.save(settings.SPAM_MODEL_PATH)
+            print(f"spam model saved to {settings.SPAM_MODEL_PATH}")
+        else:
+            model = SpamModel.load(settings.SPAM_MODEL_PATH)
+            print(f"scored {score_pending(db, model)} pending comments")
+    finally:
+        db.close()
@@ -0,0 +1,80 @@
+"""
+Startup timing.
+
+lifespan() wraps each phase in startup_phase(), and the timings are logged
+once the app is ready. `python main.py --startup-report` prints them along
+with per-module import times, measured in a fresh interpreter with
+`python -X importtime` so module caching doesn't hide anything.
+"""
+
+from __future__ import annotations
+
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+# (phase, seconds) in the order they ran
+startup_phases: list[tuple[str, float]] = []
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@contextmanager
+def startup_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_phases.append((name, time.perf_counter() - started))
+
+
+def format_phases() -> str:
+    return ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in startup_phases)
+
+
+def import_times(module: str = "main") -> list[tuple[str, float]]:
+    """
+    Cumulative import time of every module imported at the first two
+    nesting levels below `module`, slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, name = match.groups()
+        # importtime indents nested imports by two spaces per level
+        if len(indent) // 2 <= 2:
+            times.append((name, int(cumulative_us) / 1_000_000))
+    times.sort(key=lambda item: item[1], reverse=True)
+    return times
+
+
+def print_startup_report(app, lifespan, top: int = 25):
+    import asyncio
+
+    print("== Imports (cumulative, slowest first)")
+    for name, seconds in import_times()[:top]:
+        print(f"{seconds * 1000:10.1f}ms  {name}")
+
+    async def run_lifespan():
+        async with lifespan(app):
+            pass
+
+    startup_phases.clear()
+    asyncio.run(run_lifespan())
+
+    print("\n== Lifespan phases")
+    for name, seconds in startup_phases:
+        print(f"{seconds * 1000:10.1f}ms  {name}")
+    print(f"{sum(s for _, s in startup_phases) * 1000:10.1f}ms  total")
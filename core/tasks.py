@@ -0,0 +1,107 @@
+"""
+Background job handlers. Importing this module registers them with
+core.jobs; request code only needs core.jobs.enqueue().
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import urllib.request
+
+
+from api.v1.auth_core import bump_identity_version, note_identity_version
+from core.config import settings
+from core.jobs import job
+from core.http_cache import purge
+from core.images import ImageRejected, encode_webp, write_content_hashed
+from db import User
+from db.session import SessionLocal
+
+AVATAR_DIR = "static/images/avatars"
+AVATAR_URL = "/static/images/avatars"
+AVATAR_SIZE = 512
+UPLOAD_DIR = "data/uploads"
+
+logger = logging.getLogger(settings.PROJECT_NAME)
+
+
+@job("avatar.process")
+def process_avatar(payload: dict):
+    """
+    Scale an uploaded avatar down to AVATAR_SIZE, store it under a content
+    hash and point the user at it.
+    """
+    source = payload["source"]
+    if not os.path.exists(source):
+        # already processed by an earlier attempt that failed afterwards
+        return
+
+    try:
+        data = encode_webp(source, (AVATAR_SIZE, AVATAR_SIZE))
+    except (ImageRejected, OSError):
+        # decoding is deterministic, so a retry would fail the same way
+        logger.warning(f"Discarding undecodable avatar upload {source}", exc_info=True)
+        os.remove(source)
+        return
+    name = write_content_hashed(AVATAR_DIR, "avatar", data)
+
+    db = SessionLocal()
+    try:
+        user = db.get(User, payload["user_id"])
+        if user is not None:
+            user.avatar_url = f"{AVATAR_URL}/{name}"
+            bump_identity_version(user)
+            purge(db, [f"author:{user.id}"])
+            db.commit()
+            note_identity_version(user.id, user.token_version)
+    finally:
+        db.close()
+
+    os.remove(source)
+
+
+PURGE_KEYS_PER_REQUEST = 100
+
+
+@job("cache.purge")
+def purge_cache(payload: dict):
+    """Send PURGE requests tagged with surrogate keys to the fronting cache."""
+    keys = payload["keys"]
+    for i in range(0, len(keys), PURGE_KEYS_PER_REQUEST):
+        request = urllib.request.Request(
+            settings.CACHE_PURGE_URL,
+            method="PURGE",
+            headers={
+                settings.CACHE_PURGE_HEADER: " ".join(
+                    keys[i : i + PURGE_KEYS_PER_REQUEST]
+                )
+            },
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+
+@job("related.update")
+def update_related(payload: dict):
+    """Recompute related posts around a post that was published or edited."""
+    # NumPy stays off app startup until the first publish
+    from core.related import update_post
+
+    db = SessionLocal()
+    try:
+        update_post(db, payload["post_id"])
+    finally:
+        db.close()
+
+
+@job("author_stats.reconcile")
+def reconcile_author_stats(payload: dict):
+    """Recompute every author's profile stats from posts."""
+    from core.author_stats import reconcile
+
+    db = SessionLocal()
+    try:
+        reconcile(db)
+    finally:
+        db.close()
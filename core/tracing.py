@@ -0,0 +1,205 @@
+"""
+Request timing spans.
+
+Every request runs inside a trace; span() blocks and the SQL hooks record
+into it. The per-metric totals go back to the client as a Server-Timing
+header, so the browser's network panel shows where a slow page spent its
+time (db, db-checkout, auth, markdown, template). A TRACE_SAMPLE_RATE
+share of requests also keeps every individual span and is written to
+TRACE_FILE as one OTLP/JSON ExportTraceServiceRequest per line, the
+format OpenTelemetry collectors and file exporters read.
+
+Outside a request (jobs, CLI scripts) there is no trace and span() does
+nothing.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+import secrets
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from core.config import settings
+from core.log import TRACE_LOGGER, request_id_var
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+MAX_STATEMENT_LENGTH = 500
+
+trace_logger = logging.getLogger(TRACE_LOGGER)
+
+
+class Trace:
+    def __init__(self, name: str, sampled: bool):
+        self.name = name
+        self.sampled = sampled
+        self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: dict = {}
+        self.totals = defaultdict(float)  # metric -> milliseconds
+        self.counts = defaultdict(int)
+        self.spans: list[dict] = []  # kept only when sampled
+
+    def record(
+        self,
+        name: str,
+        metric: str,
+        start_ns: int,
+        end_ns: int,
+        parent_id: Optional[str],
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[dict] = None,
+        span_id: Optional[str] = None,
+    ):
+        self.totals[metric] += (end_ns - start_ns) / 1e6
+        self.counts[metric] += 1
+        if self.sampled:
+            self.spans.append(
+                {
+                    "traceId": self.trace_id,
+                    "spanId": span_id or secrets.token_hex(8),
+                    "parentSpanId": parent_id or self.span_id,
+                    "name": name,
+                    "kind": kind,
+                    "startTimeUnixNano": str(start_ns),
+                    "endTimeUnixNano": str(end_ns),
+                    "attributes": _otlp_attributes(attributes or {}),
+                }
+            )
+
+    def server_timing(self) -> str:
+        metrics = [
+            f'{metric};dur={total:.1f};desc="{self.counts[metric]}x"'
+            for metric, total in self.totals.items()
+        ]
+        total_ms = ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+        metrics.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(metrics)
+
+    def to_otlp(self) -> dict:
+        root = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_SERVER,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+        }
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes(
+                            {"service.name": settings.PROJECT_NAME}
+                        )
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": __name__}, "spans": [root, *self.spans]}
+                    ],
+                }
+            ]
+        }
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    out = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        out.append({"key": key, "value": typed})
+    return out
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_parent_span: ContextVar[Optional[str]] = ContextVar("parent_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def start_trace(name: str):
+    trace = Trace(name, sampled=random.random() < settings.TRACE_SAMPLE_RATE)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+        trace.end_ns = time.time_ns()
+        if trace.sampled:
+            trace.attributes["request.id"] = request_id_var.get() or ""
+            trace_logger.info(json.dumps(trace.to_otlp()))
+
+
+@contextmanager
+def span(name: str, metric: Optional[str] = None, **attributes):
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+
+    parent_id = _parent_span.get()
+    span_id = secrets.token_hex(8)
+    token = _parent_span.set(span_id)
+    start_ns = time.time_ns()
+    try:
+        yield
+    finally:
+        _parent_span.reset(token)
+        trace.record(
+            name,
+            metric or name,
+            start_ns,
+            time.time_ns(),
+            parent_id,
+            attributes=attributes,
+            span_id=span_id,
+        )
+
+
+def instrument_engine(engine):
+    """Record every statement the engine runs as a db span."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _trace.get() is not None:
+            context._trace_start_ns = time.time_ns()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        trace = _trace.get()
+        start_ns = getattr(context, "_trace_start_ns", None)
+        if trace is None or start_ns is None:
+            return
+        trace.record(
+            statement.split(None, 1)[0].upper() if statement else "SQL",
+            "db",
+            start_ns,
+            time.time_ns(),
+            _parent_span.get(),
+            kind=SPAN_KIND_CLIENT,
+            attributes={
+                "db.system": "postgresql",
+                "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            },
+        )
@@ -0,0 +1,221 @@
+"""
+Bulk user import from CSV or NDJSON.
+
+    python -m core.user_import users.csv
+    python -m core.user_import users.ndjson --dry-run
+
+Every row goes through the same utils.validate_* checks as create-user.
+Duplicates are found within the batch (case-insensitively, like login)
+and against existing users with one query on the lower(username) and
+lower(email) indexes. Valid rows are inserted in multi-row
+INSERT ... ON CONFLICT DO NOTHING batches, so a user created concurrently
+is reported as a duplicate rather than failing the import. The result
+lists each rejected row with its line number, field and reason.
+
+Imported accounts get no usable password (a random value login refuses,
+see utils), the same as create-user without a password; their
+owners set one before signing in. Over HTTP only ADMIN_USER_IDS may
+import.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+import utils
+from core.availability import note_taken
+from core.bus import publish
+from db import User
+
+IMPORT_FIELDS = ("username", "email", "full_name", "bio")
+MAX_IMPORT_ROWS = 10_000
+INSERT_BATCH_SIZE = 1_000
+
+
+class RowError(NamedTuple):
+    row: int
+    field: Optional[str]
+    msg: str
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def parse_rows(text: str, fmt: str) -> Iterator[tuple[int, dict]]:
+    """Yield (line number, row) pairs; line 1 of a CSV is its header."""
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        if reader.fieldnames is None or "username" not in reader.fieldnames:
+            raise ImportFormatError("CSV needs a header row with a username column")
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "ndjson":
+        for line_num, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ImportFormatError(f"Line {line_num}: {e.msg}")
+            if not isinstance(row, dict):
+                raise ImportFormatError(f"Line {line_num}: expected a JSON object")
+            yield line_num, row
+    else:
+        raise ImportFormatError(f"Unknown format {fmt!r}; use csv or ndjson")
+
+
+def _validate(line: int, row: dict) -> tuple[Optional[dict], list[RowError]]:
+    clean = {
+        field: str(row.get(field) or "").strip() or None for field in IMPORT_FIELDS
+    }
+    errors = []
+    for field, validator in (
+        ("username", utils.validate_username),
+        ("email", utils.validate_email),
+        ("full_name", utils.validate_full_name),
+        ("bio", utils.validate_bio),
+    ):
+        is_valid, message = validator(clean[field])
+        if not is_valid:
+            errors.append(RowError(line, field, message))
+    return (None if errors else clean), errors
+
+
+def validate_batch(rows: Iterable[tuple[int, dict]]) -> tuple[list, list[RowError]]:
+    """Return (valid rows as (line, values), errors) for the whole batch."""
+    valid, errors = [], []
+    seen: dict[tuple[str, str], int] = {}
+    for count, (line, row) in enumerate(rows, start=1):
+        if count > MAX_IMPORT_ROWS:
+            errors.append(
+                RowError(line, None, f"Imports are limited to {MAX_IMPORT_ROWS} rows")
+            )
+            break
+        clean, row_errors = _validate(line, row)
+        errors.extend(row_errors)
+        if clean is None:
+            continue
+
+        keys = [(field, clean[field].lower()) for field in ("username", "email")]
+        clashes = [key for key in keys if key in seen]
+        for key in clashes:
+            errors.append(
+                RowError(line, key[0], f"Duplicate of line {seen[key]} in this file")
+            )
+        if not clashes:
+            seen.update((key, line) for key in keys)
+            valid.append((line, clean))
+    return valid, errors
+
+
+def _existing(db: Session, valid: list) -> tuple[set, set]:
+    usernames = [clean["username"].lower() for _, clean in valid]
+    emails = [clean["email"].lower() for _, clean in valid]
+    taken_usernames, taken_emails = set(), set()
+    for username, email in db.execute(
+        select(func.lower(User.username), func.lower(User.email)).where(
+            or_(
+                func.lower(User.username).in_(usernames),
+                func.lower(User.email).in_(emails),
+            )
+        )
+    ):
+        taken_usernames.add(username)
+        taken_emails.add(email)
+    return taken_usernames, taken_emails
+
+
+def import_users(db: Session, rows: Iterable[tuple[int, dict]], dry_run=False) -> dict:
+    valid, errors = validate_batch(rows)
+
+    to_insert = []
+    if valid:
+        taken_usernames, taken_emails = _existing(db, valid)
+        for line, clean in valid:
+            clashes = [
+                field
+                for field, taken in (
+                    ("username", taken_usernames),
+                    ("email", taken_emails),
+                )
+                if clean[field].lower() in taken
+            ]
+            for field in clashes:
+                errors.append(RowError(line, field, f"{field.capitalize()} already exists."))
+            if not clashes:
+                to_insert.append((line, clean))
+
+    created = 0
+    if to_insert and not dry_run:
+        statement = (
+            insert(User).on_conflict_do_nothing().returning(User.username, User.email)
+        )
+        for i in range(0, len(to_insert), INSERT_BATCH_SIZE):
+            batch = to_insert[i : i + INSERT_BATCH_SIZE]
+            inserted = {
+                row.username: row
+                for row in db.execute(
+                    statement,
+                    [
+                        {**clean, "password_hash": utils.make_unusable_password()}
+                        for _, clean in batch
+                    ],
+                )
+            }
+            for line, clean in batch:
+                if clean["username"] in inserted:
+                    created += 1
+                else:
+                    # lost a race with a user created since the duplicate check
+                    errors.append(RowError(line, None, "User already exists."))
+        publish(db, "availability")
+        db.commit()
+        for _, clean in to_insert:
+            note_taken(clean["username"], clean["email"])
+
+    errors.sort(key=lambda e: e.row)
+    return {
+        "created": created,
+        "valid": len(to_insert),
+        "dry_run": dry_run,
+        "errors": [e._asdict() for e in errors],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Import users from CSV or NDJSON.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    with open(args.path, encoding="utf-8-sig", newline="") as f:
+        text = f.read()
+
+    db = SessionLocal()
+    try:
+        result = import_users(db, parse_rows(text, fmt), dry_run=args.dry_run)
+    except ImportFormatError as e:
+        sys.exit(str(e))
+    finally:
+        db.close()
+
+    for error in result["errors"]:
+        print(f"line {error['row']}: {error['field'] or '-'}: {error['msg']}")
+    verb = "would create" if args.dry_run else "created"
+    print(f"{verb} {result['valid'] if args.dry_run else result['created']} users, "
+          f"{len(result['errors'])} errors")
@@ -1,5 +1,19 @@
-from sqlalchemy import Column, Integer, String, Text, Enum, ForeignKey, DateTime, Table
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Integer,
+    String,
+    Text,
+    Enum,
+    ForeignKey,
+    DateTime,
+    Table,
+    Index,
+    Float,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from datetime import datetime
 import enum
 
@@ -12,6 +26,12 @@ class PostStatus(enum.Enum):
     ARCHIVED = "archived"
 
 
+class JobStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+
+
 class CommentStatus(enum.Enum):
     PENDING = "pending"
     APPROVED = "approved"
@@ -27,6 +47,8 @@ post_tags = Table(
     Column(
         "tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True
     ),
+    # the primary key leads with post_id; tag archives need the reverse
+    Index("ix_post_tags_tag_id_post_id", "tag_id", "post_id"),
 )
 
 
@@ -40,11 +62,22 @@ class User(Base):
     full_name = Column(String(100))
     bio = Column(Text)
     avatar_url = Column(String(255))
+    # bumped whenever the identity claims embedded in access tokens change
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     posts = relationship("Post", back_populates="author", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # login matches email/username case-insensitively, so they must be
+        # unique that way too
+        Index("ix_users_lower_email", func.lower(email), unique=True),
+        Index("ix_users_lower_username", func.lower(username), unique=True),
+        # page validators read max(updated_at); availability syncs recent changes
+        Index("ix_users_updated_at", updated_at),
+    )
+
 
 class Category(Base):
     __tablename__ = "categories"
@@ -78,7 +111,8 @@ class Post(Base):
     title = Column(String(200), nullable=False)
     slug = Column(String(200), nullable=False, unique=True)
     excerpt = Column(Text)
-    content = Column(Text)
+    # only the post page needs the body; list queries leave it unread
+    content = deferred(Column(Text))
     featured_image = Column(String(255))
     author_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"))
@@ -95,6 +129,49 @@ class Post(Base):
         "Comment", back_populates="post", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # feed, monthly archive and keyset pagination order
+        Index("ix_posts_status_published_at_id", status, published_at.desc(), id.desc()),
+        Index(
+            "ix_posts_category_id_status_published_at",
+            category_id,
+            status,
+            published_at.desc(),
+            id.desc(),
+        ),
+        Index(
+            "ix_posts_author_id_status_published_at",
+            author_id,
+            status,
+            published_at.desc(),
+            id.desc(),
+        ),
+    )
+
+
+class ArchiveCount(Base):
+    """Published post count per archive, kept current on publish."""
+
+    __tablename__ = "archive_counts"
+
+    kind = Column(String(20), primary_key=True)  # tag | category | month
+    key = Column(String(50), primary_key=True)  # tag/category id, or YYYY-MM
+    post_count = Column(Integer, nullable=False, default=0)
+
+
+class AuthorStats(Base):
+    """Per-author profile counters, kept current by core.author_stats."""
+
+    __tablename__ = "author_stats"
+
+    author_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    post_count = Column(Integer, nullable=False, default=0)  # any status
+    published_count = Column(Integer, nullable=False, default=0)
+    total_views = Column(BigInteger, nullable=False, default=0)
+    last_published_at = Column(DateTime)
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -106,10 +183,30 @@ class Comment(Base):
     author_website = Column(String(255))
     content = Column(Text, nullable=False)
     status = Column(Enum(CommentStatus), default=CommentStatus.PENDING)
+    spam_score = Column(Float)  # filled offline by core.spam
     parent_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"))
+    # materialized path: zero-padded ids from the top-level comment down,
+    # so ordering by (root_id, path) walks each thread depth-first
+    root_id = Column(Integer)
+    depth = Column(Integer, nullable=False, default=0, server_default="0")
+    path = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
 
     post = relationship("Post", back_populates="comments")
+
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at", post_id, created_at),
+        Index("ix_comments_parent_id", parent_id),
+        Index("ix_comments_post_id_parent_id_id", post_id, parent_id, id),
+        Index("ix_comments_root_id_path", root_id, path),
+        # moderation queue order, so its first page is read off the index
+        Index(
+            "ix_comments_status_spam_score_id",
+            status,
+            spam_score.desc().nulls_last(),
+            id,
+        ),
+    )
     replies = relationship(
         "Comment",
         backref="parent",
@@ -117,3 +214,95 @@ class Comment(Base):
         cascade="all, delete-orphan",
         single_parent=True,
     )
+
+
+class PostRevision(Base):
+    """
+    One saved version of a post's content. Every few revisions hold the
+    full text in snapshot; the rest hold delta, line operations against
+    the previous revision (see core.revisions).
+    """
+
+    __tablename__ = "post_revisions"
+
+    id = Column(Integer, primary_key=True)
+    post_id = Column(
+        Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False
+    )
+    number = Column(Integer, nullable=False)  # 1, 2, ... per post
+    snapshot = Column(Text)
+    delta = Column(JSONB)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_post_revisions_post_id_number", post_id, number, unique=True),
+    )
+
+
+class RelatedPost(Base):
+    """A post's precomputed nearest neighbours, best first (see core.related)."""
+
+    __tablename__ = "related_posts"
+
+    post_id = Column(
+        Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True
+    )
+    rank = Column(Integer, primary_key=True)  # 1 = most similar
+    related_id = Column(
+        Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False
+    )
+    score = Column(Float, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    # cascading deletes of a related post look it up by related_id
+    __table_args__ = (Index("ix_related_posts_related_id", related_id),)
+
+
+class PageView(Base):
+    """One page view, appended in bulk by core.analytics and rolled up hourly."""
+
+    __tablename__ = "page_views"
+
+    id = Column(BigInteger, primary_key=True)
+    ts = Column(DateTime, nullable=False)
+    path = Column(String(255), nullable=False)
+    post_id = Column(Integer)  # no FK: views outlive deleted posts
+    referrer = Column(String(255))  # referring host
+
+    __table_args__ = (Index("ix_page_views_ts", ts),)
+
+
+class PageViewRollup(Base):
+    """Views per hour of one post, path or referrer (kind) key."""
+
+    __tablename__ = "page_view_rollups"
+
+    hour = Column(DateTime, primary_key=True)
+    kind = Column(String(20), primary_key=True)  # post | path | referrer
+    key = Column(String(255), primary_key=True)
+    views = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_page_view_rollups_kind_hour", kind, hour),)
+
+
+class Job(Base):
+    """
+    Outbox row for a background job. Written in the same transaction as the
+    change that triggers it; deleted once a worker completes it.
+    """
+
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_jobs_status_run_after", status, run_after),)
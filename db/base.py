@@ -2,11 +2,16 @@ from db.base_class import Base
 from models.item import Item
 from typing import Generator
 from db.session import SessionLocal
+from core.tracing import current_trace, span
 
 
 def get_db() -> Generator:
     try:
         db = SessionLocal()
+        if current_trace() is not None:
+            # check the connection out now so pool waits show up on their own
+            with span("db.checkout", metric="db-checkout"):
+                db.connection()
         yield db
     finally:
         db.close()
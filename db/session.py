@@ -1,7 +1,17 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from core.config import settings
+from core.tracing import instrument_engine
 
 engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+
+def warm_pool(size: int):
+    """Open up to `size` pooled connections now rather than on first requests."""
+    size = min(size, engine.pool.size())
+    connections = [engine.connect() for _ in range(size)]
+    for connection in connections:
+        connection.close()
@@ -0,0 +1,54 @@
+"""
+Gunicorn settings for production; `python -m serve` starts gunicorn with
+this file. Every value can be overridden from the environment.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Async workers each drive many connections, so one per core is enough;
+# more only adds context switching and memory.
+workers = int(os.getenv("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count())))
+worker_class = "serve.UvloopWorker"
+
+# Import the app once in the master and fork it, so workers share the
+# loaded code pages and a broken build fails before any worker starts.
+preload_app = True
+
+# Recycle workers after a jittered number of requests to bound memory
+# growth, without restarting them all at the same moment.
+max_requests = int(os.getenv("MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 500))
+
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+
+# `python -m serve reload` uses the pidfile for zero-downtime upgrades, and
+# waits for the new workers to report ready in SERVE_READY_DIR
+pidfile = os.getenv("PIDFILE", "/tmp/portfolio-blog.pid")
+os.environ.setdefault("SERVE_READY_DIR", f"{pidfile}.ready")
+
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Schema creation and seeding run once here, before any worker starts;
+    # workers running them concurrently race on CREATE TABLE and the seed's
+    # unique rows, and one failed worker boot halts the master.
+    from main import DATABASE_PREPARED_ENV, prepare_database
+
+    prepare_database()
+    os.environ[DATABASE_PREPARED_ENV] = "1"
+
+
+def post_fork(server, worker):
+    # The preloaded master may have opened pooled connections; a forked
+    # socket must never be shared, so each worker starts with a fresh pool.
+    from db.session import engine
+
+    engine.dispose(close=False)
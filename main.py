@@ -2,23 +2,57 @@ from fastapi import FastAPI, Request
 from api.v1.createuser import router as create_user_router
 from api.v1.updateuser import router as update_user_router
 from api.v1.auth import router as auth_router
+from api.v1.availability import router as availability_router
 from api.v1.posts import router as posts_router
+from api.v1.comments import router as comments_router
+from api.v1.moderation import router as moderation_router
+from api.v1.revisions import router as revisions_router
+from api.v1.export import router as export_router
+from api.v1.stats import router as stats_router
 from core.config import settings
-from web.home import router as home_router
+from web.feed import router as feed_router
+from web.home import router as home_router, warm_templates
+from web.images import router as images_router
 from fastapi.staticfiles import StaticFiles
 
 from contextlib import asynccontextmanager
+import asyncio
 import socket
+import sys
 import logging
 import os
+import re
 import time
+import uuid
 from datetime import datetime
 
 from db.base_class import Base
 from db.session import engine
 
-from db.session import SessionLocal
+from db.session import SessionLocal, warm_pool
 from db import User, Category, Tag, Post, PostStatus, Comment
+from core.analytics import record_view, run_analytics
+from core.archive import record_published
+from core.author_stats import record_post_created
+from core.availability import build_filter
+from core.bus import run_bus
+from core.jobs import run_workers
+from core.startup import format_phases, startup_phase, startup_phases
+from core.log import ACCESS_LOGGER, configure_logging, request_id_var
+from core.tracing import start_trace
+from core.http_cache import ImmutableStaticFiles
+from core.tasks import AVATAR_DIR, AVATAR_URL
+
+REQUEST_ID_PATTERN = re.compile(r"[\w.-]{1,64}")
+
+# gunicorn.conf.py points this at a directory where each worker leaves a
+# "<master pid>.<worker pid>" file once its lifespan has started, which is
+# how `python -m serve reload` knows the new workers are serving
+READY_DIR_ENV = "SERVE_READY_DIR"
+
+# Set once prepare_database() has run in a parent process (the gunicorn
+# master), so forked workers don't race each other to create and seed.
+DATABASE_PREPARED_ENV = "PORTFOLIO_DATABASE_PREPARED"
 
 
 def init_db():
@@ -30,12 +64,14 @@ def drop_db():
     Base.metadata.drop_all(bind=engine)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    init_db()
+def seed_db():
     db = SessionLocal()
 
     try:
+        # Already seeded: one indexed lookup instead of seven
+        if db.query(Post.id).filter(Post.slug == "first-blog").first():
+            return
+
         me = db.query(User).filter(User.username == "barasa").first()
         if not me:
             me = User(
@@ -98,6 +134,11 @@ async def lifespan(app: FastAPI):
                 tags=tags,
             )
             db.add(post)
+            db.flush()
+            record_published(
+                db, category.id, [t.id for t in tags], post.published_at
+            )
+            record_post_created(db, me.id, post.published_at)
             db.commit()
             db.refresh(post)
 
@@ -106,18 +147,77 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
 
+
+def prepare_database():
+    """Create the schema (unless migrations own it) and seed it."""
+    if settings.AUTO_CREATE_SCHEMA:
+        with startup_phase("create_all"):
+            init_db()
+
+    with startup_phase("seed"):
+        seed_db()
+
+
+def _mark_ready():
+    ready_dir = os.environ.get(READY_DIR_ENV)
+    if not ready_dir:
+        return None
+    os.makedirs(ready_dir, exist_ok=True)
+    path = os.path.join(ready_dir, f"{os.getppid()}.{os.getpid()}")
+    open(path, "w").close()
+    return path
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_phases.clear()
+
+    if not os.environ.get(DATABASE_PREPARED_ENV):
+        prepare_database()
+
+    with startup_phase("warm templates"):
+        warm_templates()
+
+    with startup_phase("warm db pool"):
+        warm_pool(settings.WARM_POOL_CONNECTIONS)
+
+    with startup_phase("availability filter"):
+        db = SessionLocal()
+        try:
+            build_filter(db)
+        finally:
+            db.close()
+
+    stop_background = asyncio.Event()
+    job_workers = None
+    if settings.JOBS_IN_PROCESS:
+        with startup_phase("start job workers"):
+            job_workers = asyncio.create_task(
+                run_workers(settings.JOB_CONCURRENCY, stop_background)
+            )
+
+    analytics = asyncio.create_task(run_analytics(stop_background))
+    invalidation_bus = asyncio.create_task(run_bus(stop_background))
+
+    logger.info(f"Startup phases: {format_phases()}")
+    ready_file = _mark_ready()
+
     yield
     print("🛑 App is shutting down...")
+    if ready_file:
+        os.remove(ready_file)
 
+    stop_background.set()
+    if job_workers is not None:
+        await job_workers
+    # writes out the views still buffered
+    await analytics
+    await invalidation_bus
 
-os.makedirs("logs", exist_ok=True)
 
-logging.basicConfig(
-    filename="logs/app.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+configure_logging()
 logger = logging.getLogger(settings.PROJECT_NAME)
+access_logger = logging.getLogger(ACCESS_LOGGER)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -128,18 +228,99 @@ app = FastAPI(
 )
 
 
+# registered first so it runs inside log_requests and sees the request id
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    with start_trace(f"{request.method} {request.url.path}") as trace:
+        response = await call_next(request)
+        trace.attributes.update(
+            {
+                "http.method": request.method,
+                "http.target": request.url.path,
+                "http.status_code": response.status_code,
+            }
+        )
+    if settings.SERVER_TIMING:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    # honour an id set by the proxy so its logs and ours line up
+    request_id = request.headers.get("x-request-id", "")
+    if not REQUEST_ID_PATTERN.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        access_logger.info(
+            f"{request.method} {request.url.path} {status_code}",
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": status_code,
+                "duration_ms": round(duration_ms, 1),
+            },
+        )
+        request_id_var.reset(token)
+
+
+@app.middleware("http")
+async def record_views(request: Request, call_next):
+    response = await call_next(request)
+    record_view(
+        request.method,
+        request.url.path,
+        response.status_code,
+        request.headers.get("user-agent", ""),
+        request.headers.get("referer"),
+        request.headers.get("host", ""),
+        getattr(request.state, "view_post_id", None),
+    )
+    return response
+
+
+# avatars are content-hashed, so they can be cached forever; mounted
+# before /static so it takes these paths
+os.makedirs(AVATAR_DIR, exist_ok=True)
+app.mount(
+    AVATAR_URL, ImmutableStaticFiles(directory=AVATAR_DIR), name="avatars"
+)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 app.include_router(auth_router, prefix=settings.API_V1_STR)
 app.include_router(create_user_router, prefix=settings.API_V1_STR)
 app.include_router(update_user_router, prefix=settings.API_V1_STR)
+app.include_router(availability_router, prefix=settings.API_V1_STR)
 app.include_router(home_router, prefix="")
+app.include_router(feed_router)
+app.include_router(images_router)
 app.include_router(posts_router)
+app.include_router(comments_router)
+app.include_router(moderation_router)
+app.include_router(revisions_router)
+app.include_router(export_router)
+app.include_router(stats_router)
 
 
 if __name__ == "__main__":
     import uvicorn
 
+    if "--startup-report" in sys.argv:
+        from core.startup import print_startup_report
+
+        print_startup_report(app, lifespan)
+        sys.exit(0)
+
     hostname = socket.gethostname()
     local_ip = socket.gethostbyname(hostname)
     port = 8000
@@ -147,4 +328,5 @@ if __name__ == "__main__":
     print(f"http://127.0.0.1:{port}")
     print(f"LAN http://{local_ip}:{port}")
 
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
+    # development server; production runs `python -m serve`
+    uvicorn.run("main:app", host="0.0.0.0", port=port, reload="--reload" in sys.argv)
@@ -0,0 +1,141 @@
+"""
+Production server entry point.
+
+    python -m serve          # run gunicorn with uvicorn/uvloop workers
+    python -m serve reload   # zero-downtime code upgrade of a running server
+
+Configuration lives in gunicorn.conf.py. main.py's __main__ block remains
+the single-process development server.
+"""
+
+import os
+import runpy
+import signal
+import sys
+import time
+
+try:
+    from uvicorn_worker import UvicornWorker
+except ImportError:
+    from uvicorn.workers import UvicornWorker
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(BASE_DIR, "gunicorn.conf.py")
+
+RELOAD_TIMEOUT_SECONDS = 60
+
+
+class UvloopWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "lifespan": "on",
+        "proxy_headers": True,
+    }
+
+
+def _read_pid(path: str):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _pidfile() -> str:
+    return os.getenv("PIDFILE", "/tmp/portfolio-blog.pid")
+
+
+def _ready_dir() -> str:
+    return os.getenv("SERVE_READY_DIR", f"{_pidfile()}.ready")
+
+
+def _expected_workers() -> int:
+    return int(runpy.run_path(CONFIG_FILE)["workers"])
+
+
+def _ready_workers(master_pid: int) -> list[str]:
+    try:
+        names = os.listdir(_ready_dir())
+    except FileNotFoundError:
+        return []
+    return [name for name in names if name.startswith(f"{master_pid}.")]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def reload():
+    """
+    Gunicorn binary upgrade: USR2 makes the running master start a new
+    master with the current code, which writes the pidfile once the app has
+    imported cleanly. Once every new worker has finished its lifespan
+    startup (see main._mark_ready), the old master is stopped gracefully
+    (TERM), so in-flight requests finish; the listening socket is inherited
+    by the new master and never closed. If the new master dies or its
+    workers don't come up in time, it is stopped instead and the old one
+    keeps serving.
+
+    The new master is a child of the old one, so the old master must not
+    be PID 1 of a container: stopping it would stop the container. Run the
+    container with an init (the Dockerfile uses tini, or `docker run
+    --init`); reload refuses to upgrade a PID 1 master.
+    """
+    pidfile = _pidfile()
+    old_pid = _read_pid(pidfile)
+    if old_pid is None:
+        print(f"no running server found in {pidfile}")
+        sys.exit(1)
+    if old_pid == 1:
+        print("the master is PID 1; run it under an init (tini) to upgrade in place")
+        sys.exit(1)
+
+    expected = _expected_workers()
+    os.kill(old_pid, signal.SIGUSR2)
+
+    deadline = time.monotonic() + RELOAD_TIMEOUT_SECONDS
+    new_pid = None
+    while time.monotonic() < deadline:
+        pid = _read_pid(pidfile)
+        if pid and pid != old_pid:
+            new_pid = pid
+        if new_pid is not None:
+            if not _alive(new_pid):
+                print(f"new master {new_pid} exited; the old one keeps serving")
+                sys.exit(1)
+            if len(_ready_workers(new_pid)) >= expected:
+                os.kill(old_pid, signal.SIGTERM)
+                for name in _ready_workers(old_pid):
+                    try:
+                        os.remove(os.path.join(_ready_dir(), name))
+                    except FileNotFoundError:
+                        pass
+                print(f"upgraded master {old_pid} -> {new_pid}")
+                return
+        time.sleep(0.5)
+
+    if new_pid is not None and _alive(new_pid):
+        os.kill(new_pid, signal.SIGTERM)
+    print("new server did not become ready; the old one keeps serving")
+    sys.exit(1)
+
+
+def main():
+    if sys.argv[1:] == ["reload"]:
+        reload()
+        return
+
+    os.chdir(BASE_DIR)
+    os.execvp(
+        sys.executable,
+        [sys.executable, "-m", "gunicorn", "-c", CONFIG_FILE, *sys.argv[1:], "main:app"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+// Prepends posts pushed over /ws/feed to the newest page of the feed.
+(() => {
+    const feed = document.getElementById('feed');
+    if (!feed || !('WebSocket' in window)) return;
+
+    const url = `${location.protocol === 'https:' ? 'wss' : 'ws'}://${location.host}/ws/feed`;
+    // catch-ups are spread over this long so readers don't all ask at once
+    const CATCH_UP_SPREAD_MS = 15000;
+    let retryMs = 1000;
+    let stale = false;
+    let catchUpTimer = null;
+
+    function addCard(id, html) {
+        if (!feed.querySelector(`[data-post-id="${id}"]`)) {
+            feed.insertAdjacentHTML('afterbegin', html);
+        }
+    }
+
+    function newestId() {
+        let newest = 0;
+        feed.querySelectorAll('[data-post-id]').forEach((card) => {
+            newest = Math.max(newest, Number(card.dataset.postId));
+        });
+        return newest;
+    }
+
+    async function catchUp() {
+        catchUpTimer = null;
+        try {
+            const response = await fetch(`/feed/since?after=${newestId()}`);
+            if (!response.ok) return;
+            const result = await response.json();
+            if (!result.complete) {
+                location.reload();
+                return;
+            }
+            // newest first, and each is prepended
+            result.posts.reverse().forEach((post) => addCard(post.id, post.html));
+        } catch (error) {
+            // the next resync or reconnect tries again
+        }
+    }
+
+    function scheduleCatchUp() {
+        if (catchUpTimer === null) {
+            catchUpTimer = setTimeout(catchUp, Math.random() * CATCH_UP_SPREAD_MS);
+        }
+    }
+
+    function connect() {
+        const socket = new WebSocket(url);
+
+        socket.addEventListener('open', () => {
+            retryMs = 1000;
+            // announcements sent while we were away are lost
+            if (stale) scheduleCatchUp();
+            stale = false;
+        });
+
+        socket.addEventListener('message', (event) => {
+            const message = JSON.parse(event.data);
+            if (message.type === 'resync') {
+                scheduleCatchUp();
+            } else if (message.type === 'post') {
+                addCard(message.id, message.html);
+            }
+        });
+
+        socket.addEventListener('close', () => {
+            stale = true;
+            setTimeout(connect, retryMs + Math.random() * retryMs);
+            retryMs = Math.min(retryMs * 2, 60000);
+        });
+    }
+
+    connect();
+})();
@@ -0,0 +1,50 @@
+"""
+Helpers for asserting that hot queries stay on indexes.
+
+Seeded test databases are tiny, so the planner would happily pick a
+sequential scan for everything. plans_with_seqscan_disabled() turns
+enable_seqscan off for the transaction: Postgres then only falls back to a
+Seq Scan when no usable index exists, which is exactly the regression we
+want to catch.
+"""
+
+import json
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+
+@contextmanager
+def plans_with_seqscan_disabled(connection):
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    try:
+        yield
+    finally:
+        connection.execute(text("SET LOCAL enable_seqscan = on"))
+
+
+def explain(connection, statement) -> dict:
+    """Return the JSON plan of a SQLAlchemy statement."""
+    compiled = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    row = connection.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar_one()
+    plan = row if isinstance(row, list) else json.loads(row)
+    return plan[0]["Plan"]
+
+
+def seq_scans(plan: dict) -> list[str]:
+    """Relation names read by Seq Scan nodes anywhere in the plan."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def assert_indexed(connection, name: str, statement):
+    plan = explain(connection, statement)
+    scans = seq_scans(plan)
+    assert not scans, f"{name} falls back to a sequential scan on {scans}"
@@ -0,0 +1,41 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import analytics
+from core.analytics import ViewBuffer, post_view_counts, record_view, referrer_host
+
+
+def test_buffer_keeps_newest_and_counts_drops():
+    buffer = ViewBuffer(3)
+    for i in range(5):
+        buffer.append((i,))
+    assert buffer.dropped == 2
+    assert buffer.drain() == [(2,), (3,), (4,)]
+    assert buffer.drain() == []
+
+
+def test_referrer_host_ignores_internal_links():
+    assert referrer_host("https://www.google.com/search?q=x", "blog.dev") == "google.com"
+    assert referrer_host("https://blog.dev/tag/python", "blog.dev:443") is None
+    assert referrer_host(None, "blog.dev") is None
+
+
+def test_post_view_counts_skip_non_post_pages():
+    events = [
+        (None, "/blog", None, None),
+        (None, "/p/a", 7, None),
+        (None, "/p/a", 7, "x.com"),
+    ]
+    assert post_view_counts(events) == {7: 2}
+
+
+def test_record_view_skips_assets_and_feed_catch_up(monkeypatch):
+    monkeypatch.setattr(analytics, "buffer", ViewBuffer(10))
+    for path in ("/static/app.css", "/img/a.jpg", "/api/v1/posts", "/feed/since"):
+        record_view("GET", path, 200, "Mozilla/5.0", None, "blog.dev", None)
+    record_view("GET", "/blog", 200, "Mozilla/5.0", None, "blog.dev", None)
+    record_view("GET", "/blog", 200, "Googlebot/2.1", None, "blog.dev", None)
+    record_view("POST", "/blog", 200, "Mozilla/5.0", None, "blog.dev", None)
+    assert [event[1] for event in analytics.buffer.drain()] == ["/blog"]
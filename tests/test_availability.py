@@ -0,0 +1,26 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.availability import BloomFilter, normalize
+
+
+def test_added_values_are_always_found():
+    bloom = BloomFilter(1000)
+    names = [f"user{i}" for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+    assert all(name in bloom for name in names)
+
+
+def test_false_positive_rate_near_target():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"user{i}")
+    false_hits = sum(f"other{i}" in bloom for i in range(10000))
+    assert false_hits < 300
+
+
+def test_normalize_is_case_and_space_insensitive():
+    assert normalize("  Barasa@Example.COM ") == "barasa@example.com"
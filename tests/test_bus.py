@@ -0,0 +1,39 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import bus
+
+
+def _receiver(monkeypatch, events):
+    monkeypatch.setattr(bus, "_subscribers", [("test", events.append)])
+    return bus._Receiver()
+
+
+def test_keys_reach_matching_subscribers(monkeypatch):
+    events = []
+    receiver = _receiver(monkeypatch, events)
+    receiver.handle("a:1|test:1 other")
+    assert events == ["test:1"]
+
+
+def test_out_of_order_messages_are_not_a_gap(monkeypatch):
+    events = []
+    receiver = _receiver(monkeypatch, events)
+    receiver.handle("a:1|test:1")
+    receiver.handle("a:3|test:3")
+    receiver.handle("a:2|test:2")
+    assert not receiver.missing
+    receiver.check()
+    assert None not in events
+
+
+def test_unfilled_gap_resets_subscribers(monkeypatch):
+    events = []
+    receiver = _receiver(monkeypatch, events)
+    receiver.handle("a:1|test:1")
+    receiver.handle("a:3|test:3")
+    monkeypatch.setattr(bus, "GAP_GRACE_SECONDS", -1)
+    receiver.check()
+    assert events[-1] is None
@@ -0,0 +1,38 @@
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.v1.comments import build_thread
+
+
+def row(id, parent_id, depth):
+    return SimpleNamespace(
+        id=id,
+        parent_id=parent_id,
+        author_name=f"reader {id}",
+        author_website=None,
+        content=f"comment {id}",
+        depth=depth,
+        created_at=None,
+    )
+
+
+def test_build_thread_nests_rows_in_path_order():
+    rows = [row(1, None, 0), row(3, 1, 1), row(4, 3, 2), row(5, 1, 1), row(2, None, 0)]
+    threads = build_thread(rows)
+
+    assert [t["id"] for t in threads] == [1, 2]
+    assert [r["id"] for r in threads[0]["replies"]] == [3, 5]
+    assert threads[0]["replies"][0]["replies"][0]["id"] == 4
+    assert threads[1]["replies"] == []
+
+
+def test_build_thread_drops_replies_to_hidden_parents():
+    # comment 3 is not approved, so it and its reply are not in the page
+    rows = [row(1, None, 0), row(4, 3, 2)]
+    threads = build_thread(rows)
+
+    assert len(threads) == 1
+    assert threads[0]["replies"] == []
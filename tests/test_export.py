@@ -0,0 +1,38 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import gzip
+import json
+
+from core.export import encode
+
+KEYS = ["id", "title", "tags"]
+ROWS = [(1, "Hello, world", ["python", "fastapi"]), (2, "Second", None)]
+
+
+def test_csv_has_header_and_joins_lists():
+    text = b"".join(encode(KEYS, ROWS, "csv")).decode()
+    assert text.splitlines() == [
+        "id,title,tags",
+        '1,"Hello, world","python,fastapi"',
+        "2,Second,",
+    ]
+
+
+def test_resumed_csv_has_no_header():
+    text = b"".join(encode(KEYS, ROWS[1:], "csv", header=False)).decode()
+    assert text.splitlines() == ["2,Second,"]
+
+
+def test_empty_csv_still_has_header():
+    assert b"".join(encode(KEYS, [], "csv")).decode().splitlines() == ["id,title,tags"]
+
+
+def test_gzipped_ndjson_round_trips():
+    data = gzip.decompress(b"".join(encode(KEYS, ROWS, "ndjson", gzip=True)))
+    assert [json.loads(line) for line in data.splitlines()] == [
+        {"id": 1, "title": "Hello, world", "tags": ["python", "fastapi"]},
+        {"id": 2, "title": "Second", "tags": None},
+    ]
@@ -0,0 +1,26 @@
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.config import settings
+from web.feed import Broadcaster
+
+
+def test_slow_client_overflows_without_holding_up_others():
+    async def scenario():
+        broadcaster = Broadcaster()
+        slow = broadcaster.connect()
+        fast = broadcaster.connect()
+        for i in range(settings.FEED_QUEUE_SIZE + 1):
+            broadcaster.send(str(i))
+            assert fast.queue.get_nowait() == str(i)
+        assert slow.overflowed and not fast.overflowed
+        assert slow.queue.qsize() == settings.FEED_QUEUE_SIZE
+
+        broadcaster.disconnect(slow)
+        broadcaster.send("next")
+        assert len(broadcaster) == 1
+
+    asyncio.run(scenario())
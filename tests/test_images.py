@@ -0,0 +1,93 @@
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from core.config import settings
+from web import images
+from web.images import _evict, _parse_size, _read_variant, _source, image_url
+
+
+def test_source_stays_inside_images_dir(tmp_path, monkeypatch):
+    images_dir = tmp_path / "images"
+    images_dir.mkdir()
+    (images_dir / "a.png").write_bytes(b"png")
+    (images_dir / "notes.txt").write_bytes(b"text")
+    (tmp_path / "secret.png").write_bytes(b"png")
+    monkeypatch.setattr(images, "IMAGES_DIR", images_dir)
+
+    assert _source("a.png") == images_dir / "a.png"
+    for path in ("../secret.png", "notes.txt", "missing.png"):
+        with pytest.raises(HTTPException) as error:
+            _source(path)
+        assert error.value.status_code == 404
+
+
+def test_parse_size_only_allows_template_sizes():
+    assert _parse_size("80x80") == (80, 80)
+    assert _parse_size("1200x0") == (1200, 0)
+    for size in ("100x100", "80", "axb"):
+        with pytest.raises(HTTPException) as error:
+            _parse_size(size)
+        assert error.value.status_code == 404
+
+
+def test_image_url_rewrites_static_images_to_known_sizes():
+    assert image_url("/static/images/me.jpg", 80, 80) == "/img/80x80/me.jpg"
+    assert image_url("/static/images/me.jpg", 81, 81) == "/static/images/me.jpg"
+    assert image_url("https://cdn.example.com/me.jpg", 80, 80) == (
+        "https://cdn.example.com/me.jpg"
+    )
+    assert image_url(None, 80, 80) is None
+
+
+def test_evict_drops_least_recently_served_to_90_percent(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_BYTES", 1000)
+    monkeypatch.setattr(images, "_cache_bytes", None)
+    for i in range(5):
+        path = tmp_path / f"{i}.webp"
+        path.write_bytes(b"x" * 300)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+
+    _evict()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["2.webp", "3.webp", "4.webp"]
+    assert images._cache_bytes == 900
+
+
+def test_read_variant_marks_it_served(tmp_path):
+    path = tmp_path / "v.webp"
+    path.write_bytes(b"webp")
+    os.utime(path, ns=(0, 0))
+
+    assert _read_variant(path) == b"webp"
+    assert path.stat().st_atime_ns > 0 and path.stat().st_mtime_ns == 0
+    path.unlink()
+    assert _read_variant(path) is None
+
+
+def test_evicted_variant_is_made_again(tmp_path, monkeypatch):
+    images_dir = tmp_path / "images"
+    images_dir.mkdir()
+    (images_dir / "a.png").write_bytes(b"png")
+    monkeypatch.setattr(images, "IMAGES_DIR", images_dir)
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path / "cache"))
+
+    made = []
+
+    async def ensure_variant(source, target, width, height):
+        made.append((width, height))
+        return b"made"
+
+    monkeypatch.setattr(images, "_ensure_variant", ensure_variant)
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    response = asyncio.run(images.resized_image("80x80", "a.png", request))
+
+    assert response.status_code == 200 and response.body == b"made"
+    assert made == [(80, 80)]
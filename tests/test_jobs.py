@@ -0,0 +1,142 @@
+import sys
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.orm import sessionmaker
+
+from core import jobs
+from core.jobs import BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS, LOCK_TIMEOUT
+from db import Job, JobStatus
+from db.base_class import Base
+from db.session import engine
+
+
+def test_backoff_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: 1.0)
+    assert [jobs._backoff(n).total_seconds() for n in (1, 2, 3, 4)] == [
+        BACKOFF_BASE_SECONDS,
+        BACKOFF_BASE_SECONDS * 2,
+        BACKOFF_BASE_SECONDS * 4,
+        BACKOFF_BASE_SECONDS * 8,
+    ]
+    assert jobs._backoff(30).total_seconds() == BACKOFF_MAX_SECONDS
+
+
+def test_backoff_jitter_stays_within_half_either_way():
+    for attempts in (1, 5, 30):
+        base = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+        for _ in range(50):
+            assert 0.5 * base <= jobs._backoff(attempts).total_seconds() <= 1.5 * base
+
+
+class _Session:
+    def __init__(self, row):
+        self.row = row
+        self.deleted = False
+        self.committed = False
+
+    def get(self, model, job_id):
+        return self.row
+
+    def delete(self, row):
+        self.deleted = True
+
+    def commit(self):
+        self.committed = True
+
+    def close(self):
+        pass
+
+
+def _running(attempts: int, max_attempts: int = 5):
+    return SimpleNamespace(
+        status=JobStatus.RUNNING,
+        attempts=attempts,
+        max_attempts=max_attempts,
+        locked_at=datetime.utcnow(),
+        last_error=None,
+        run_after=datetime.utcnow(),
+    )
+
+
+def test_failed_job_is_rescheduled_with_backoff(monkeypatch):
+    session = _Session(_running(attempts=2))
+    monkeypatch.setattr(jobs, "SessionLocal", lambda: session)
+    before = datetime.utcnow()
+
+    jobs._finish(1, "boom")
+
+    row = session.row
+    assert row.status == JobStatus.PENDING and row.locked_at is None
+    assert row.last_error == "boom"
+    # attempt 2 waits at least half of twice the base delay
+    assert row.run_after >= before + timedelta(seconds=BACKOFF_BASE_SECONDS)
+    assert session.committed and not session.deleted
+
+
+def test_job_gives_up_after_max_attempts(monkeypatch):
+    session = _Session(_running(attempts=5, max_attempts=5))
+    monkeypatch.setattr(jobs, "SessionLocal", lambda: session)
+
+    jobs._finish(1, "boom")
+
+    assert session.row.status == JobStatus.FAILED
+    assert session.row.last_error == "boom"
+    assert session.committed
+
+
+def test_finished_job_is_deleted(monkeypatch):
+    session = _Session(_running(attempts=1))
+    monkeypatch.setattr(jobs, "SessionLocal", lambda: session)
+
+    jobs._finish(1, None)
+
+    assert session.deleted and session.committed
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    """Jobs sessions on one transaction that is rolled back afterwards."""
+    with engine.connect() as conn:
+        trans = conn.begin()
+        Base.metadata.create_all(bind=conn)
+        monkeypatch.setattr(
+            jobs,
+            "SessionLocal",
+            sessionmaker(bind=conn, join_transaction_mode="create_savepoint"),
+        )
+        yield conn
+        trans.rollback()
+
+
+def _attempts(conn, job_id):
+    return conn.execute(select(Job.attempts).where(Job.id == job_id)).scalar_one()
+
+
+def test_claimed_job_is_not_claimed_again_until_its_lock_expires(connection):
+    db = jobs.SessionLocal()
+    new_job = jobs.enqueue(db, "test.noop", {"n": 1})
+    # older than anything else due, so it is claimed first
+    new_job.run_after = datetime(2000, 1, 1)
+    db.commit()
+    job_id = new_job.id
+    db.close()
+
+    assert jobs._claim() == (job_id, "test.noop", {"n": 1})
+    again = jobs._claim()
+    assert again is None or again[0] != job_id
+    assert _attempts(connection, job_id) == 1
+
+    # a worker that died holding it
+    connection.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .values(locked_at=datetime.utcnow() - LOCK_TIMEOUT - timedelta(minutes=1))
+    )
+    assert jobs._claim()[0] == job_id
+    assert _attempts(connection, job_id) == 2
@@ -0,0 +1,157 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import insert
+
+from api.v1.auth import login_select
+from api.v1.comments import parent_select, thread_page_select
+from api.v1.moderation import queue_select
+from api.v1.posts import slug_select
+from core.availability import sync_select
+from core.http_cache import post_slice_select
+from db import Category, Comment, Post, PostStatus, Tag, User, post_tags
+from db.base_class import Base
+from db.session import engine
+from tests.explain import assert_indexed, plans_with_seqscan_disabled
+from web.cards import card_select
+from web.home import (
+    author_posts_select,
+    category_archive_select,
+    feed_page_select,
+    month_archive_select,
+    profile_user_select,
+    tag_archive_select,
+)
+
+
+@pytest.fixture(scope="module")
+def connection():
+    """Schema plus a small seed inside a transaction that is rolled back."""
+    with engine.connect() as conn:
+        trans = conn.begin()
+        Base.metadata.create_all(bind=conn)
+
+        user_id = conn.execute(
+            insert(User)
+            .values(
+                username="plan_author",
+                email="plan_author@example.com",
+                password_hash="x",
+            )
+            .returning(User.id)
+        ).scalar_one()
+        category_id = conn.execute(
+            insert(Category)
+            .values(name="Plan Category", slug="plan-category")
+            .returning(Category.id)
+        ).scalar_one()
+        tag_id = conn.execute(
+            insert(Tag).values(name="plan-tag", slug="plan-tag").returning(Tag.id)
+        ).scalar_one()
+
+        now = datetime.utcnow()
+        post_ids = conn.execute(
+            insert(Post).returning(Post.id),
+            [
+                {
+                    "title": f"Plan post {i}",
+                    "slug": f"plan-post-{i}",
+                    "author_id": user_id,
+                    "category_id": category_id,
+                    "status": PostStatus.PUBLISHED,
+                    "published_at": now - timedelta(days=i),
+                }
+                for i in range(50)
+            ],
+        ).scalars().all()
+        conn.execute(
+            insert(post_tags), [{"post_id": p, "tag_id": tag_id} for p in post_ids]
+        )
+        conn.execute(
+            insert(Comment),
+            [
+                {
+                    "post_id": post_ids[0],
+                    "author_name": "reader",
+                    "author_email": "reader@example.com",
+                    "content": f"comment {i}",
+                }
+                for i in range(20)
+            ],
+        )
+
+        conn.info["seed"] = {
+            "user_id": user_id,
+            "category_id": category_id,
+            "tag_id": tag_id,
+            "post_id": post_ids[0],
+            "now": now,
+        }
+        with plans_with_seqscan_disabled(conn):
+            yield conn
+        trans.rollback()
+
+
+PUBLISHED = Post.status == PostStatus.PUBLISHED
+
+
+def _after(seed):
+    return seed["now"], 10**9
+
+
+# name -> statement builder taking the seed ids; every statement comes from
+# the code that runs it, so a change there is checked here
+HOT_QUERIES = {
+    # web/home.py
+    "blog feed": lambda seed: feed_page_select(card_select()),
+    "blog feed next page": lambda seed: feed_page_select(card_select(), _after(seed)),
+    "account by username": lambda seed: profile_user_select("plan_author"),
+    "account feed": lambda seed: author_posts_select(seed["user_id"]),
+    "tag archive page": lambda seed: feed_page_select(
+        tag_archive_select(seed["tag_id"]), _after(seed)
+    ),
+    "category archive page": lambda seed: feed_page_select(
+        category_archive_select(seed["category_id"]), _after(seed)
+    ),
+    "month archive page": lambda seed: feed_page_select(
+        month_archive_select(seed["now"] - timedelta(days=30), seed["now"]),
+        _after(seed),
+    ),
+    # core/http_cache.py
+    "blog validators": lambda seed: post_slice_select(PUBLISHED),
+    "tag validators": lambda seed: post_slice_select(PUBLISHED, tag_id=seed["tag_id"]),
+    "account validators": lambda seed: post_slice_select(
+        PUBLISHED, Post.author_id == seed["user_id"]
+    ),
+    # core/availability.py
+    "availability sync": lambda seed: sync_select(seed["user_id"], seed["now"]),
+    # api/v1/auth.py
+    "login lookup": lambda seed: login_select(
+        "plan_author@example.com", "plan_author"
+    ),
+    # api/v1/posts.py
+    "unique slug check": lambda seed: slug_select("plan-post-1"),
+    # api/v1/comments.py
+    "comment thread page": lambda seed: thread_page_select(
+        seed["post_id"], None, 20, 6
+    ),
+    "comment thread next page": lambda seed: thread_page_select(
+        seed["post_id"], 1, 20, 6
+    ),
+    "reply parent lookup": lambda seed: parent_select(seed["post_id"], 1),
+    # api/v1/moderation.py
+    "moderation queue": lambda seed: queue_select(seed["user_id"], 100),
+    "moderation queue of post": lambda seed: queue_select(
+        seed["user_id"], 100, seed["post_id"]
+    ),
+}
+
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_hot_query_uses_index(connection, name):
+    statement = HOT_QUERIES[name](connection.info["seed"])
+    assert_indexed(connection, name, statement)
@@ -0,0 +1,52 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from core.related import _post_terms, build_index
+
+POSTS = {
+    1: ("Async Python", "fastapi async python web", [1]),
+    2: ("FastAPI tips", "python fastapi web server", [1]),
+    3: ("Baking bread", "flour yeast oven bread", [2]),
+    4: ("Sourdough bread", "yeast flour starter bread", [2]),
+    5: ("Web servers", "nginx web server proxy", []),
+}
+
+
+def _index():
+    ids = list(POSTS)
+    return build_index(
+        ids,
+        [_post_terms(title, body, None) for title, body, _ in POSTS.values()],
+        [tags for _, _, tags in POSTS.values()],
+    )
+
+
+def test_neighbours_share_words_and_tags():
+    index = _index()
+    assert [i for i, _ in index.neighbours(0)][0] == 2
+    assert [i for i, _ in index.neighbours(2)] == [4]
+
+
+def test_sparse_product_matches_dense():
+    index = _index()
+    n = len(index.post_ids)
+    dense = np.zeros((n, index.n_columns))
+    for row in range(n):
+        a, b = index.indptr[row], index.indptr[row + 1]
+        dense[row, index.indices[a:b]] = index.data[a:b]
+    expected = dense @ dense.T
+    for row in range(n):
+        assert np.allclose(index.similarities(row), expected[row], atol=1e-6)
+
+
+def test_new_post_joins_existing_lists():
+    index = _index()
+    columns, weights = index.vectorize(_post_terms("More bread", "bread yeast", None), [2])
+    row = index.set_row(6, columns, weights)
+    index.compute_all()
+    assert {i for i, _ in index.neighbours(row)} == {3, 4}
+    assert 6 in {i for i, _ in index.neighbours(2)}
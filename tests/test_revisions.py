@@ -0,0 +1,158 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm import Session
+
+from api.v1.auth_core import Identity
+from api.v1.revisions import AutosaveIn, apply_revision, autosave
+from core.revisions import (
+    SNAPSHOT_EVERY,
+    DeltaError,
+    add_revision,
+    apply_delta,
+    make_delta,
+    revision_texts,
+    split_lines,
+)
+from db import Post, PostRevision, PostStatus, User
+from db.base_class import Base
+from db.session import engine
+
+OLD = "# Title\n\nFirst paragraph.\n\nSecond paragraph.\nno newline at end"
+NEW = "# New title\n\nFirst paragraph.\n\nInserted.\n\nSecond paragraph.\nno newline at end\n"
+
+
+def test_split_lines_only_breaks_on_newline():
+    assert split_lines("a\r\nb\x0cc\n\nd") == ["a\r\n", "b\x0cc\n", "\n", "d"]
+    assert split_lines("") == []
+
+
+def test_delta_round_trip():
+    delta = make_delta(OLD, NEW)
+    assert apply_delta(OLD, delta) == NEW
+    assert apply_delta(NEW, make_delta(NEW, OLD)) == OLD
+
+
+def test_delta_only_carries_changed_lines():
+    delta = make_delta(OLD, NEW)
+    inserted = [line for op in delta if op[0] == "+" for line in op[1]]
+    assert "First paragraph.\n" not in inserted
+    assert "Inserted.\n" in inserted
+
+
+def test_editor_splice_patch_applies():
+    # what compose.html sends: keep head, replace the middle, keep tail
+    patch = [["=", 2], ["-", 1], ["+", ["Changed.\n"]], ["=", 3]]
+    assert apply_delta(OLD, patch) == OLD.replace("First paragraph.", "Changed.")
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        [["=", 100]],
+        [["=", 2]],
+        [["-", -1]],
+        [["*", 1]],
+        [["+", "not a list"]],
+        ["="],
+    ],
+)
+def test_bad_patches_are_rejected(patch):
+    with pytest.raises(DeltaError):
+        apply_delta(OLD, patch)
+
+
+# -----------------------------
+# Against Postgres, rolled back
+# -----------------------------
+
+
+def _text(number: int) -> str:
+    return "".join(f"line {i}\n" for i in range(number))
+
+
+@pytest.fixture
+def db():
+    with engine.connect() as conn:
+        trans = conn.begin()
+        Base.metadata.create_all(bind=conn)
+        session = Session(bind=conn, join_transaction_mode="create_savepoint")
+        yield session
+        session.close()
+        trans.rollback()
+
+
+@pytest.fixture
+def post(db):
+    """(author identity, post id) of a draft with two and a half blocks of revisions."""
+    user_id = db.execute(
+        insert(User)
+        .values(username="rev_author", email="rev@example.com", password_hash="x")
+        .returning(User.id)
+    ).scalar_one()
+    post_id = db.execute(
+        insert(Post)
+        .values(
+            title="Revisions",
+            slug="revisions-test",
+            author_id=user_id,
+            status=PostStatus.DRAFT,
+            content=_text(1),
+        )
+        .returning(Post.id)
+    ).scalar_one()
+    for number in range(1, 2 * SNAPSHOT_EVERY + SNAPSHOT_EVERY // 2 + 1):
+        add_revision(db, post_id, user_id, number - 1, _text(number - 1), _text(number))
+    db.execute(update(Post).where(Post.id == post_id).values(content=_text(number)))
+    db.commit()
+    return Identity(user_id, "rev_author", None, None, 0), post_id
+
+
+def test_revisions_rebuild_from_their_own_blocks(db, post):
+    _, post_id = post
+    # a broken delta in the first block can't matter to the other two
+    db.execute(
+        update(PostRevision)
+        .where(PostRevision.post_id == post_id, PostRevision.number == 5)
+        .values(delta=[["=", 10**6]])
+    )
+    numbers = [SNAPSHOT_EVERY + 3, 2 * SNAPSHOT_EVERY + 2]
+    assert revision_texts(db, post_id, numbers) == {n: _text(n) for n in numbers}
+    with pytest.raises(DeltaError):
+        revision_texts(db, post_id, [7])
+
+
+def test_missing_delta_raises(db, post):
+    _, post_id = post
+    db.execute(
+        delete(PostRevision).where(
+            PostRevision.post_id == post_id,
+            PostRevision.number == SNAPSHOT_EVERY + 2,
+        )
+    )
+    assert revision_texts(db, post_id, [SNAPSHOT_EVERY + 1]) == {
+        SNAPSHOT_EVERY + 1: _text(SNAPSHOT_EVERY + 1)
+    }
+    with pytest.raises(DeltaError):
+        revision_texts(db, post_id, [SNAPSHOT_EVERY + 3])
+
+
+def test_applied_revision_becomes_the_latest(db, post):
+    identity, post_id = post
+    latest = 2 * SNAPSHOT_EVERY + SNAPSHOT_EVERY // 2
+
+    result = apply_revision(post_id, 3, db=db, identity=identity)
+
+    assert result == {"revision": latest + 1, "restored": 3, "applied": True}
+    assert revision_texts(db, post_id, [latest + 1]) == {latest + 1: _text(3)}
+
+    # an editor still on the pre-apply revision would undo the apply
+    stale = AutosaveIn(base_revision=latest, patch=[["=", latest], ["+", ["x\n"]]])
+    with pytest.raises(HTTPException) as error:
+        autosave(post_id, stale, db=db, identity=identity)
+    assert error.value.status_code == 409
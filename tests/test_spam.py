@@ -0,0 +1,53 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from core.spam import SpamModel, featurize, tokenize
+
+HAM = [
+    "Great write-up on FastAPI dependencies, thanks!",
+    "How do you handle migrations with alembic in CI?",
+    "The terraform section helped me fix my deploy.",
+]
+SPAM = [
+    "Cheap pills online visit http://pills.example now",
+    "Earn money fast click www.money.example cheap cheap",
+    "Best casino bonus http://casino.example click now",
+]
+
+
+def test_tokenize_marks_links():
+    assert tokenize("Visit http://x.example NOW") == ["__url__", "visit", "now"]
+
+
+def test_featurize_offsets_include_bias_token():
+    ids, offsets = featurize(["", "hello world"])
+    assert offsets.tolist() == [0, 1]
+    assert ids[0] == 0 and ids[1] == 0
+    assert len(ids) == 4
+
+
+def test_model_ranks_spam_above_ham():
+    model = SpamModel.fit(
+        [(HAM + SPAM, np.array([False] * len(HAM) + [True] * len(SPAM)))]
+    )
+    scores = model.score(
+        [
+            "click now for cheap pills http://spam.example",
+            "thanks, the alembic tip helped",
+        ]
+    )
+
+    assert scores[0] > 0.5 > scores[1]
+
+
+def test_model_round_trips_through_disk(tmp_path):
+    model = SpamModel.fit([(HAM + SPAM, np.array([0, 0, 0, 1, 1, 1], dtype=bool))])
+    path = str(tmp_path / "spam.npz")
+    model.save(path)
+
+    loaded = SpamModel.load(path)
+    assert np.allclose(loaded.score(SPAM), model.score(SPAM))
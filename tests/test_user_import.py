@@ -0,0 +1,38 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from core.user_import import ImportFormatError, parse_rows, validate_batch
+
+
+def test_csv_rows_carry_their_line_numbers():
+    text = "username,email,full_name\nalice,alice@example.com,Alice A\nbob,bob@example.com,Bob B\n"
+    assert [line for line, _ in parse_rows(text, "csv")] == [2, 3]
+
+
+def test_bad_ndjson_line_is_reported():
+    with pytest.raises(ImportFormatError, match="Line 2"):
+        list(parse_rows('{"username": "a"}\nnot json\n', "ndjson"))
+
+
+def test_invalid_and_duplicate_rows_are_rejected():
+    rows = [
+        (2, {"username": "alice", "email": "alice@example.com", "full_name": "Alice A"}),
+        (3, {"username": "ALICE", "email": "other@example.com", "full_name": "Alice B"}),
+        (4, {"username": "carol", "email": "not-an-email", "full_name": "Carol C"}),
+    ]
+    valid, errors = validate_batch(rows)
+    assert [line for line, _ in valid] == [2]
+    assert [(e.row, e.field) for e in errors] == [(3, "username"), (4, "email")]
+
+
+def test_imported_passwords_cannot_be_used_to_sign_in():
+    from utils import has_usable_password, make_unusable_password
+
+    assert make_unusable_password() != make_unusable_password()
+    assert not has_usable_password(make_unusable_password())
+    assert not has_usable_password("UNUSABLE_PASSWORD")
+    assert has_usable_password("StrongPass1")
@@ -1,6 +1,7 @@
 import re
+import secrets
 import unicodedata
-from typing import Tuple
+from typing import Optional, Tuple
 
 USERNAME_MIN_LENGTH = 3
 USERNAME_MAX_LENGTH = 30
@@ -25,6 +26,24 @@ EMAIL_REGEX = re.compile(
 )
 
 
+# Accounts created without a password store a random value with this
+# prefix; login refuses them before comparing anything.
+UNUSABLE_PASSWORD_PREFIX = "!unusable:"
+# written by create-user before the prefix existed
+_LEGACY_UNUSABLE_PASSWORD = "UNUSABLE_PASSWORD"
+
+
+def make_unusable_password() -> str:
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(32)
+
+
+def has_usable_password(password_hash: Optional[str]) -> bool:
+    return bool(password_hash) and not (
+        password_hash.startswith(UNUSABLE_PASSWORD_PREFIX)
+        or password_hash == _LEGACY_UNUSABLE_PASSWORD
+    )
+
+
 def validate_username(username: str) -> Tuple[bool, str]:
     if not username:
         return False, "Username is required."
@@ -0,0 +1,138 @@
+"""
+Post cards: the read model behind every post list page.
+
+List pages show title, excerpt, image, author, tags and counts, never the
+body. card_select() reads just those columns (plus the author's, via a
+join) into plain tuples, so list queries never touch posts.content and
+allocate no ORM objects. Tags for the whole page come from one
+(post_id, tag_id) read on the post_tags primary key, resolved through the
+catalog cache instead of a join that would repeat each post row per tag.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session
+
+from core.catalog import CatalogEntry, get_catalog
+from db import Comment, CommentStatus, Post, User, post_tags
+
+
+class CardAuthor(NamedTuple):
+    id: int
+    username: str
+    full_name: Optional[str]
+    avatar_url: Optional[str]
+
+
+class PostCard(NamedTuple):
+    id: int
+    title: str
+    slug: str
+    excerpt: Optional[str]
+    featured_image: Optional[str]
+    published_at: Optional[datetime]
+    view_count: int
+    category_id: Optional[int]
+    author_id: Optional[int]
+    author: Optional[CardAuthor]
+    tags: List[CatalogEntry]
+    comment_count: int
+
+
+def card_select() -> Select:
+    """Base statement for a card list; callers add filters, order and limit."""
+    comment_count = (
+        select(func.count(Comment.id))
+        .where(Comment.post_id == Post.id, Comment.status == CommentStatus.APPROVED)
+        .correlate(Post)
+        .scalar_subquery()
+    )
+    return select(
+        Post.id,
+        Post.title,
+        Post.slug,
+        Post.excerpt,
+        Post.featured_image,
+        Post.published_at,
+        Post.view_count,
+        Post.category_id,
+        Post.author_id,
+        User.username,
+        User.full_name,
+        User.avatar_url,
+        comment_count.label("comment_count"),
+    ).outerjoin(User, User.id == Post.author_id)
+
+
+def parse_cursor(cursor: Optional[str]):
+    """Keyset cursor is "<published_at iso>,<post id>" of the last row seen."""
+    if not cursor:
+        return None
+    try:
+        published_at, post_id = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(published_at), int(post_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def cursor_after(row) -> str:
+    return f"{row.published_at.isoformat()},{row.id}"
+
+
+def tags_by_post(db: Session, post_ids: list[int]) -> dict[int, list[CatalogEntry]]:
+    """Tags of each post, sorted by name, from one read of post_tags."""
+    tag_ids = defaultdict(list)
+    for post_id, tag_id in db.execute(
+        select(post_tags.c.post_id, post_tags.c.tag_id).where(
+            post_tags.c.post_id.in_(post_ids)
+        )
+    ):
+        tag_ids[post_id].append(tag_id)
+
+    catalog = get_catalog(db)
+    wanted = {tag_id for ids in tag_ids.values() for tag_id in ids}
+    if not wanted.issubset(catalog.tags_by_id):
+        catalog = get_catalog(db, force=True)
+
+    tags = {}
+    for post_id, ids in tag_ids.items():
+        entries = [catalog.tags_by_id[i] for i in ids if i in catalog.tags_by_id]
+        entries.sort(key=lambda tag: tag.name)
+        tags[post_id] = entries
+    return tags
+
+
+def fetch_post_cards(db: Session, stmt: Select) -> list[PostCard]:
+    rows = db.execute(stmt).all()
+    if not rows:
+        return []
+
+    tags = tags_by_post(db, [row.id for row in rows])
+
+    return [
+        PostCard(
+            id=row.id,
+            title=row.title,
+            slug=row.slug,
+            excerpt=row.excerpt,
+            featured_image=row.featured_image,
+            published_at=row.published_at,
+            view_count=row.view_count or 0,
+            category_id=row.category_id,
+            author_id=row.author_id,
+            author=(
+                CardAuthor(row.author_id, row.username, row.full_name, row.avatar_url)
+                if row.username is not None
+                else None
+            ),
+            tags=tags.get(row.id, []),
+            comment_count=row.comment_count,
+        )
+        for row in rows
+    ]
@@ -0,0 +1,214 @@
+"""
+Live feed: /ws/feed pushes a rendered post card to readers of /blog when a
+post is published, so they see it without reloading.
+
+Publishing calls announce_post(db, post_id) inside its transaction. The
+key travels over the invalidation bus (core.bus), so once the transaction
+commits every worker hears about it. Each worker that has readers
+connected renders the card and serializes the message once; the
+broadcaster then hands the same string to every socket's queue without
+awaiting any of them.
+
+Each socket has a queue of FEED_QUEUE_SIZE messages. A reader that falls
+that far behind is disconnected with 1013 (try again later) rather than
+buffered without bound or allowed to hold up the others. After a bus
+reset, when announcements may have been missed, readers are told to
+resync. Either way the page catches up from /feed/since, after a random
+delay so thousands of readers don't all ask at once, rather than
+reloading /blog.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, Depends, Query, WebSocket
+from sqlalchemy.orm import Session
+
+from core.bus import publish, subscribe
+from core.config import settings
+from db import Post, PostStatus
+from db.base import get_db
+from db.session import SessionLocal
+from web.cards import card_select, fetch_post_cards
+from web.home import templates
+
+logger = logging.getLogger(settings.PROJECT_NAME)
+
+router = APIRouter()
+
+BUS_PREFIX = "feed:post:"
+TRY_AGAIN_LATER = 1013
+# most cards /feed/since returns; a reader further behind reloads the page
+CATCH_UP_LIMIT = 20
+
+
+class FeedClient:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[str] = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+
+class Broadcaster:
+    """Fans messages out to this process's feed sockets."""
+
+    def __init__(self):
+        self._clients: set[FeedClient] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def connect(self) -> FeedClient:
+        self._loop = asyncio.get_running_loop()
+        client = FeedClient(settings.FEED_QUEUE_SIZE)
+        self._clients.add(client)
+        return client
+
+    def disconnect(self, client: FeedClient):
+        self._clients.discard(client)
+
+    def send(self, message: str):
+        """Queue message for every client. Call on the event loop."""
+        for client in self._clients:
+            if client.overflowed:
+                continue
+            try:
+                client.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # its sender closes the socket after the message in flight
+                client.overflowed = True
+
+    def call_soon(self, callback, *args):
+        """Run callback on the event loop from any thread, if anyone listens."""
+        if self._loop is not None and self._clients:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+
+broadcaster = Broadcaster()
+
+
+def announce_post(db: Session, post_id: int):
+    """Push a newly published post to live feeds once db's transaction commits."""
+    publish(db, f"{BUS_PREFIX}{post_id}")
+
+
+def _render_card(card) -> str:
+    return templates.get_template("_post_card.html").render(post=card)
+
+
+def render_post_message(post_id: int) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        cards = fetch_post_cards(
+            db,
+            card_select().where(
+                Post.id == post_id, Post.status == PostStatus.PUBLISHED
+            ),
+        )
+    finally:
+        db.close()
+    if not cards:
+        return None
+    html = _render_card(cards[0])
+    return orjson.dumps({"type": "post", "id": post_id, "html": html}).decode()
+
+
+async def _broadcast_post(post_id: int):
+    try:
+        message = await asyncio.to_thread(render_post_message, post_id)
+    except Exception:
+        logger.exception(f"Rendering live feed card for post {post_id} failed")
+        return
+    if message is not None:
+        broadcaster.send(message)
+
+
+# the loop only keeps weak references to tasks
+_pending: set[asyncio.Task] = set()
+
+
+def _start_broadcast(post_id: int):
+    task = asyncio.ensure_future(_broadcast_post(post_id))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+_RESYNC = orjson.dumps({"type": "resync"}).decode()
+
+
+def _on_bus_message(key: Optional[str]):
+    # runs on the bus listener, or in the committing request's thread
+    if key is None:
+        broadcaster.call_soon(broadcaster.send, _RESYNC)
+        return
+    try:
+        post_id = int(key.removeprefix(BUS_PREFIX))
+    except ValueError:
+        return
+    broadcaster.call_soon(_start_broadcast, post_id)
+
+
+subscribe(BUS_PREFIX, _on_bus_message)
+
+
+async def _send_queued(websocket: WebSocket, client: FeedClient):
+    while True:
+        await websocket.send_text(await client.queue.get())
+        if client.overflowed:
+            await websocket.close(code=TRY_AGAIN_LATER)
+            return
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    # readers have nothing to say; anything they send is ignored
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.get("/feed/since", summary="Cards of posts published after a given post")
+def feed_since(
+    after: int = Query(0, ge=0, description="Id of the newest post the page shows"),
+    db: Session = Depends(get_db),
+):
+    """
+    What a live feed missed while disconnected or after a resync, newest
+    first. "complete" is false when there were more than CATCH_UP_LIMIT.
+    """
+    cards = fetch_post_cards(
+        db,
+        card_select()
+        .where(Post.status == PostStatus.PUBLISHED, Post.id > after)
+        .order_by(Post.published_at.desc(), Post.id.desc())
+        .limit(CATCH_UP_LIMIT + 1),
+    )
+    return {
+        "posts": [
+            {"id": card.id, "html": _render_card(card)}
+            for card in cards[:CATCH_UP_LIMIT]
+        ],
+        "complete": len(cards) <= CATCH_UP_LIMIT,
+    }
+
+
+@router.websocket("/ws/feed")
+async def feed_socket(websocket: WebSocket):
+    if len(broadcaster) >= settings.FEED_MAX_CONNECTIONS:
+        await websocket.close(code=TRY_AGAIN_LATER)
+        return
+
+    await websocket.accept()
+    client = broadcaster.connect()
+    sender = asyncio.create_task(_send_queued(websocket, client))
+    receiver = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        broadcaster.disconnect(client)
+        sender.cancel()
+        receiver.cancel()
+        # a send to a socket that just went away fails; that's expected
+        await asyncio.gather(sender, receiver, return_exceptions=True)
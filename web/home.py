@@ -1,20 +1,29 @@
 from __future__ import annotations
 
 from pathlib import Path
-import markdown
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import quote
 import textwrap
 from typing import Any, List
 
 from fastapi.responses import RedirectResponse
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import Session
 
 from db.base import get_db
-from db import Post, PostStatus, User
+from db import Post, PostStatus, User, post_tags
 
 from schemas.item import Item, ItemCreate, ItemUpdate
-from api.v1.auth_core import get_current_user, get_optional_user, verify_token
+from api.v1.auth_core import (
+    Identity,
+    get_current_user,
+    get_optional_identity,
+    get_optional_user,
+    verify_token,
+)
 
 
 import json
@@ -24,52 +33,350 @@ from sqlalchemy.orm import Session
 
 from db.base import get_db
 from db import Category, Tag
+from core.catalog import get_catalog
+from core.tracing import span
+from core.config import settings
+from web.images import image_url
+from web.cards import card_select, cursor_after, fetch_post_cards, parse_cursor
+from core.archive import CATEGORY, MONTH, TAG, get_archive_count, month_key
+from core.author_stats import get_author_stats
+from core.http_cache import (
+    FEED_KEY,
+    cache_headers,
+    file_validators,
+    is_not_modified,
+    not_modified_response,
+    post_keys,
+    post_slice_validators,
+)
 
 router = APIRouter()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
+
+
+class TimedTemplates(Jinja2Templates):
+    """Jinja2Templates whose rendering shows up as the "template" span."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        name = kwargs.get("name") or next(
+            (arg for arg in args if isinstance(arg, str)), "template"
+        )
+        with span(f"render {name}", metric="template"):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+templates = TimedTemplates(directory=BASE_DIR / "templates")
+templates.env.filters["img"] = image_url
+
+FEED_PAGE_SIZE = 20
+
+
+def warm_templates():
+    """Compile every template now instead of on its first request."""
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+
+
+@lru_cache(maxsize=8)
+def _render_markdown(path: Path, mtime_ns: int) -> str:
+    # markdown is only needed here; importing it lazily keeps it off startup
+    import markdown
+
+    md_text = textwrap.dedent(path.read_text(encoding="utf-8"))
+    return markdown.markdown(md_text, extensions=["fenced_code", "tables"])
+
+
+# -----------------------------
+# Conditional GET helpers
+# -----------------------------
+
+
+def _conditional(
+    request: Request,
+    db: Session,
+    identity: Identity | None,
+    keys: list[str],
+    *criteria,
+    tag_id: int | None = None,
+):
+    """
+    Return (headers, 304 response or None) for a page listing posts that
+    match criteria. Signed-in renderings differ per user, so they are
+    private and their ETag includes the identity version.
+    """
+    variant = f"{identity.id}:{identity.version}" if identity else ""
+    validators = post_slice_validators(db, *criteria, tag_id=tag_id, variant=variant)
+    headers = cache_headers(
+        validators,
+        keys,
+        private=identity is not None,
+        max_age=settings.VIEW_COUNT_MAX_AGE,
+    )
+    if is_not_modified(request, validators):
+        return headers, not_modified_response(headers)
+    return headers, None
+
+
+def _add_post_keys(headers: dict, posts: list) -> dict:
+    if "Surrogate-Key" in headers:
+        keys = headers["Surrogate-Key"].split() + post_keys(posts)
+        headers["Surrogate-Key"] = " ".join(dict.fromkeys(keys))
+    return headers
 
 
 @router.get("/")
 def root(request: Request):
     md_path = Path("primary.md")
-    md_text = md_path.read_text(encoding="utf-8")
-    md_text = textwrap.dedent(md_text)
-    html_content = markdown.markdown(md_text, extensions=["fenced_code", "tables"])
+    validators = file_validators(md_path)
+    headers = cache_headers(validators, ["page:home"], private=False)
+    if is_not_modified(request, validators):
+        return not_modified_response(headers)
+
+    with span("markdown"):
+        html_content = _render_markdown(md_path, md_path.stat().st_mtime_ns)
     return templates.TemplateResponse(
         "index.html",
         {"request": request, "content": html_content},
+        headers=headers,
     )
 
 
 @router.get("/blog")
 def blog(
     request: Request,
+    cursor: str | None = Query(None),
     db: Session = Depends(get_db),
-    user_id: int | None = Depends(get_optional_user),
+    identity: Identity | None = Depends(get_optional_identity),
 ):
-    posts = (
-        db.query(Post)
-        .options(
-            joinedload(Post.author),
-            joinedload(Post.category),
-            joinedload(Post.tags),
-        )
-        .filter(Post.status == PostStatus.PUBLISHED)
-        .order_by(Post.published_at.desc())
-        .all()
+    headers, not_modified = _conditional(
+        request, db, identity, [FEED_KEY], Post.status == PostStatus.PUBLISHED
+    )
+    if not_modified:
+        return not_modified
+
+    posts, next_cursor = _feed_page(db, card_select(), cursor)
+
+    return templates.TemplateResponse(
+        "blog.html",
+        {
+            "request": request,
+            "posts": posts,
+            "user_id": identity.id if identity else None,
+            "is_authenticated": identity is not None,
+            "current_user": identity,
+            "next_url": _next_url(request, next_cursor),
+            # only the newest page takes posts pushed over /ws/feed
+            "live_feed": cursor is None,
+        },
+        headers=_add_post_keys(headers, posts),
+    )
+
+
+# -----------------------------
+# Archives (tag, category, month)
+# -----------------------------
+
+
+# Statements are built apart from the routes so tests/test_query_plans.py
+# can check the plans of exactly what the pages run.
+
+
+def feed_page_select(stmt: Select, after=None) -> Select:
+    """
+    One keyset page of the published posts in stmt, newest first, plus one
+    row to tell whether there is a next page. after is a parsed cursor.
+    """
+    stmt = stmt.where(Post.status == PostStatus.PUBLISHED)
+    if after is not None:
+        stmt = stmt.where(tuple_(Post.published_at, Post.id) < tuple_(*after))
+    return stmt.order_by(Post.published_at.desc(), Post.id.desc()).limit(
+        FEED_PAGE_SIZE + 1
+    )
+
+
+def tag_archive_select(tag_id: int) -> Select:
+    return (
+        card_select()
+        .join(post_tags, post_tags.c.post_id == Post.id)
+        .where(post_tags.c.tag_id == tag_id)
+    )
+
+
+def category_archive_select(category_id: int) -> Select:
+    return card_select().where(Post.category_id == category_id)
+
+
+def month_archive_select(start: datetime, end: datetime) -> Select:
+    return card_select().where(Post.published_at >= start, Post.published_at < end)
+
+
+def author_posts_select(author_id: int) -> Select:
+    return (
+        card_select()
+        .where(Post.status == PostStatus.PUBLISHED, Post.author_id == author_id)
+        .order_by(Post.published_at.desc(), Post.id.desc())
     )
 
+
+def profile_user_select(username: str) -> Select:
+    return select(User).where(User.username == username)
+
+
+def _feed_page(db: Session, stmt: Select, cursor: str | None):
+    """One keyset page of published post cards, newest first."""
+    posts = fetch_post_cards(db, feed_page_select(stmt, parse_cursor(cursor)))
+
+    next_cursor = None
+    if len(posts) > FEED_PAGE_SIZE:
+        posts = posts[:FEED_PAGE_SIZE]
+        next_cursor = cursor_after(posts[-1])
+    return posts, next_cursor
+
+
+def _next_url(request: Request, next_cursor: str | None) -> str | None:
+    if not next_cursor:
+        return None
+    return f"{request.url.path}?cursor={quote(next_cursor)}"
+
+
+def _render_archive(
+    request: Request,
+    identity: Identity | None,
+    headers: dict,
+    heading: str,
+    archive_count: int,
+    posts: list,
+    next_cursor: str | None,
+):
     return templates.TemplateResponse(
         "blog.html",
         {
             "request": request,
             "posts": posts,
-            "user_id": user_id,
-            "is_authenticated": user_id is not None,
-            "current_user": db.query(User).filter(User.id == user_id).first(),
+            "user_id": identity.id if identity else None,
+            "is_authenticated": identity is not None,
+            "current_user": identity,
+            "heading": heading,
+            "archive_count": archive_count,
+            "next_url": _next_url(request, next_cursor),
         },
+        headers=_add_post_keys(headers, posts),
+    )
+
+
+@router.get("/tag/{slug}")
+def tag_archive(
+    request: Request,
+    slug: str,
+    cursor: str | None = Query(None),
+    db: Session = Depends(get_db),
+    identity: Identity | None = Depends(get_optional_identity),
+):
+    tag = get_catalog(db).tags_by_slug.get(slug)
+    if tag is None:
+        tag = get_catalog(db, force=True).tags_by_slug.get(slug)
+    if tag is None:
+        raise HTTPException(status_code=404, detail="Tag not found")
+
+    headers, not_modified = _conditional(
+        request,
+        db,
+        identity,
+        [FEED_KEY, f"tag:{tag.id}"],
+        Post.status == PostStatus.PUBLISHED,
+        tag_id=tag.id,
+    )
+    if not_modified:
+        return not_modified
+
+    posts, next_cursor = _feed_page(db, tag_archive_select(tag.id), cursor)
+    return _render_archive(
+        request,
+        identity,
+        headers,
+        f"#{tag.name}",
+        get_archive_count(db, TAG, str(tag.id)),
+        posts,
+        next_cursor,
+    )
+
+
+@router.get("/category/{slug}")
+def category_archive(
+    request: Request,
+    slug: str,
+    cursor: str | None = Query(None),
+    db: Session = Depends(get_db),
+    identity: Identity | None = Depends(get_optional_identity),
+):
+    category = get_catalog(db).categories_by_slug.get(slug)
+    if category is None:
+        category = get_catalog(db, force=True).categories_by_slug.get(slug)
+    if category is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    headers, not_modified = _conditional(
+        request,
+        db,
+        identity,
+        [FEED_KEY, f"category:{category.id}"],
+        Post.status == PostStatus.PUBLISHED,
+        Post.category_id == category.id,
+    )
+    if not_modified:
+        return not_modified
+
+    posts, next_cursor = _feed_page(
+        db, category_archive_select(category.id), cursor
+    )
+    return _render_archive(
+        request,
+        identity,
+        headers,
+        category.name,
+        get_archive_count(db, CATEGORY, str(category.id)),
+        posts,
+        next_cursor,
+    )
+
+
+@router.get("/blog/{year}/{month}")
+def month_archive(
+    request: Request,
+    year: int,
+    month: int,
+    cursor: str | None = Query(None),
+    db: Session = Depends(get_db),
+    identity: Identity | None = Depends(get_optional_identity),
+):
+    if not (1 <= month <= 12 and 1 <= year < 9999):
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+
+    headers, not_modified = _conditional(
+        request,
+        db,
+        identity,
+        [FEED_KEY, f"month:{month_key(year, month)}"],
+        Post.status == PostStatus.PUBLISHED,
+        Post.published_at >= start,
+        Post.published_at < end,
+    )
+    if not_modified:
+        return not_modified
+
+    posts, next_cursor = _feed_page(db, month_archive_select(start, end), cursor)
+    return _render_archive(
+        request,
+        identity,
+        headers,
+        start.strftime("%B %Y"),
+        get_archive_count(db, MONTH, month_key(year, month)),
+        posts,
+        next_cursor,
     )
 
 
@@ -91,19 +398,13 @@ def blog(
 def account(
     request: Request,
     db: Session = Depends(get_db),
-    user_id: int | None = Depends(get_optional_user),
+    identity: Identity | None = Depends(get_optional_identity),
     username: str = Query(None),
 ):
-    logged_in_user = None
-    if user_id:
-        logged_in_user = db.query(User).filter(User.id == user_id).first()
-        followable = False
-
-    else:
-        followable = True
+    followable = identity is None
 
     if username:
-        profile_user = db.query(User).filter(User.username == username).first()
+        profile_user = db.scalars(profile_user_select(username)).first()
         if not profile_user:
             return templates.TemplateResponse(
                 "account.html",
@@ -115,7 +416,8 @@ def account(
                 },
             )
     else:
-        if not logged_in_user:
+        profile_user = db.get(User, identity.id) if identity else None
+        if not profile_user:
             return templates.TemplateResponse(
                 "account.html",
                 {
@@ -125,31 +427,33 @@ def account(
                     "error": "Please log in to view your profile",
                 },
             )
-        profile_user = logged_in_user
 
-    show_edit_button = logged_in_user and logged_in_user.id == profile_user.id
+    show_edit_button = identity is not None and identity.id == profile_user.id
 
-    posts = (
-        db.query(Post)
-        .options(
-            joinedload(Post.author),
-            joinedload(Post.category),
-            joinedload(Post.tags),
-        )
-        .filter(Post.status == PostStatus.PUBLISHED, Post.author_id == profile_user.id)
-        .order_by(Post.published_at.desc())
-        .all()
+    headers, not_modified = _conditional(
+        request,
+        db,
+        identity,
+        [f"author:{profile_user.id}"],
+        Post.status == PostStatus.PUBLISHED,
+        Post.author_id == profile_user.id,
     )
+    if not_modified:
+        return not_modified
+
+    posts = fetch_post_cards(db, author_posts_select(profile_user.id))
 
     return templates.TemplateResponse(
         "account.html",
         {
             "request": request,
             "user": profile_user,
+            "stats": get_author_stats(db, profile_user.id),
             "show_edit_button": show_edit_button,
             "posts": posts,
             "followable": followable,
         },
+        headers=_add_post_keys(headers, posts),
     )
 
 
@@ -161,22 +465,14 @@ def post_editor_page(
 ):
     if not user_id:
         return RedirectResponse(url="/blog")
-    categories = (
-        db.execute(select(Category).order_by(Category.name.asc())).scalars().all()
-    )
-    tags = db.execute(select(Tag).order_by(Tag.name.asc())).scalars().all()
-
-    categories_payload = [
-        {"id": c.id, "name": c.name, "slug": c.slug} for c in categories
-    ]
-    tags_payload = [{"id": t.id, "name": t.name, "slug": t.slug} for t in tags]
+    catalog = get_catalog(db)
 
     return templates.TemplateResponse(
         "compose.html",
         {
             "request": request,
-            "categories_json": json.dumps(categories_payload),
-            "tags_json": json.dumps(tags_payload),
+            "categories_json": catalog.categories_json,
+            "tags_json": catalog.tags_json,
             "api_base": "/api/v1",  # so JS can build endpoints
         },
     )
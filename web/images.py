@@ -0,0 +1,198 @@
+"""
+Resized images: /img/{width}x{height}/{path under static/images}.
+
+Variants are made on first request and kept in a disk cache bounded to
+IMAGE_CACHE_MAX_BYTES, evicting the least recently served files. Each
+cache file is named by the source's path, mtime and size plus the
+variant, so replacing a source image simply stops using its old variants.
+Concurrent requests for a variant that is still being made wait for the
+same work instead of repeating it. Across worker processes a variant may
+be made twice at worst; the write is atomic either way. A variant is read
+into memory before it is sent (they are small), so one evicted in the
+meantime is a cache miss rather than a failed response. Its name already
+identifies its content, so it doubles as the ETag.
+
+Only the sizes the templates use are served (2x their CSS size for high
+density screens). A height of 0 keeps the aspect ratio; otherwise the
+image is scaled to cover the box and center-cropped, like object-cover.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.http_cache import Validators, is_not_modified, not_modified_response
+from core.images import ImageRejected, encode_webp
+from core.tracing import span
+
+router = APIRouter()
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+IMAGES_DIR = BASE_DIR / "static" / "images"
+IMAGES_URL = "/static/images/"
+SOURCE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+IMAGE_SIZES = {
+    (80, 80),  # w-10 avatars
+    (160, 160),  # w-20 profile avatar
+    (448, 576),  # w-56 h-72 home portrait
+    (1200, 0),  # full-width featured images
+}
+
+# variants are rebuilt from sources when missing, so a day is plenty
+VARIANT_CACHE_CONTROL = "public, max-age=86400"
+
+_inflight: dict[str, asyncio.Task] = {}
+_cache_lock = threading.Lock()
+_cache_bytes: int | None = None  # this process's running estimate
+
+
+def image_url(url: str | None, width: int, height: int) -> str | None:
+    """Jinja filter: the resized variant of a static image, else url as is."""
+    if not url or not url.startswith(IMAGES_URL):
+        return url
+    if (width, height) not in IMAGE_SIZES:
+        return url
+    return f"/img/{width}x{height}/{url[len(IMAGES_URL):]}"
+
+
+def _source(path: str) -> Path:
+    source = (IMAGES_DIR / path).resolve()
+    if (
+        not source.is_relative_to(IMAGES_DIR)
+        or source.suffix.lower() not in SOURCE_SUFFIXES
+        or not source.is_file()
+    ):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return source
+
+
+def _parse_size(size: str) -> tuple[int, int]:
+    try:
+        width, height = (int(n) for n in size.split("x", 1))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if (width, height) not in IMAGE_SIZES:
+        raise HTTPException(status_code=404, detail="Image size not available")
+    return width, height
+
+
+def _variant_path(source: Path, width: int, height: int) -> Path:
+    stat = source.stat()
+    key = ":".join(
+        map(
+            str,
+            (
+                source.relative_to(IMAGES_DIR),
+                stat.st_mtime_ns,
+                stat.st_size,
+                f"{width}x{height}",
+            ),
+        )
+    )
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return Path(settings.IMAGE_CACHE_DIR) / f"{digest}.webp"
+
+
+def _read_variant(path: Path) -> bytes | None:
+    """A variant's bytes, marked as just served; None if it has been evicted."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+            # LRU order is the access time, set explicitly so noatime
+            # mounts work; mtime stays put
+            os.utime(f.fileno(), ns=(time.time_ns(), os.fstat(f.fileno()).st_mtime_ns))
+    except FileNotFoundError:
+        return None
+    return data
+
+
+def _evict():
+    """Delete least recently served variants until under 90% of the limit."""
+    global _cache_bytes
+
+    entries = []
+    for entry in os.scandir(settings.IMAGE_CACHE_DIR):
+        if entry.is_file() and entry.name.endswith(".webp"):
+            stat = entry.stat()
+            entries.append((stat.st_atime_ns, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+
+    target = settings.IMAGE_CACHE_MAX_BYTES * 0.9
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    _cache_bytes = total
+
+
+def _make_variant(source: Path, target: Path, width: int, height: int) -> bytes:
+    global _cache_bytes
+
+    data = encode_webp(str(source), (width, height), crop=bool(height))
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, target)
+
+    with _cache_lock:
+        if _cache_bytes is None:
+            _evict()  # first write in this process: measure the cache
+        _cache_bytes += len(data)
+        if _cache_bytes > settings.IMAGE_CACHE_MAX_BYTES:
+            _evict()
+    return data
+
+
+async def _ensure_variant(
+    source: Path, target: Path, width: int, height: int
+) -> bytes:
+    # The work runs as its own task that every request for this variant
+    # awaits, so a client hanging up doesn't cancel it for the others.
+    key = str(target)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(
+            run_in_threadpool(_make_variant, source, target, width, height)
+        )
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+    with span("image resize", metric="image", size=f"{width}x{height}"):
+        return await asyncio.shield(task)
+
+
+@router.get("/img/{size}/{path:path}")
+async def resized_image(size: str, path: str, request: Request):
+    width, height = _parse_size(size)
+    source = _source(path)
+    target = _variant_path(source, width, height)
+
+    validators = Validators(etag=f'"{target.stem}"', last_modified=None)
+    headers = {"ETag": validators.etag, "Cache-Control": VARIANT_CACHE_CONTROL}
+    # the name pins the content, so the client's copy is good even if the
+    # cache file has been evicted since
+    if is_not_modified(request, validators):
+        return not_modified_response(headers)
+
+    data = await run_in_threadpool(_read_variant, target)
+    if data is None:
+        try:
+            data = await _ensure_variant(source, target, width, height)
+        except (ImageRejected, OSError):
+            raise HTTPException(status_code=415, detail="Image cannot be resized")
+    return Response(data, media_type="image/webp", headers=headers)